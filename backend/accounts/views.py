@@ -8,7 +8,7 @@ from django_ratelimit.decorators import ratelimit
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from orders.models import Order, Cart
+from orders.models import Order, Cart, OPEN_ORDER_STATUSES
 
 
 # ============= Vistas HTML (templates) =============
@@ -36,7 +36,7 @@ def profile_view(request):
     cart, _ = Cart.objects.get_or_create(user=request.user)
     pedidos_actuales = Order.objects.filter(
         user=request.user,
-        status__in=['pending', 'confirmed', 'processing', 'shipped']
+        status__in=OPEN_ORDER_STATUSES
     ).prefetch_related('items__product').order_by('-created_at')
 
     historial_pedidos = Order.objects.filter(
@@ -60,11 +60,10 @@ def profile_view(request):
         historial_pedidos = historial_pedidos.filter(
             models.Q(order_number__icontains=q) | models.Q(notes__icontains=q)
         )
-    from django.core.paginator import Paginator
-    paginator = Paginator(historial_pedidos, 18)
-    page = request.GET.get('page', 1)
-    page_obj_historial = paginator.get_page(page)
-    historial_pedidos = page_obj_historial.object_list
+    # Por cursor sobre (created_at, id) con total aproximado (orders/pagination.py)
+    from orders.pagination import paginate_orders
+    page_obj_historial = paginate_orders(request, historial_pedidos, tab='order-history')
+    historial_pedidos = page_obj_historial.items
 
     user_profile = getattr(request.user, 'profile', None)
     password_cooldown = None
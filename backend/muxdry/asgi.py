@@ -3,6 +3,10 @@ ASGI config for muxdry project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serving the project through this entry point (e.g. ``uvicorn muxdry.asgi:application``
+or gunicorn with uvicorn workers) enables the Server-Sent Events stream at
+/orders/api/eventos/ (orders.events). Under WSGI that endpoint answers 204.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
@@ -0,0 +1,53 @@
+# muxdry/conditional.py
+"""
+GET condicionales (ETag / Last-Modified) para las respuestas que se piden una y otra vez
+sin cambios: los JSON del modal/chat de pedidos, la factura y las páginas del catálogo.
+
+Cada vista da una función barata que resume su estado (Order.updated_at, el último
+OrderMessage.id, la versión del catálogo...). Si coincide con If-None-Match o
+If-Modified-Since del navegador se responde 304 antes de serializar o renderizar nada.
+
+Los ETag incluyen release() para que un despliegue (templates o formato del JSON
+nuevos) no deje válidas copias viejas: RELEASE (en Render, el commit desplegado) o,
+si no está, la hora de arranque del proceso.
+
+Las respuestas llevan Cache-Control private, no-cache: el navegador guarda la copia
+pero la revalida siempre, y ningún proxy compartido la reutiliza.
+"""
+import functools
+import hashlib
+import time
+
+from django.conf import settings
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+_started = str(time.time_ns())
+
+
+def release():
+    return getattr(settings, 'RELEASE', '') or _started
+
+
+def make_etag(*parts):
+    """ETag fuerte (con comillas) de las partes y el release; None en las partes se ignora."""
+    raw = '|'.join(str(part) for part in (release(), *parts) if part is not None)
+    return '"%s"' % hashlib.blake2b(raw.encode('utf-8'), digest_size=12).hexdigest()
+
+
+def revalidate(response):
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def conditional(etag_func=None, last_modified_func=None):
+    """Como django.views.decorators.http.condition, más Cache-Control private, no-cache.
+    Si etag_func devuelve None (p.ej. el pedido no es del usuario) la vista decide (404...)."""
+    def decorator(view):
+        conditional_view = condition(etag_func=etag_func, last_modified_func=last_modified_func)(view)
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            return revalidate(conditional_view(request, *args, **kwargs))
+        return wrapper
+    return decorator
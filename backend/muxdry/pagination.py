@@ -0,0 +1,110 @@
+# muxdry/pagination.py
+"""
+Paginación por cursor (keyset / seek) para listados que crecen sin límite.
+
+En vez de OFFSET (que lee y descarta todas las filas anteriores) cada página pide
+"las N filas que van después de la última que vi" según el orden del listado:
+
+    WHERE (a, b, id) < (a0, b0, id0) ORDER BY a DESC, b DESC, id DESC LIMIT N + 1
+
+con un índice sobre esas columnas el coste es el mismo en la página 1 que en la 1000.
+El cursor es la tupla de valores de la última fila, en base64 (va en la URL: ?after=...).
+El orden debe terminar en una columna única (id) para que el cursor sea estable.
+"""
+import base64
+import datetime
+import decimal
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _json_value(value):
+    # isoformat() completo: DjangoJSONEncoder recorta a milisegundos y el cursor dejaría de ser exacto
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    raise TypeError(f'Valor no serializable en el cursor: {value!r}')
+
+
+class KeysetPage:
+    def __init__(self, items, has_next, next_cursor, cursor=None):
+        self.items = items
+        self.has_next = has_next
+        self.next_cursor = next_cursor
+        self.cursor = cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def is_first(self):
+        return not self.cursor
+
+
+class KeysetPaginator:
+    """ordering: ('-is_featured', '-created_at', '-id'). Campos del modelo o anotaciones del queryset."""
+
+    def __init__(self, queryset, ordering, per_page):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+        self.keys = [(name.lstrip('-'), name.startswith('-')) for name in self.ordering]
+
+    def _field(self, name):
+        try:
+            return self.queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return self.queryset.query.annotations[name].output_field
+
+    def encode_cursor(self, obj):
+        values = [getattr(obj, name) for name, _ in self.keys]
+        raw = json.dumps(values, default=_json_value, separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            values = json.loads(raw)
+            if not isinstance(values, list) or len(values) != len(self.keys):
+                raise InvalidCursor(cursor)
+            decoded = []
+            for (name, _), value in zip(self.keys, values):
+                field = self._field(name)
+                value = field.to_python(value)
+                if value is None:
+                    raise InvalidCursor(cursor)
+                field.run_validators(value)  # rangos del motor: un id enorme no llega a la consulta
+                decoded.append(value)
+            return decoded
+        except (ValueError, TypeError, ValidationError) as exc:
+            raise InvalidCursor(cursor) from exc
+
+    def _after(self, values):
+        """Filas posteriores a `values` en el orden del listado (comparación de tuplas)."""
+        condition = Q()
+        equal = {}
+        for (name, descending), value in zip(self.keys, values):
+            condition |= Q(**equal, **{f'{name}__{"lt" if descending else "gt"}': value})
+            equal[name] = value
+        return condition
+
+    def page(self, cursor=None):
+        """Página tras `cursor` (None = primera). Cursor inválido: InvalidCursor."""
+        queryset = self.queryset.order_by(*self.ordering)
+        if cursor:
+            queryset = queryset.filter(self._after(self.decode_cursor(cursor)))
+        rows = list(queryset[:self.per_page + 1])
+        items = rows[:self.per_page]
+        has_next = len(rows) > self.per_page
+        next_cursor = self.encode_cursor(items[-1]) if has_next else None
+        return KeysetPage(items, has_next, next_cursor, cursor)
@@ -0,0 +1,116 @@
+# muxdry/sendfile.py
+"""
+Entrega de archivos de MEDIA_ROOT sin que el worker de Django copie los bytes.
+
+La vista decide si el usuario puede ver el archivo y sendfile() responde según
+SENDFILE_BACKEND:
+
+- 'x-accel-redirect' (nginx): cabecera X-Accel-Redirect con SENDFILE_INTERNAL_URL + ruta
+  relativa a MEDIA_ROOT; nginx sirve el archivo desde una location `internal`.
+- 'x-sendfile' (Apache mod_xsendfile, lighttpd): cabecera X-Sendfile con la ruta absoluta.
+- '' (por defecto): FileResponse desde Python, con Range de un tramo (206 / 416).
+
+En todos los casos: Last-Modified, If-Modified-Since (304) y el Cache-Control que pida la vista.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class _RangeFile:
+    """Vista de solo lectura de `length` bytes de `file` desde `start` (para FileResponse)."""
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """(inicio, fin) inclusivos de un Range de un solo tramo; None si hay que ignorarlo (200 con
+    todo el archivo: sin Range, varios tramos o mal formado); ValueError si no es satisfacible."""
+    match = RANGE_RE.match(header or '')
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        suffix = int(last)
+        if not suffix or not size:
+            raise ValueError(header)
+        return max(size - suffix, 0), size - 1
+    start = int(first)
+    if start >= size:
+        raise ValueError(header)
+    end = min(int(last), size - 1) if last else size - 1
+    return (start, end) if end >= start else None
+
+
+def _internal_path(path):
+    """Ruta relativa a MEDIA_ROOT (con /) o None si el archivo está fuera."""
+    relative = os.path.relpath(path, settings.MEDIA_ROOT)
+    if relative == os.pardir or relative.startswith(os.pardir + os.sep):
+        return None
+    return relative.replace(os.sep, '/')
+
+
+def _python_response(request, path, size, content_type):
+    try:
+        byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    if byte_range is None:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = FileResponse(_RangeFile(open(path, 'rb'), start, length), content_type=content_type, status=206)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(length)
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def sendfile(request, path, content_type=None, cache_control='private, max-age=3600'):
+    """Respuesta que entrega el archivo `path`. 404 si no existe."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        raise Http404
+    if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), stat.st_mtime):
+        return HttpResponseNotModified()
+    content_type = content_type or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    backend = getattr(settings, 'SENDFILE_BACKEND', '')
+    internal = _internal_path(path) if backend == 'x-accel-redirect' else None
+    if internal is not None:
+        # nginx calcula longitud y Range; el cuerpo de esta respuesta se descarta
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = quote(getattr(settings, 'SENDFILE_INTERNAL_URL', '/protected-media/') + internal)
+    elif backend == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = path
+    else:
+        response = _python_response(request, path, stat.st_size, content_type)
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = cache_control
+    return response
@@ -40,6 +40,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'products.page_cache.PageCacheMiddleware',  # después de CSRF y messages
 ]
 
 ROOT_URLCONF = 'muxdry.urls'
@@ -56,6 +57,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'products.context_processors.categories',
+                'products.context_processors.page_shell',
                 'orders.context_processors.cart',
                 'orders.context_processors.orders_count',
                 'orders.context_processors.unread_messages_count',
@@ -102,6 +104,17 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 # Media files (imágenes subidas)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Derivados responsive de las imágenes del catálogo (products/images.py)
+IMAGE_DERIVATIVES_ROOT = os.path.join(MEDIA_ROOT, 'derivatives')
+IMAGE_DERIVATIVES_URL = MEDIA_URL + 'derivatives/'
+# Quién entrega los archivos de media (muxdry/sendfile.py): '' = Django (FileResponse con Range),
+# 'x-accel-redirect' = nginx (location internal en SENDFILE_INTERNAL_URL con alias a MEDIA_ROOT),
+# 'x-sendfile' = Apache mod_xsendfile / lighttpd
+SENDFILE_BACKEND = config('SENDFILE_BACKEND', default='')
+SENDFILE_INTERNAL_URL = config('SENDFILE_INTERNAL_URL', default='/protected-media/')
+# Identificador del despliegue para los ETag (muxdry/conditional.py); Render define RENDER_GIT_COMMIT.
+# Vacío = hora de arranque de cada proceso (correcto, pero cada worker da ETags distintos)
+RELEASE = config('RELEASE', default=config('RENDER_GIT_COMMIT', default=''))
 
 # URLs de login/logout
 LOGIN_URL = '/accounts/login/'
@@ -135,8 +148,35 @@ if not EMAIL_HOST_USER or not EMAIL_HOST_PASSWORD:
 else:
     EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 
+# Eventos en tiempo real (SSE en /orders/api/eventos/, requiere servir con ASGI: muxdry/asgi.py).
+# LocalBroker reparte eventos dentro del proceso (un solo proceso en total); con workers WSGI
+# aparte o varios workers: 'orders.events.PostgresBroker' (LISTEN/NOTIFY, requiere PostgreSQL).
+EVENTS_BROKER = config('EVENTS_BROKER', default='orders.events.LocalBroker')
+
 # Encriptación de mensajes del chat (OrderMessage) - django-fernet-encrypted-fields
 SALT_KEY = config('SALT_KEY', default='muxdry-salt-32chars-exactly!!!')
+# Caché del texto descifrado (orders/message_cache.py). El nivel compartido (alias de CACHES)
+# guarda texto plano fuera del proceso: vacío = solo en memoria del proceso.
+ORDER_MESSAGE_CACHE_SIZE = config('ORDER_MESSAGE_CACHE_SIZE', default=2048, cast=int)
+ORDER_MESSAGE_CACHE_SHARED = config('ORDER_MESSAGE_CACHE_SHARED', default='')
+
+# Números de pedido (orders/numbering.py, PostgreSQL): valores del día que reserva cada worker por consulta
+ORDER_NUMBER_BLOCK_SIZE = config('ORDER_NUMBER_BLOCK_SIZE', default=20, cast=int)
+
+# Búsqueda de productos (products/search.py): vacío = según el motor (PostgreSQL tsvector, SQLite FTS5)
+PRODUCT_SEARCH_BACKEND = config('PRODUCT_SEARCH_BACKEND', default='')
+# Sugerencias en memoria (products/autocomplete.py): reconstrucción completa en segundo plano cada N segundos
+AUTOCOMPLETE_REFRESH_SECONDS = config('AUTOCOMPLETE_REFRESH_SECONDS', default=300, cast=int)
+# Caché del catálogo (products/catalog_cache.py): alias de CACHES (compartido si hay varios workers)
+# y segundos máximos que se ven cambios hechos sin signals (stock, sales_count)
+CATALOG_CACHE_ALIAS = config('CATALOG_CACHE_ALIAS', default='default')
+CATALOG_CACHE_TIMEOUT = config('CATALOG_CACHE_TIMEOUT', default=300, cast=int)
+# Caché de página completa del catálogo (products/page_cache.py), mismo alias; 0 = desactivada
+PAGE_CACHE_TIMEOUT = config('PAGE_CACHE_TIMEOUT', default=600, cast=int)
+# Totales de los listados de pedidos (orders/pagination.py): en PostgreSQL se usa la estimación del
+# planner a partir de N filas; en otros motores el COUNT(*) se cachea N segundos
+ORDER_COUNT_EXACT_BELOW = config('ORDER_COUNT_EXACT_BELOW', default=1000, cast=int)
+ORDER_COUNT_CACHE_SECONDS = config('ORDER_COUNT_CACHE_SECONDS', default=30, cast=int)
 
 # Contraseñas: Argon2 (más seguro que PBKDF2)
 PASSWORD_HASHERS = [
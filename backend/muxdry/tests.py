@@ -0,0 +1,169 @@
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth.models import User
+from django.http import Http404
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils.http import http_date
+
+from orders.models import Order
+from .sendfile import parse_range, sendfile
+from .views import media_view
+
+
+class ParseRangeTests(SimpleTestCase):
+
+    def test_single_ranges(self):
+        self.assertEqual(parse_range('bytes=0-9', 100), (0, 9))
+        self.assertEqual(parse_range('bytes=90-', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=-10', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=-500', 100), (0, 99))
+        self.assertEqual(parse_range('bytes=95-500', 100), (95, 99))
+
+    def test_ignored_headers_serve_the_whole_file(self):
+        for header in (None, '', 'bytes=-', 'bytes=0-1,5-6', 'items=0-1', 'bytes=9-3'):
+            self.assertIsNone(parse_range(header, 100), header)
+
+    def test_unsatisfiable(self):
+        for header, size in (('bytes=100-', 100), ('bytes=-0', 100), ('bytes=-5', 0)):
+            with self.assertRaises(ValueError):
+                parse_range(header, size)
+
+
+class MediaTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.factory = RequestFactory()
+
+    def _file(self, name, content=b'0123456789'):
+        path = os.path.join(self.media_root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path
+
+    def _body(self, response):
+        body = b''.join(response.streaming_content)
+        response.close()
+        return body
+
+
+class SendfileTests(MediaTestCase):
+
+    def test_range_returns_206_with_content_range(self):
+        path = self._file('a.bin')
+        response = sendfile(self.factory.get('/', HTTP_RANGE='bytes=2-5'), path)
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(response['Content-Length'], '4')
+        self.assertEqual(self._body(response), b'2345')
+
+    def test_unsatisfiable_range_returns_416(self):
+        path = self._file('a.bin')
+        response = sendfile(self.factory.get('/', HTTP_RANGE='bytes=10-'), path)
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+
+    def test_if_modified_since_returns_304(self):
+        path = self._file('a.bin')
+        since = http_date(os.stat(path).st_mtime)
+        response = sendfile(self.factory.get('/', HTTP_IF_MODIFIED_SINCE=since), path)
+        self.assertEqual(response.status_code, 304)
+
+    def test_missing_file_is_404(self):
+        with self.assertRaises(Http404):
+            sendfile(self.factory.get('/'), os.path.join(self.media_root, 'nada.bin'))
+
+    @override_settings(SENDFILE_BACKEND='x-accel-redirect', SENDFILE_INTERNAL_URL='/protected-media/')
+    def test_x_accel_redirect_only_inside_media_root(self):
+        response = sendfile(self.factory.get('/'), self._file('fotos/a b.png'))
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/fotos/a%20b.png')
+        self.assertEqual(response.content, b'')
+
+        outside_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, outside_dir)
+        outside = os.path.join(outside_dir, 'a.bin')
+        with open(outside, 'wb') as f:
+            f.write(b'fuera')
+        response = sendfile(self.factory.get('/'), outside)
+        self.assertFalse(response.has_header('X-Accel-Redirect'))
+        self.assertEqual(self._body(response), b'fuera')
+
+
+class MediaViewTests(MediaTestCase):
+
+    def test_serves_public_files(self):
+        self._file('products/a.png')
+        response = media_view(self.factory.get('/media/products/a.png'), 'products/a.png')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=86400')
+        self.assertEqual(self._body(response), b'0123456789')
+
+    def test_refuses_chat_receipts_and_parent_paths(self):
+        self._file('order_messages/recibo.png')
+        self._file('products/a.png')
+        for path in ('order_messages/recibo.png', 'products/../order_messages/recibo.png',
+                     '/order_messages/recibo.png', '../muxdry/settings.py', 'products/../../x'):
+            with self.assertRaises(Http404, msg=path):
+                media_view(self.factory.get('/media/'), path)
+
+
+class TrackedFieldsTests(TestCase):
+    """TrackedFieldsMixin (muxdry/tracking.py) sobre Order: tracked_fields = ('status', 'payment_status')."""
+
+    def setUp(self):
+        user = User.objects.create_user('cliente', 'cliente@example.com', 'x')
+        self.pk = Order.objects.create(user=user).pk
+
+    def test_new_and_loaded_instances(self):
+        self.assertTrue(Order(status='pending').has_changed('status'))
+        order = Order.objects.get(pk=self.pk)
+        self.assertEqual(order.changed_fields(), [])
+        order.status = 'confirmed'
+        self.assertEqual(order.changed_fields(), ['status'])
+        self.assertEqual(order.original_value('status'), 'pending')
+
+    def test_save_resets_the_snapshot(self):
+        order = Order.objects.get(pk=self.pk)
+        order.status = 'confirmed'
+        self.assertTrue(order.has_changed('status'))
+        order.save()
+        self.assertFalse(order.has_changed('status'))
+        self.assertEqual(order.original_value('status'), 'confirmed')
+
+    def test_save_with_update_fields_only_resets_those_fields(self):
+        order = Order.objects.get(pk=self.pk)
+        order.status = 'confirmed'
+        order.payment_status = 'paid'
+        order.save(update_fields=['status'])
+        self.assertEqual(order.changed_fields(), ['payment_status'])
+
+    def test_refresh_from_db_takes_the_database_values(self):
+        order = Order.objects.get(pk=self.pk)
+        Order.objects.filter(pk=self.pk).update(status='shipped')
+        order.refresh_from_db()
+        self.assertEqual(order.original_value('status'), 'shipped')
+        self.assertFalse(order.has_changed('status'))
+
+        order.status = 'cancelled'
+        order.payment_status = 'paid'
+        Order.objects.filter(pk=self.pk).update(status='delivered')
+        order.refresh_from_db(fields=['status'])
+        self.assertEqual(order.original_value('status'), 'delivered')
+        self.assertEqual(order.changed_fields(), ['payment_status'])
+
+    def test_deferred_fields(self):
+        order = Order.objects.only('id').get(pk=self.pk)
+        # Sin cargar no se conoce el valor original
+        self.assertNotIn('status', order.original_values)
+        self.assertTrue(order.has_changed('status'))
+        # Leerlo lo carga (refresh_from_db(fields=...)) y entra en la foto
+        self.assertEqual(order.status, 'pending')
+        self.assertFalse(order.has_changed('status'))
+        self.assertNotIn('payment_status', order.original_values)
@@ -0,0 +1,62 @@
+# muxdry/tracking.py
+"""
+Seguimiento de cambios de campos sin consultas extra.
+
+El modelo guarda en from_db() los valores con los que se cargó (solo tracked_fields);
+has_changed() compara contra ellos en memoria. Tras save() la foto se actualiza con
+lo que se acaba de escribir, así los receivers de post_save todavía ven el valor original.
+"""
+
+
+class TrackedFieldsMixin:
+    """Mixin para modelos: tracked_fields = ('status', ...) (nombres de atributo, ej. 'user_id')."""
+    tracked_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot_tracked_fields()
+        return instance
+
+    def _snapshot_tracked_fields(self, fields=None):
+        # Los campos diferidos (only/defer) no están en __dict__: su valor original se desconoce
+        if fields is None:
+            self._original_values = {}
+            fields = self.tracked_fields
+        elif not hasattr(self, '_original_values'):
+            self._original_values = {}
+        for name in fields:
+            if name in self.tracked_fields and name in self.__dict__:
+                self._original_values[name] = self.__dict__[name]
+
+    @property
+    def original_values(self):
+        """Valores de tracked_fields tal como están en BD (vacío si la instancia es nueva)."""
+        return dict(getattr(self, '_original_values', {}))
+
+    def original_value(self, name):
+        return getattr(self, '_original_values', {}).get(name)
+
+    def has_changed(self, name):
+        """True si el campo difiere del valor en BD. Instancias nuevas o campos no cargados: True."""
+        if self._state.adding:
+            return True
+        original = getattr(self, '_original_values', {})
+        if name not in original:
+            return True
+        return original[name] != getattr(self, name)
+
+    def changed_fields(self):
+        return [name for name in self.tracked_fields if self.has_changed(name)]
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            self._snapshot_tracked_fields()
+        else:
+            self._snapshot_tracked_fields(update_fields)
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        self._snapshot_tracked_fields(fields)
@@ -8,11 +8,11 @@ def _secure_admin_has_permission(request):
 
 admin.site.has_permission = _secure_admin_has_permission
 
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from django.views.generic import RedirectView
-from muxdry.views import health_check_view, preview_404_view
+from muxdry.views import health_check_view, preview_404_view, header_fragment_view, media_view
 from products.views import home_view, information_view, contact_view
 from accounts.views import RegisterAPIView, LoginAPIView, ProfileAPIView, LogoutAPIView, SyncSessionAPIView
 
@@ -21,6 +21,7 @@ urlpatterns = [
     path('health/', health_check_view),
     path('404/', preview_404_view),
     path('', home_view, name='home'),
+    path('api/header/', header_fragment_view, name='header_fragment'),
     path('information/', information_view, name='information'),
     path('contacto/', contact_view, name='contact'),
     path('accounts/', include('accounts.urls')),
@@ -38,8 +39,10 @@ urlpatterns = [
     path('autenticado/perfil/', RedirectView.as_view(url='/accounts/perfil/', permanent=False), name='perfil_redirect'),
 ]
 
+# Media también en producción: la vista comprueba la ruta y el servidor web entrega el archivo
+urlpatterns += [re_path(r'^%s(?P<path>.+)$' % settings.MEDIA_URL.lstrip('/'), media_view, name='media')]
+
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
 
 handler404 = 'muxdry.views.custom_404_view'
@@ -1,5 +1,17 @@
-from django.http import HttpResponse
+import posixpath
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import Http404, HttpResponse, JsonResponse
+from django.middleware.csrf import get_token
 from django.shortcuts import render
+from django.utils._os import safe_join
+from django.views.decorators.cache import never_cache
+
+from .sendfile import sendfile
+
+# Solo por sus vistas con control de acceso (orders:order_receipt)
+PRIVATE_MEDIA_DIRS = ('order_messages/',)
 
 
 def health_check_view(request):
@@ -14,3 +26,46 @@ def custom_404_view(request, exception=None):
 def preview_404_view(request):
     """Vista para previsualizar la página 404 durante desarrollo (DEBUG=True)."""
     return render(request, '404.html', status=404)
+
+
+@never_cache
+def header_fragment_view(request):
+    """Parte personal del header para las páginas servidas desde la caché (products/page_cache.py):
+    usuario, carrito, badges, favoritos y token CSRF para cerrar sesión."""
+    if not request.user.is_authenticated:
+        return JsonResponse({'authenticated': False})
+    from orders.context_processors import _user_counters, _staff_counters
+    from products.models import ProductFavorite
+    user = request.user
+    counters = _user_counters(request)
+    data = {
+        'authenticated': True,
+        'username': user.username,
+        'is_staff': user.is_staff,
+        'cart_item_count': counters.cart_items,
+        'cart_total': f'{counters.cart_total:.2f}',
+        'orders_count': counters.open_orders,
+        'unread_messages_count': counters.unread_messages,
+        'favorite_ids': list(ProductFavorite.objects.filter(user=user).values_list('product_id', flat=True)),
+        'csrf_token': get_token(request),
+    }
+    if user.is_staff:
+        staff = _staff_counters(request)
+        data['admin_unread_client_count'] = staff.unread_client_messages
+        data['admin_orders_count'] = staff.open_orders
+    return JsonResponse(data)
+
+
+def media_view(request, path):
+    """Archivos públicos de MEDIA_ROOT (imágenes del catálogo y sus derivados), entregados por el
+    servidor web (muxdry/sendfile.py). Los comprobantes del chat no se sirven por aquí."""
+    path = posixpath.normpath(path).lstrip('/')
+    if path.startswith(PRIVATE_MEDIA_DIRS) or path.startswith('..'):
+        raise Http404
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    # Los derivados llevan la firma de la fuente en la ruta: no cambian nunca
+    cache_control = 'public, max-age=31536000, immutable' if path.startswith('derivatives/') else 'public, max-age=86400'
+    return sendfile(request, full_path, cache_control=cache_control)
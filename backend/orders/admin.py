@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from django.utils import timezone
-from .models import Order, OrderItem, Cart, CartItem, OrderMessage
+from .models import Order, OrderItem, Cart, CartItem, OrderMessage, OutboxEmail
+from .transitions import transition_orders
 
 
 class OrderItemInline(admin.TabularInline):
@@ -83,20 +83,24 @@ class OrderAdmin(admin.ModelAdmin):
         )
     status_color.short_description = 'Estado (Color)'
     
+    def _transition(self, request, queryset, new_status):
+        updated = transition_orders(queryset, new_status)
+        self.message_user(request, f'{updated} pedido(s) actualizado(s).')
+
     def mark_as_processing(self, request, queryset):
-        queryset.update(status='processing')
+        self._transition(request, queryset, 'processing')
     mark_as_processing.short_description = 'Marcar como Procesando'
     
     def mark_as_shipped(self, request, queryset):
-        queryset.update(status='shipped', shipped_at=timezone.now())
+        self._transition(request, queryset, 'shipped')
     mark_as_shipped.short_description = 'Marcar como Enviado'
     
     def mark_as_delivered(self, request, queryset):
-        queryset.update(status='delivered', delivered_at=timezone.now())
+        self._transition(request, queryset, 'delivered')
     mark_as_delivered.short_description = 'Marcar como Entregado'
     
     def mark_as_cancelled(self, request, queryset):
-        queryset.update(status='cancelled')
+        self._transition(request, queryset, 'cancelled')
     mark_as_cancelled.short_description = 'Marcar como Cancelado'
 
     def save_formset(self, request, form, formset, change):
@@ -119,10 +123,14 @@ class OrderMessageAdmin(admin.ModelAdmin):
 class CartAdmin(admin.ModelAdmin):
     list_display = ('user', 'item_count', 'total_price', 'updated_at')
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_summary()
+
 
 @admin.register(CartItem)
 class CartItemAdmin(admin.ModelAdmin):
     list_display = ('cart', 'product', 'quantity', 'total_price')
+    list_select_related = ('cart', 'product')
 
 
 @admin.register(OrderItem)
@@ -142,4 +150,19 @@ class OrderItemAdmin(admin.ModelAdmin):
     
     def created_at_display(self, obj):
         return obj.order.created_at.strftime('%Y-%m-%d %H:%M')
-    created_at_display.short_description = 'Fecha del Pedido'
\ No newline at end of file
+    created_at_display.short_description = 'Fecha del Pedido'
+
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ('event', 'order', 'subject', 'recipients', 'status', 'attempts', 'created_at', 'sent_at')
+    list_filter = ('status', 'event')
+    search_fields = ('subject', 'recipients', 'order__order_number')
+    list_select_related = ('order',)
+    readonly_fields = ('created_at', 'sent_at')
+    actions = ['retry']
+
+    def retry(self, request, queryset):
+        updated = queryset.exclude(status='sent').update(status='pending', attempts=0)
+        self.message_user(request, f'{updated} email(s) vuelven a la cola.')
+    retry.short_description = 'Reintentar envío'
@@ -0,0 +1,90 @@
+# orders/checkout.py
+"""
+Servicio de checkout único para la API (OrderViewSet.create_from_cart) y las vistas
+HTML (carrito completo y comprar un solo ítem).
+
+Número constante de consultas sea cual sea el tamaño del carrito: INSERT del pedido,
+bulk_create de los OrderItem, un UPDATE condicional del stock para todas las líneas
+(stock = stock - q WHERE stock >= q), el borrado de las líneas y el aviso al admin en
+la outbox (orders/outbox.py). Si algún producto no tiene stock suficiente, nada queda
+escrito y se lanza CheckoutError.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, When, Value, F, IntegerField
+
+from products.models import Product
+from .models import Order, OrderItem, CartItem
+from . import counters
+from .outbox import enqueue_new_order
+
+
+class CheckoutError(Exception):
+    """Checkout rechazado (carrito vacío o stock insuficiente). El mensaje se muestra al usuario."""
+
+
+class _StockShortage(Exception):
+    pass
+
+
+def _quantities_by_product(lines):
+    quantities = {}
+    for line in lines:
+        quantities[line.product_id] = quantities.get(line.product_id, 0) + line.quantity
+    return quantities
+
+
+def _decrement_stock(quantities):
+    """Un solo UPDATE para todas las líneas; True si todas tenían stock suficiente."""
+    wanted = Case(
+        *[When(pk=pk, then=Value(qty)) for pk, qty in quantities.items()],
+        output_field=IntegerField(),
+    )
+    updated = Product.objects.filter(pk__in=quantities.keys(), stock__gte=wanted).update(stock=F('stock') - wanted)
+    return updated == len(quantities)
+
+
+def _short_products(quantities):
+    short = [
+        name for pk, name, stock in Product.objects.filter(pk__in=quantities.keys()).values_list('pk', 'name', 'stock')
+        if stock < quantities[pk]
+    ]
+    return short
+
+
+def place_order(user, lines, shipping=0, tax=0, **order_fields):
+    """
+    Crea un pedido 'pending' con las líneas de carrito indicadas (CartItem con product cargado)
+    y las quita del carrito. order_fields son los campos de Order (pago, envío, notas...).
+    """
+    lines = list(lines)
+    if not lines:
+        raise CheckoutError('El carrito está vacío')
+    subtotal = sum((line.product.price * line.quantity for line in lines), Decimal('0'))
+    quantities = _quantities_by_product(lines)
+    try:
+        with transaction.atomic(), counters.bulk_cart_update(user.pk):
+            order = Order(
+                user=user,
+                status='pending',
+                subtotal=subtotal,
+                shipping=shipping,
+                tax=tax,
+                total=subtotal + shipping + tax,
+                **order_fields,
+            )
+            order._new_order_enqueued = True  # el aviso se encola abajo, en esta transacción
+            order.save(force_insert=True)
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=line.product, quantity=line.quantity, price=line.product.price)
+                for line in lines
+            ])
+            if not _decrement_stock(quantities):
+                raise _StockShortage()
+            CartItem.objects.filter(pk__in=[line.pk for line in lines]).delete()
+            enqueue_new_order(order, lines)
+    except _StockShortage:
+        short = _short_products(quantities)
+        raise CheckoutError(f'Stock insuficiente para {", ".join(short) or "algún producto"}')
+    return order
@@ -1,53 +1,50 @@
-from .models import Cart, Order, OrderMessage
+from .counters import get_user_counters, get_staff_counters
+
+
+def _user_counters(request):
+    """Contadores materializados del usuario: una sola lectura por request aunque los pidan varios processors."""
+    if not hasattr(request, '_user_counters'):
+        request._user_counters = get_user_counters(request.user)
+    return request._user_counters
+
+
+def _staff_counters(request):
+    if not hasattr(request, '_staff_counters'):
+        request._staff_counters = get_staff_counters()
+    return request._staff_counters
 
 
 def cart(request):
-    """Añade el carrito del usuario al contexto (para header, etc.)."""
+    """Cantidad de ítems y total del carrito del usuario (para header, etc.)."""
     if request.user.is_authenticated:
-        cart_obj, _ = Cart.objects.get_or_create(user=request.user)
-        return {'cart': cart_obj}
-    return {'cart': None}
+        counters = _user_counters(request)
+        return {'cart_item_count': counters.cart_items, 'cart_total': counters.cart_total}
+    return {'cart_item_count': 0, 'cart_total': 0}
 
 
 def orders_count(request):
     """Número de pedidos en curso (pendientes, confirmados, en proceso, enviados) para el badge del header."""
     if request.user.is_authenticated:
-        count = Order.objects.filter(
-            user=request.user,
-            status__in=['pending', 'confirmed', 'processing', 'shipped']
-        ).count()
-        return {'orders_count': count}
+        return {'orders_count': _user_counters(request).open_orders}
     return {'orders_count': 0}
 
 
 def unread_messages_count(request):
     """Número de mensajes no leídos del admin (para notificación 'Tiene un nuevo mensaje por leer')."""
     if request.user.is_authenticated:
-        count = OrderMessage.objects.filter(
-            order__user=request.user,
-            is_from_admin=True,
-            read_at__isnull=True
-        ).count()
-        return {'unread_messages_count': count}
+        return {'unread_messages_count': _user_counters(request).unread_messages}
     return {'unread_messages_count': 0}
 
 
 def admin_unread_client_count(request):
     """Para admin: número de respuestas de clientes no leídas (notificación en panel)."""
     if request.user.is_authenticated and request.user.is_staff:
-        count = OrderMessage.objects.filter(
-            is_from_admin=False,
-            read_by_admin_at__isnull=True
-        ).count()
-        return {'admin_unread_client_count': count}
+        return {'admin_unread_client_count': _staff_counters(request).unread_client_messages}
     return {'admin_unread_client_count': 0}
 
 
 def admin_orders_count(request):
     """Para admin: cantidad de pedidos (pendientes, confirmados, en proceso, enviados)."""
     if request.user.is_authenticated and request.user.is_staff:
-        count = Order.objects.filter(
-            status__in=['pending', 'confirmed', 'processing', 'shipped']
-        ).count()
-        return {'admin_orders_count': count}
+        return {'admin_orders_count': _staff_counters(request).open_orders}
     return {'admin_orders_count': 0}
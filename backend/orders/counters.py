@@ -0,0 +1,196 @@
+# orders/counters.py
+"""
+Contadores materializados para los badges del header.
+
+Los context processors leen una fila (UserCounters / StaffCounters) en lugar de
+lanzar varios COUNT por render. Las escrituras (signals y vistas que usan
+queryset.update) mantienen los valores: deltas exactos cuando se conocen,
+recálculo puntual del usuario afectado cuando no. Los cambios en mensajes sin
+leer se publican también como eventos SSE (orders/events.py).
+"""
+import threading
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.db.models import Count, DecimalField, F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import Order, OrderMessage, CartItem, UserCounters, StaffCounters, OPEN_ORDER_STATUSES
+from . import events
+
+
+USER_FIELDS = ('open_orders', 'unread_messages', 'cart')
+STAFF_FIELDS = ('open_orders', 'unread_client_messages')
+
+STAFF_COUNTERS_PK = 1
+
+_local = threading.local()
+
+
+def _user_values(user_id, fields):
+    values = {}
+    if 'open_orders' in fields:
+        values['open_orders'] = Order.objects.filter(user_id=user_id, status__in=OPEN_ORDER_STATUSES).count()
+    if 'unread_messages' in fields:
+        values['unread_messages'] = OrderMessage.objects.filter(
+            order__user_id=user_id, is_from_admin=True, read_at__isnull=True
+        ).count()
+    if 'cart' in fields:
+        summary = CartItem.objects.filter(cart__user_id=user_id).summary()
+        values['cart_items'] = summary.item_count
+        values['cart_total'] = summary.total_price
+    return values
+
+
+def _staff_values(fields):
+    values = {}
+    if 'open_orders' in fields:
+        values['open_orders'] = Order.objects.filter(status__in=OPEN_ORDER_STATUSES).count()
+    if 'unread_client_messages' in fields:
+        values['unread_client_messages'] = OrderMessage.objects.filter(
+            is_from_admin=False, read_by_admin_at__isnull=True
+        ).count()
+    return values
+
+
+def rebuild_user_counters(user_id):
+    """Recalcula todos los contadores del usuario desde las tablas origen (crea la fila si falta)."""
+    counters, _ = UserCounters.objects.update_or_create(user_id=user_id, defaults=_user_values(user_id, USER_FIELDS))
+    return counters
+
+
+def rebuild_staff_counters():
+    counters, _ = StaffCounters.objects.update_or_create(pk=STAFF_COUNTERS_PK, defaults=_staff_values(STAFF_FIELDS))
+    return counters
+
+
+def get_user_counters(user):
+    """Una sola lectura por render; la fila se construye la primera vez que se pide."""
+    counters = UserCounters.objects.filter(user_id=user.pk).first()
+    if counters is None:
+        counters = rebuild_user_counters(user.pk)
+    return counters
+
+
+def get_staff_counters():
+    counters = StaffCounters.objects.filter(pk=STAFF_COUNTERS_PK).first()
+    if counters is None:
+        counters = rebuild_staff_counters()
+    return counters
+
+
+def refresh_user_counters(user_id, *fields):
+    """Recalcula solo los campos indicados. Si la fila aún no existe no hace nada (se creará al leerla)."""
+    if not UserCounters.objects.filter(user_id=user_id).exists():
+        return
+    fields = fields or USER_FIELDS
+    UserCounters.objects.filter(user_id=user_id).update(**_user_values(user_id, fields))
+    if 'unread_messages' in fields:
+        events.publish_user_unread(user_id)
+
+
+def refresh_staff_counters(*fields):
+    if not StaffCounters.objects.filter(pk=STAFF_COUNTERS_PK).exists():
+        return
+    fields = fields or STAFF_FIELDS
+    StaffCounters.objects.filter(pk=STAFF_COUNTERS_PK).update(**_staff_values(fields))
+    if 'unread_client_messages' in fields:
+        events.publish_staff_unread()
+
+
+def bump_user_counters(user_id, **deltas):
+    """Aplica deltas exactos (p. ej. unread_messages=-3) con UPDATE ... SET f = f + d."""
+    deltas = {k: v for k, v in deltas.items() if v}
+    if deltas:
+        UserCounters.objects.filter(user_id=user_id).update(**{k: F(k) + v for k, v in deltas.items()})
+        if 'unread_messages' in deltas:
+            events.publish_user_unread(user_id)
+
+
+def bump_staff_counters(**deltas):
+    deltas = {k: v for k, v in deltas.items() if v}
+    if deltas:
+        StaffCounters.objects.filter(pk=STAFF_COUNTERS_PK).update(**{k: F(k) + v for k, v in deltas.items()})
+        if 'unread_client_messages' in deltas:
+            events.publish_staff_unread()
+
+
+def _per_user(queryset, user_field, aggregate, user_ref, output_field):
+    """Subconsulta correlacionada: aggregate de queryset para el usuario OuterRef(user_ref) (0 si no hay filas)."""
+    return Coalesce(Subquery(
+        queryset.filter(**{user_field: OuterRef(user_ref)})
+        .order_by()
+        .values(user_field)
+        .annotate(value=aggregate)
+        .values('value'),
+        output_field=output_field,
+    ), Value(0), output_field=output_field)
+
+
+_MONEY = DecimalField(max_digits=12, decimal_places=2)
+
+
+def _user_expressions(fields, user_ref):
+    """Los contadores de _user_values como expresiones SQL por usuario (para UPDATE/INSERT en bloque)."""
+    expressions = {}
+    if 'open_orders' in fields:
+        expressions['open_orders'] = _per_user(
+            Order.objects.filter(status__in=OPEN_ORDER_STATUSES), 'user_id', Count('pk'), user_ref, IntegerField(),
+        )
+    if 'unread_messages' in fields:
+        expressions['unread_messages'] = _per_user(
+            OrderMessage.objects.filter(is_from_admin=True, read_at__isnull=True),
+            'order__user_id', Count('pk'), user_ref, IntegerField(),
+        )
+    if 'cart' in fields:
+        expressions['cart_items'] = _per_user(
+            CartItem.objects.all(), 'cart__user_id', Sum('quantity'), user_ref, IntegerField(),
+        )
+        expressions['cart_total'] = _per_user(
+            CartItem.objects.all(), 'cart__user_id',
+            Sum(F('quantity') * F('product__price'), output_field=_MONEY), user_ref, _MONEY,
+        )
+    return expressions
+
+
+def refresh_cart_totals(product_id):
+    """Tras cambiar el precio de un producto: cart_total de todos los usuarios que lo tienen en
+    el carrito, en un solo UPDATE con subconsulta (cart_items no depende del precio)."""
+    user_ids = CartItem.objects.filter(product_id=product_id).values('cart__user_id')
+    UserCounters.objects.filter(user_id__in=user_ids).update(
+        cart_total=_user_expressions(('cart',), 'user_id')['cart_total'],
+    )
+
+
+def refresh_order_counters(user_ids):
+    """Tras cambios de estado en bloque (queryset.update): pedidos en curso de cada usuario y del admin.
+    Sentencias fijas sea cual sea el número de usuarios: los que aún no tienen fila la reciben
+    completa (un SELECT y un INSERT) y el resto se recalcula con un UPDATE correlacionado."""
+    user_ids = set(user_ids)
+    missing = (
+        get_user_model().objects.filter(pk__in=user_ids, badge_counters__isnull=True)
+        .annotate(**_user_expressions(USER_FIELDS, 'pk'))
+        .values('pk', 'open_orders', 'unread_messages', 'cart_items', 'cart_total')
+    )
+    created = [UserCounters(user_id=row.pop('pk'), **row) for row in missing]
+    if created:
+        UserCounters.objects.bulk_create(created, ignore_conflicts=True)
+    UserCounters.objects.filter(user_id__in=user_ids).exclude(user_id__in=[c.user_id for c in created]).update(
+        **_user_expressions(('open_orders',), 'user_id'),
+    )
+    refresh_staff_counters('open_orders')
+
+
+@contextmanager
+def bulk_cart_update(user_id):
+    """Silencia el recálculo por ítem (signals de CartItem) y recalcula el carrito una sola vez al salir."""
+    _local.bulk_cart = True
+    try:
+        yield
+    finally:
+        _local.bulk_cart = False
+    refresh_user_counters(user_id, 'cart')
+
+
+def in_bulk_cart_update():
+    return getattr(_local, 'bulk_cart', False)
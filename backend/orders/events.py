@@ -0,0 +1,199 @@
+# orders/events.py
+"""
+Eventos en tiempo real (Server-Sent Events) para badges, chat y pedidos nuevos.
+
+Las escrituras publican en canales ('user:<id>', 'staff') y la vista
+events_stream_view (servida por ASGI, muxdry/asgi.py) los reenvía al navegador.
+El broker por defecto (LocalBroker) reparte los eventos dentro del proceso: solo sirve
+con un único proceso. PostgresBroker (settings.EVENTS_BROKER) los lleva entre procesos
+con LISTEN/NOTIFY, así los workers WSGI publican y el proceso ASGI del stream los recibe.
+"""
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+STAFF_CHANNEL = 'staff'
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+class Subscription:
+    """Cola de eventos de un cliente conectado, ligada al event loop que la consume."""
+
+    def __init__(self, channels, loop, maxsize):
+        self.channels = tuple(channels)
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def _put(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            pass  # cliente lento: se descarta; el siguiente evento 'unread' trae el valor actual
+
+    async def get(self, timeout=None):
+        """Siguiente (evento, datos) o None si vence el timeout (para enviar heartbeat)."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class LocalBroker:
+    """Broker pub/sub en memoria. publish() es seguro desde cualquier hilo (signals, vistas sync)."""
+
+    def __init__(self, maxsize=100):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._subscriptions = {}  # canal -> set(Subscription)
+
+    def subscribe(self, channels):
+        sub = Subscription(channels, asyncio.get_running_loop(), self.maxsize)
+        with self._lock:
+            for channel in sub.channels:
+                self._subscriptions.setdefault(channel, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            for channel in sub.channels:
+                subs = self._subscriptions.get(channel)
+                if subs is not None:
+                    subs.discard(sub)
+                    if not subs:
+                        del self._subscriptions[channel]
+
+    def publish(self, channel, event, data):
+        with self._lock:
+            subs = list(self._subscriptions.get(channel, ()))
+        for sub in subs:
+            try:
+                sub.loop.call_soon_threadsafe(sub._put, (event, data))
+            except RuntimeError:
+                pass  # loop cerrado: el cliente ya se desconectó
+
+    def subscriber_count(self, channel):
+        with self._lock:
+            return len(self._subscriptions.get(channel, ()))
+
+
+class PostgresBroker(LocalBroker):
+    """Broker entre procesos con LISTEN/NOTIFY de PostgreSQL. publish() hace NOTIFY por la
+    conexión de Django (desde cualquier worker); cada proceso con clientes SSE escucha en un
+    hilo con su propia conexión y reparte lo recibido como LocalBroker."""
+
+    pg_channel = 'muxdry_events'
+    reconnect_seconds = 5
+
+    def __init__(self, maxsize=100, alias=DEFAULT_DB_ALIAS):
+        super().__init__(maxsize)
+        self.alias = alias
+        self._listener = None
+
+    def subscribe(self, channels):
+        with self._lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(target=self._listen, name='events-listener', daemon=True)
+                self._listener.start()
+        return super().subscribe(channels)
+
+    def publish(self, channel, event, data):
+        payload = json.dumps([channel, event, data], default=str)
+        with connections[self.alias].cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [self.pg_channel, payload])
+
+    def _listen(self):
+        while True:
+            try:
+                self._listen_once()
+            except Exception:
+                logger.exception('Eventos: se perdió la conexión LISTEN; reintento en %ss', self.reconnect_seconds)
+            time.sleep(self.reconnect_seconds)
+
+    def _listen_once(self):
+        wrapper = connections[self.alias]
+        conn = wrapper.get_new_connection(wrapper.get_connection_params())
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute(f'LISTEN {self.pg_channel}')
+            while True:
+                if select.select([conn], [], [], 60) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    channel, event, data = json.loads(conn.notifies.pop(0).payload)
+                    LocalBroker.publish(self, channel, event, data)
+        finally:
+            conn.close()
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                path = getattr(settings, 'EVENTS_BROKER', 'orders.events.LocalBroker')
+                _broker = import_string(path)()
+    return _broker
+
+
+def publish(channel, event, data):
+    """Publica cuando la transacción actual confirma (nunca eventos de escrituras revertidas)."""
+    transaction.on_commit(lambda: get_broker().publish(channel, event, data))
+
+
+def format_sse(event, data):
+    return f'event: {event}\ndata: {json.dumps(data, default=str)}\n\n'
+
+
+# --- Eventos de la tienda ---
+
+def publish_user_unread(user_id):
+    """Envía al cliente su conteo actual (mismo formato que unread_count_json_view)."""
+    from .models import UserCounters
+
+    def _send():
+        unread = UserCounters.objects.filter(user_id=user_id).values_list('unread_messages', flat=True).first()
+        if unread is not None:
+            get_broker().publish(user_channel(user_id), 'unread', {'client_unread': unread})
+    transaction.on_commit(_send)
+
+
+def publish_staff_unread():
+    from .models import StaffCounters
+    from .counters import STAFF_COUNTERS_PK
+
+    def _send():
+        unread = StaffCounters.objects.filter(pk=STAFF_COUNTERS_PK).values_list('unread_client_messages', flat=True).first()
+        if unread is not None:
+            get_broker().publish(STAFF_CHANNEL, 'unread', {'admin_unread': unread})
+    transaction.on_commit(_send)
+
+
+def publish_new_message(message, user_id):
+    data = {'order_id': message.order_id, 'message_id': message.pk, 'is_from_admin': message.is_from_admin}
+    publish(user_channel(user_id) if message.is_from_admin else STAFF_CHANNEL, 'message', data)
+
+
+def publish_new_order(order):
+    publish(STAFF_CHANNEL, 'new_order', {
+        'order_id': order.pk,
+        'order_number': order.order_number,
+        'total': str(order.total),
+    })
@@ -0,0 +1,22 @@
+# orders/fields.py
+from encrypted_fields.fields import EncryptedTextField
+
+from .message_cache import message_cache, cipher_digest, decryption_deferred, Ciphertext
+
+
+class CachedEncryptedTextField(EncryptedTextField):
+    """EncryptedTextField que reutiliza el texto ya descifrado (orders/message_cache.py).
+    Mismo formato en BD: solo cambia la lectura."""
+
+    def from_db_value(self, value, expression, connection):
+        if isinstance(value, str) and decryption_deferred():
+            return Ciphertext(value)  # lo descifra el from_db del modelo, con el pk
+        return super().from_db_value(value, expression, connection)
+
+    def decrypt_cached(self, pk, ciphertext):
+        digest = cipher_digest(ciphertext)
+        plain = message_cache.get(pk, digest)
+        if plain is None:
+            plain = self.to_python(str(ciphertext))
+            message_cache.set(pk, digest, plain)
+        return plain
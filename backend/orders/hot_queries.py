@@ -0,0 +1,94 @@
+# orders/hot_queries.py
+"""
+Registro de las consultas calientes del proyecto, para revisar sus planes con
+`python manage.py explain_hot_queries` (marca los recorridos secuenciales).
+
+Cada entrada es una función que recibe los parámetros de muestra (user_id, order_id)
+y devuelve el queryset tal como lo lanza la vista. Otras apps registran las suyas
+con @register_hot_query('nombre').
+"""
+import re
+
+from .models import Order, OrderMessage, OPEN_ORDER_STATUSES
+
+HOT_QUERIES = {}
+
+# Recorrido completo de una tabla: PostgreSQL 'Seq Scan on t', SQLite 'SCAN t' (sin índice)
+_SEQ_SCAN_PATTERNS = (
+    re.compile(r'Seq Scan on (\w+)'),
+    re.compile(r'\bSCAN (?:TABLE )?(\w+)(?! USING (?:COVERING )?INDEX)(?:\s|$)'),
+)
+
+
+def register_hot_query(name):
+    def decorator(func):
+        HOT_QUERIES[name] = func
+        return func
+    return decorator
+
+
+def sequential_scans(plan):
+    """Tablas recorridas secuencialmente en un plan de EXPLAIN (texto)."""
+    tables = []
+    for line in plan.splitlines():
+        for pattern in _SEQ_SCAN_PATTERNS:
+            match = pattern.search(line)
+            if match:
+                tables.append(match.group(1))
+    return tables
+
+
+# --- Badges (orders/counters.py) ---
+
+@register_hot_query('user_open_orders')
+def _user_open_orders(user_id, order_id):
+    return Order.objects.filter(user_id=user_id, status__in=OPEN_ORDER_STATUSES)
+
+
+@register_hot_query('user_unread_messages')
+def _user_unread_messages(user_id, order_id):
+    return OrderMessage.objects.filter(order__user_id=user_id, is_from_admin=True, read_at__isnull=True)
+
+
+@register_hot_query('staff_open_orders')
+def _staff_open_orders(user_id, order_id):
+    return Order.objects.filter(status__in=OPEN_ORDER_STATUSES)
+
+
+@register_hot_query('staff_unread_messages')
+def _staff_unread_messages(user_id, order_id):
+    return OrderMessage.objects.filter(is_from_admin=False, read_by_admin_at__isnull=True)
+
+
+# --- Paneles de pedidos ---
+
+@register_hot_query('current_orders')
+def _current_orders(user_id, order_id):
+    return Order.objects.filter(user_id=user_id, status__in=OPEN_ORDER_STATUSES).order_by('-created_at')
+
+
+@register_hot_query('order_history')
+def _order_history(user_id, order_id):
+    return Order.objects.filter(user_id=user_id, status='delivered').order_by('-created_at')
+
+
+@register_hot_query('admin_orders_by_status')
+def _admin_orders_by_status(user_id, order_id):
+    return Order.objects.filter(status='pending').order_by('-created_at')
+
+
+# --- Chat ---
+
+@register_hot_query('order_mark_read_client')
+def _order_mark_read_client(user_id, order_id):
+    return OrderMessage.objects.filter(order_id=order_id, is_from_admin=True, read_at__isnull=True)
+
+
+@register_hot_query('order_mark_read_staff')
+def _order_mark_read_staff(user_id, order_id):
+    return OrderMessage.objects.filter(order_id=order_id, is_from_admin=False, read_by_admin_at__isnull=True)
+
+
+@register_hot_query('order_chat_page')
+def _order_chat_page(user_id, order_id):
+    return OrderMessage.objects.filter(order_id=order_id).order_by('-id')[:50]
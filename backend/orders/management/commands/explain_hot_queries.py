@@ -0,0 +1,49 @@
+# orders/management/commands/explain_hot_queries.py
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from orders.hot_queries import HOT_QUERIES, sequential_scans
+from orders.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta EXPLAIN sobre las consultas calientes registradas y marca los recorridos secuenciales'
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help='Consultas a revisar (por defecto, todas)')
+        parser.add_argument('--user', type=int, help='user_id de muestra (por defecto, el del último pedido)')
+        parser.add_argument('--order', type=int, help='order_id de muestra (por defecto, el último pedido)')
+        parser.add_argument('--analyze', action='store_true', help='EXPLAIN ANALYZE (solo PostgreSQL; ejecuta la consulta)')
+        parser.add_argument('--verbose-plan', action='store_true', help='Muestra el plan completo de cada consulta')
+        parser.add_argument('--fail', action='store_true', help='Termina con error si hay recorridos secuenciales')
+
+    def handle(self, *args, **options):
+        names = options['names'] or list(HOT_QUERIES)
+        unknown = [name for name in names if name not in HOT_QUERIES]
+        if unknown:
+            raise CommandError(f'Consultas no registradas: {", ".join(unknown)}')
+
+        last = Order.objects.order_by('-pk').values('pk', 'user_id').first() or {'pk': 0, 'user_id': 0}
+        user_id = options['user'] or last['user_id']
+        order_id = options['order'] or last['pk']
+        explain_options = {'analyze': True} if options['analyze'] and connection.vendor == 'postgresql' else {}
+
+        flagged = 0
+        for name in names:
+            queryset = HOT_QUERIES[name](user_id, order_id)
+            plan = queryset.explain(**explain_options)
+            tables = sequential_scans(plan)
+            if tables:
+                flagged += 1
+                self.stdout.write(self.style.WARNING(f'[SEQ SCAN] {name}: {", ".join(tables)}'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'[OK] {name}'))
+            if options['verbose_plan'] or tables:
+                self.stdout.write('    ' + plan.replace('\n', '\n    '))
+
+        summary = f'{len(names)} consulta(s), {flagged} con recorrido secuencial ({connection.vendor}).'
+        if flagged and connection.vendor == 'postgresql':
+            summary += ' Con tablas pequeñas el planificador prefiere Seq Scan: revisar con datos reales.'
+        if flagged and options['fail']:
+            raise CommandError(summary)
+        self.stdout.write(summary)
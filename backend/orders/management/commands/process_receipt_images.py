@@ -0,0 +1,16 @@
+# orders/management/commands/process_receipt_images.py
+from django.core.management.base import BaseCommand
+from orders.receipts import pending_receipts, process_receipt
+
+
+class Command(BaseCommand):
+    help = 'Genera la copia para ver y la miniatura de los comprobantes del chat que aún no las tienen (orders/receipts.py)'
+
+    def handle(self, *args, **options):
+        done = failed = 0
+        for message_id in pending_receipts().values_list('pk', flat=True).iterator():
+            if process_receipt(message_id):
+                done += 1
+            else:
+                failed += 1
+        self.stdout.write(self.style.SUCCESS(f'Comprobantes procesados: {done} ({failed} sin poder leer)'))
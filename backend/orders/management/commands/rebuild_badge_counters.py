@@ -0,0 +1,18 @@
+# orders/management/commands/rebuild_badge_counters.py
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from orders.counters import rebuild_user_counters, rebuild_staff_counters
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los contadores de badges del header (UserCounters y StaffCounters) desde las tablas origen'
+
+    def handle(self, *args, **options):
+        total = 0
+        for user_id in User.objects.values_list('pk', flat=True).iterator():
+            rebuild_user_counters(user_id)
+            total += 1
+        rebuild_staff_counters()
+        self.stdout.write(self.style.SUCCESS(f'Contadores recalculados: {total} usuario(s) + admin'))
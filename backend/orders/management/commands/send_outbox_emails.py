@@ -0,0 +1,33 @@
+# orders/management/commands/send_outbox_emails.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from orders.outbox import deliver_pending, DEFAULT_BATCH_SIZE, DEFAULT_MAX_ATTEMPTS
+
+
+class Command(BaseCommand):
+    help = 'Envía los emails en cola (OutboxEmail) por lotes reutilizando una conexión SMTP'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+            help='Emails por lote (una transacción por lote)'
+        )
+        parser.add_argument(
+            '--max-attempts', type=int, default=DEFAULT_MAX_ATTEMPTS,
+            help='Intentos antes de marcar un email como fallido'
+        )
+        parser.add_argument(
+            '--loop', type=float, default=0,
+            help='Segundos entre pasadas; 0 = una sola pasada (para cron)'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = deliver_pending(options['batch_size'], options['max_attempts'])
+            if sent or failed:
+                self.stdout.write(self.style.SUCCESS(f'Enviados: {sent}. Fallidos: {failed}.'))
+            if not options['loop']:
+                break
+            time.sleep(options['loop'])
@@ -0,0 +1,151 @@
+# orders/message_cache.py
+"""
+Caché del texto descifrado de OrderMessage.message.
+
+Cada lectura del chat (cliente, modal del admin, inline del admin) descifraba con
+Fernet todos los mensajes. Los mensajes casi nunca cambian, así que el texto plano se
+guarda en un LRU en proceso con clave = pk del mensaje; cada entrada recuerda el hash
+del ciphertext del que salió y solo se usa si coincide con el leído de BD (si el
+mensaje se edita, aunque sea con queryset.update(), la entrada vieja no se sirve).
+Editar o borrar un mensaje borra su entrada (orders/signals.py). Opcionalmente hay
+un segundo nivel compartido (un alias de settings.CACHES); guarda texto plano, por
+eso está desactivado por defecto.
+
+El descifrado cacheado necesita el pk, que la conversión del campo no conoce: al
+cargar instancias por OrderMessage.objects (OrderMessageIterable) el campo devuelve
+el Ciphertext y OrderMessage.from_db lo descifra con la caché. values()/values_list()
+y el resto de lecturas descifran directamente, sin caché.
+
+Los aciertos de este worker se ven en /orders/api/cache-stats/ (solo staff).
+"""
+import contextvars
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models.query import ModelIterable
+
+SHARED_KEY_PREFIX = 'ordermsg:'
+SHARED_TIMEOUT = 24 * 3600
+
+# Activo mientras OrderMessageIterable construye una instancia
+_deferred_decryption = contextvars.ContextVar('order_message_deferred_decryption', default=False)
+
+
+def cipher_digest(ciphertext):
+    return hashlib.blake2b(ciphertext.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def decryption_deferred():
+    return _deferred_decryption.get()
+
+
+class Ciphertext(str):
+    """message tal como está en BD, pendiente de descifrar en OrderMessage.from_db."""
+
+
+class OrderMessageIterable(ModelIterable):
+    """ModelIterable que deja el descifrado de message para from_db, ya con el pk de la fila."""
+
+    def __iter__(self):
+        objects = super().__iter__()
+        while True:
+            # Solo durante la construcción de cada fila: entre yields el llamador
+            # puede hacer otras consultas (values()...) que deben descifrar normal
+            token = _deferred_decryption.set(True)
+            try:
+                obj = next(objects, None)
+            finally:
+                _deferred_decryption.reset(token)
+            if obj is None:
+                return
+            yield obj
+
+
+class DecryptedMessageCache:
+    """LRU acotado y thread-safe: pk del mensaje -> (hash del ciphertext, texto plano),
+    con contadores de aciertos."""
+
+    def __init__(self, maxsize=2048, shared_alias=''):
+        self.maxsize = maxsize
+        self.shared_alias = shared_alias
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias] if self.shared_alias else None
+
+    def get(self, pk, digest):
+        with self._lock:
+            entry = self._data.get(pk)
+            if entry is not None and entry[0] == digest:
+                self._data.move_to_end(pk)
+                self.hits += 1
+                return entry[1]
+        if self.shared is not None:
+            entry = self.shared.get(SHARED_KEY_PREFIX + str(pk))
+            if entry is not None and entry[0] == digest:
+                with self._lock:
+                    self.shared_hits += 1
+                self._store_local(pk, entry)
+                return entry[1]
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, pk, digest, plain):
+        entry = (digest, plain)
+        self._store_local(pk, entry)
+        if self.shared is not None:
+            self.shared.set(SHARED_KEY_PREFIX + str(pk), entry, SHARED_TIMEOUT)
+
+    def _store_local(self, pk, entry):
+        with self._lock:
+            self._data[pk] = entry
+            self._data.move_to_end(pk)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def evict(self, pk):
+        if pk is None:
+            return
+        with self._lock:
+            self._data.pop(pk, None)
+        if self.shared is not None:
+            self.shared.delete(SHARED_KEY_PREFIX + str(pk))
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = self.shared_hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round((self.hits + self.shared_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+
+message_cache = DecryptedMessageCache(
+    maxsize=getattr(settings, 'ORDER_MESSAGE_CACHE_SIZE', 2048),
+    shared_alias=getattr(settings, 'ORDER_MESSAGE_CACHE_SHARED', ''),
+)
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('orders', '0006_order_payment_reference'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StaffCounters',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unread_client_messages', models.IntegerField(default=0)),
+                ('open_orders', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Contadores de admin',
+                'verbose_name_plural': 'Contadores de admin',
+            },
+        ),
+        migrations.CreateModel(
+            name='UserCounters',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='badge_counters', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('open_orders', models.IntegerField(default=0)),
+                ('unread_messages', models.IntegerField(default=0)),
+                ('cart_items', models.IntegerField(default=0)),
+                ('cart_total', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+            ],
+            options={
+                'verbose_name': 'Contadores de usuario',
+                'verbose_name_plural': 'Contadores de usuario',
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:25
+
+import orders.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_user_counters'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ordermessage',
+            name='message',
+            field=orders.fields.CachedEncryptedTextField(),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0008_ordermessage_cached_message'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEmail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event', models.CharField(max_length=50)),
+                ('subject', models.CharField(max_length=255)),
+                ('body', models.TextField()),
+                ('from_email', models.CharField(max_length=255)),
+                ('recipients', models.TextField()),
+                ('reply_to', models.CharField(blank=True, max_length=255)),
+                ('status', models.CharField(choices=[('pending', 'Pendiente'), ('sent', 'Enviado'), ('failed', 'Fallido')], default='pending', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='outbox_emails', to='orders.order')),
+            ],
+            options={
+                'verbose_name': 'Email en cola',
+                'verbose_name_plural': 'Emails en cola',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'id'], name='orders_outbox_status_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('order__isnull', False)), fields=('event', 'order'), name='orders_outbox_unique_event_order')],
+            },
+        ),
+    ]
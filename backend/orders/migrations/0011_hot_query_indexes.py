@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0010_order_number_counter'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'status', '-created_at', '-id'], name='orders_user_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', '-created_at', '-id'], name='orders_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('status__in', ('pending', 'confirmed', 'processing', 'shipped'))), fields=['user', '-created_at', '-id'], name='orders_open_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ordermessage',
+            index=models.Index(condition=models.Q(('is_from_admin', True), ('read_at__isnull', True)), fields=['order'], name='orders_msg_unread_client_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ordermessage',
+            index=models.Index(condition=models.Q(('is_from_admin', False), ('read_by_admin_at__isnull', True)), fields=['order'], name='orders_msg_unread_staff_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0012_order_list_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ordermessage',
+            name='image_display',
+            field=models.ImageField(blank=True, editable=False, upload_to='order_messages/%Y/%m/display/'),
+        ),
+        migrations.AddField(
+            model_name='ordermessage',
+            name='image_thumb',
+            field=models.ImageField(blank=True, editable=False, upload_to='order_messages/%Y/%m/thumbs/'),
+        ),
+    ]
@@ -1,14 +1,36 @@
 from django.db import models
+from django.db.models import F, Sum
 from django.conf import settings
+from django.utils.functional import cached_property
+from muxdry.tracking import TrackedFieldsMixin
 from products.models import Product
-from encrypted_fields.fields import EncryptedTextField
-import uuid
-from django.utils import timezone
+from .fields import CachedEncryptedTextField
+from .message_cache import Ciphertext, OrderMessageIterable
+from .numbering import next_order_number
+from collections import namedtuple
+from decimal import Decimal
 
 
 def generate_order_number():
-    """Genera número de pedido único."""
-    return f"MUX-{timezone.now().strftime('%Y%m%d')}-{uuid.uuid4().hex[:6].upper()}"
+    """Genera número de pedido único (contador por día, ver orders/numbering.py)."""
+    return next_order_number()
+
+
+CartSummary = namedtuple('CartSummary', ['item_count', 'total_price'])
+
+_CART_SUMMARY_AGGREGATES = {
+    'summary_item_count': Sum('items__quantity'),
+    'summary_total_price': Sum(
+        F('items__quantity') * F('items__product__price'),
+        output_field=models.DecimalField(max_digits=12, decimal_places=2),
+    ),
+}
+
+
+class CartQuerySet(models.QuerySet):
+    def with_summary(self):
+        """Anota cantidad y total por carrito (listados: admin) para no calcularlos fila a fila."""
+        return self.annotate(**_CART_SUMMARY_AGGREGATES)
 
 
 class Cart(models.Model):
@@ -16,9 +38,25 @@ class Cart(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CartQuerySet.as_manager()
+
+    @cached_property
+    def summary(self):
+        """Cantidad de ítems y total en un solo aggregate SQL, memoizado en la instancia.
+        Usa las anotaciones de with_summary() si el carrito viene de ese queryset."""
+        if 'summary_item_count' in self.__dict__:
+            return CartSummary(self.summary_item_count or 0, self.summary_total_price or Decimal('0'))
+        return self.items.all().summary()
+
+    def clear_summary(self):
+        """Invalida el resumen memoizado tras modificar los ítems de esta instancia."""
+        self.__dict__.pop('summary', None)
+        self.__dict__.pop('summary_item_count', None)
+        self.__dict__.pop('summary_total_price', None)
+
     @property
     def total_price(self):
-        return sum(item.total_price for item in self.items.all())
+        return self.summary.total_price
 
     @property
     def total(self):
@@ -27,7 +65,20 @@ class Cart(models.Model):
 
     @property
     def item_count(self):
-        return sum(item.quantity for item in self.items.all())
+        return self.summary.item_count
+
+
+class CartItemQuerySet(models.QuerySet):
+    def summary(self):
+        """CartSummary de los ítems del queryset: SUM(quantity) y SUM(price * quantity) en una consulta."""
+        agg = self.aggregate(
+            item_count=Sum('quantity'),
+            total_price=Sum(
+                F('quantity') * F('product__price'),
+                output_field=models.DecimalField(max_digits=12, decimal_places=2),
+            ),
+        )
+        return CartSummary(agg['item_count'] or 0, agg['total_price'] or Decimal('0'))
 
 
 class CartItem(models.Model):
@@ -36,6 +87,8 @@ class CartItem(models.Model):
     quantity = models.PositiveIntegerField(default=1)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = CartItemQuerySet.as_manager()
+
     @property
     def total_price(self):
         return self.product.price * self.quantity
@@ -46,7 +99,11 @@ class CartItem(models.Model):
         return self.product.price
 
 
-class Order(models.Model):
+# Pedidos en curso (badges, "Mis pedidos", perfil)
+OPEN_ORDER_STATUSES = ('pending', 'confirmed', 'processing', 'shipped')
+
+
+class Order(TrackedFieldsMixin, models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pendiente'),
         ('confirmed', 'Confirmado'),
@@ -91,7 +148,7 @@ class Order(models.Model):
     ]
 
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='orders')
-    order_number = models.CharField(max_length=30, unique=True, default=generate_order_number)
+    order_number = models.CharField(max_length=30, unique=True, blank=True)  # se asigna en save()
 
     # Totales
     subtotal = models.DecimalField(max_digits=10, decimal_places=2, default=0)
@@ -129,6 +186,31 @@ class Order(models.Model):
     shipped_at = models.DateTimeField(null=True, blank=True)
     delivered_at = models.DateTimeField(null=True, blank=True)
 
+    # Cambios detectables sin consulta (muxdry/tracking.py): order.has_changed('status')
+    tracked_fields = ('status', 'payment_status')
+
+    class Meta:
+        # Todos terminan en (created_at, id): el orden de los listados por cursor (orders/pagination.py)
+        indexes = [
+            # Historial y paneles del usuario: user + status, ordenado por fecha
+            models.Index(fields=['user', 'status', '-created_at', '-id'], name='orders_user_status_idx'),
+            # Panel admin: filtro por status, ordenado por fecha
+            models.Index(fields=['status', '-created_at', '-id'], name='orders_status_created_idx'),
+            # Panel admin sin filtro de status
+            models.Index(fields=['-created_at', '-id'], name='orders_created_idx'),
+            # Pedidos en curso (parcial: solo estados abiertos)
+            models.Index(
+                fields=['user', '-created_at', '-id'],
+                condition=models.Q(status__in=OPEN_ORDER_STATUSES),
+                name='orders_open_user_idx',
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self.order_number:
+            self.order_number = generate_order_number()
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.order_number
 
@@ -145,12 +227,22 @@ class OrderItem(models.Model):
         return self.price * self.quantity
 
 
+class OrderMessageQuerySet(models.QuerySet):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Instancias con message descifrado vía caché por pk (orders/message_cache.py)
+        self._iterable_class = OrderMessageIterable
+
+
 class OrderMessage(models.Model):
     """Mensajes entre admin y cliente (chat de pedidos). message encriptado en reposo."""
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='messages')
     sender = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
-    message = EncryptedTextField()
+    message = CachedEncryptedTextField()  # texto descifrado cacheado (orders/message_cache.py)
     image = models.ImageField(upload_to='order_messages/%Y/%m/', blank=True, null=True, verbose_name='Comprobante de pago')
+    # Copias del comprobante (orders/receipts.py): para ver en grande y miniatura del chat
+    image_display = models.ImageField(upload_to='order_messages/%Y/%m/display/', blank=True, editable=False)
+    image_thumb = models.ImageField(upload_to='order_messages/%Y/%m/thumbs/', blank=True, editable=False)
     is_from_admin = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     read_at = models.DateTimeField(null=True, blank=True)  # cuando el cliente lee mensaje del admin
@@ -158,3 +250,101 @@ class OrderMessage(models.Model):
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # Parciales: solo las filas sin leer (badges y marcas de leído)
+            models.Index(
+                fields=['order'],
+                condition=models.Q(is_from_admin=True, read_at__isnull=True),
+                name='orders_msg_unread_client_idx',
+            ),
+            models.Index(
+                fields=['order'],
+                condition=models.Q(is_from_admin=False, read_by_admin_at__isnull=True),
+                name='orders_msg_unread_staff_idx',
+            ),
+        ]
+
+    objects = OrderMessageQuerySet.as_manager()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        ciphertext = instance.__dict__.get('message')
+        if isinstance(ciphertext, Ciphertext):
+            instance.message = cls._meta.get_field('message').decrypt_cached(instance.pk, ciphertext)
+        return instance
+
+
+class UserCounters(models.Model):
+    """Contadores materializados para los badges del header (una fila por usuario).
+    Se mantienen desde las escrituras de Order, OrderMessage y CartItem (ver orders/counters.py)."""
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='badge_counters')
+    open_orders = models.IntegerField(default=0)  # pendientes, confirmados, en proceso, enviados
+    unread_messages = models.IntegerField(default=0)  # mensajes del admin sin leer
+    cart_items = models.IntegerField(default=0)
+    cart_total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = 'Contadores de usuario'
+        verbose_name_plural = 'Contadores de usuario'
+
+
+class StaffCounters(models.Model):
+    """Contadores globales del panel de admin (fila única, pk=1)."""
+    unread_client_messages = models.IntegerField(default=0)  # respuestas de clientes sin leer
+    open_orders = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Contadores de admin'
+        verbose_name_plural = 'Contadores de admin'
+
+
+class OutboxEmail(models.Model):
+    """Email pendiente de envío (outbox transaccional). Se escribe en la misma transacción que
+    el pedido y lo entrega el worker send_outbox_emails. Un solo email por (evento, pedido)."""
+    STATUS_CHOICES = [
+        ('pending', 'Pendiente'),
+        ('sent', 'Enviado'),
+        ('failed', 'Fallido'),
+    ]
+
+    event = models.CharField(max_length=50)  # 'new_order', 'order_cancelled', 'contact'...
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, null=True, blank=True, related_name='outbox_emails')
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255)
+    recipients = models.TextField()  # separados por coma
+    reply_to = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Email en cola'
+        verbose_name_plural = 'Emails en cola'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['event', 'order'],
+                condition=models.Q(order__isnull=False),
+                name='orders_outbox_unique_event_order',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'id'], name='orders_outbox_status_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.event} -> {self.recipients} ({self.get_status_display()})'
+
+
+class OrderNumberCounter(models.Model):
+    """Último número de pedido asignado cada día (ver orders/numbering.py)."""
+    day = models.DateField(primary_key=True)
+    last_value = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Contador de números de pedido'
+        verbose_name_plural = 'Contadores de números de pedido'
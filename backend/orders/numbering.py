@@ -0,0 +1,119 @@
+# orders/numbering.py
+"""
+Números de pedido MUX-YYYYMMDD-XXXXXX sin colisiones.
+
+Antes eran 6 caracteres hex de un UUID contra una columna unique: con volumen
+aparecían IntegrityError en mitad del checkout. Ahora XXXXXX es un contador por día
+(tabla OrderNumberCounter) que empieza en 1 cada día; con más de 999999 pedidos en
+un día el sufijo pasa a 7 dígitos, nunca se repite.
+
+- PostgreSQL: cada proceso reserva bloques de ORDER_NUMBER_BLOCK_SIZE valores
+  (last_value = last_value + N ... RETURNING) en su propia conexión en autocommit, fuera
+  de la transacción del pedido: la fila del día solo se bloquea lo que dura ese UPDATE y
+  los checkouts simultáneos no se esperan entre sí. El rango [v-N+1, v] se reparte
+  desde memoria. Un rollback del pedido o un reinicio del worker dejan huecos, nunca
+  duplicados; dentro del día los números no salen en orden entre workers.
+- SQLite: la base de datos ya serializa todas las escrituras, así que el contador se
+  incrementa de uno en uno en la transacción del pedido (si se revierte, el número
+  vuelve a quedar libre). Una segunda conexión escribiendo mientras el checkout tiene
+  la base abierta solo añadiría esperas de bloqueo.
+- Otros motores: UPDATE y, si la fila del día no existe, INSERT (misma transacción).
+
+El número se asigna en Order.save() al crear el pedido, no como default del campo
+(el formulario de alta del admin lo evaluaría en cada render, gastando números).
+"""
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, transaction, IntegrityError
+from django.db.models import F
+from django.db.utils import load_backend
+from django.utils import timezone
+
+
+def format_order_number(day, value):
+    return f"MUX-{day.strftime('%Y%m%d')}-{value:06d}"
+
+
+def _counter_table(conn):
+    from .models import OrderNumberCounter
+
+    return conn.ops.quote_name(OrderNumberCounter._meta.db_table)
+
+
+def _add_to_daily_counter(conn, day, amount):
+    """Suma amount al contador del día (crea la fila si falta) y devuelve el nuevo último valor."""
+    table = _counter_table(conn)
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (day, last_value) VALUES (%s, %s) '
+            f'ON CONFLICT (day) DO UPDATE SET last_value = {table}.last_value + %s '
+            f'RETURNING last_value',
+            [day, amount, amount],
+        )
+        return cursor.fetchone()[0]
+
+
+class BlockAllocator:
+    """Reparte números del día desde bloques reservados en OrderNumberCounter (thread-safe)."""
+
+    def __init__(self, block_size=20):
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._day = None
+        self._next = 1
+        self._last = 0
+        self._connection = None
+
+    def next_value(self, day):
+        with self._lock:
+            if day != self._day or self._next > self._last:
+                self._last = self.reserve(day)
+                self._next = self._last - self.block_size + 1
+                self._day = day
+            value = self._next
+            self._next += 1
+            return value
+
+    def reserve(self, day):
+        """Reserva block_size valores del día y devuelve el último."""
+        return _add_to_daily_counter(self._reservation_connection(), day, self.block_size)
+
+    def _reservation_connection(self):
+        # Conexión propia en autocommit: el UPDATE se confirma al momento, aunque
+        # el pedido que pidió el número siga en su transacción
+        if self._connection is None:
+            backend = load_backend(connection.settings_dict['ENGINE'])
+            self._connection = backend.DatabaseWrapper(connection.settings_dict.copy(), DEFAULT_DB_ALIAS)
+            self._connection.inc_thread_sharing()  # la usan todos los hilos, de uno en uno (_lock)
+        self._connection.close_if_unusable_or_obsolete()
+        return self._connection
+
+
+def _next_daily_value(day):
+    """Incrementa el contador del día en la transacción actual y devuelve el nuevo valor."""
+    from .models import OrderNumberCounter
+
+    if connection.features.can_return_columns_from_insert and connection.vendor == 'sqlite':
+        return _add_to_daily_counter(connection, day, 1)
+
+    with transaction.atomic(savepoint=False):
+        if not OrderNumberCounter.objects.filter(day=day).update(last_value=F('last_value') + 1):
+            try:
+                with transaction.atomic():
+                    OrderNumberCounter.objects.create(day=day, last_value=1)
+                return 1
+            except IntegrityError:
+                # Otro proceso creó la fila del día entre medias
+                OrderNumberCounter.objects.filter(day=day).update(last_value=F('last_value') + 1)
+        return OrderNumberCounter.objects.filter(day=day).values_list('last_value', flat=True).get()
+
+
+_block_allocator = BlockAllocator(block_size=getattr(settings, 'ORDER_NUMBER_BLOCK_SIZE', 20))
+
+
+def next_order_number():
+    day = timezone.localdate()
+    if connection.vendor == 'postgresql':
+        return format_order_number(day, _block_allocator.next_value(day))
+    return format_order_number(day, _next_daily_value(day))
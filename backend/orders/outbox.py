@@ -0,0 +1,185 @@
+# orders/outbox.py
+"""
+Outbox transaccional de emails.
+
+Las vistas y el checkout no hablan con el servidor SMTP: encolan el email en la tabla
+OutboxEmail dentro de su propia transacción (si el pedido se revierte, el email
+también). El worker `python manage.py send_outbox_emails` los entrega por lotes
+reutilizando una única conexión SMTP. Los emails ligados a un pedido se deduplican
+por (evento, pedido): encolar dos veces el mismo aviso no envía dos correos.
+
+Si el servidor SMTP no responde, la pasada no envía nada: el error queda en el log y en
+last_error/attempts del siguiente lote (así también cuenta para max_attempts) y el
+worker con --loop lo reintenta en la próxima pasada.
+"""
+import logging
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from .models import Order, OutboxEmail
+
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_MAX_ATTEMPTS = 5
+
+logger = logging.getLogger(__name__)
+
+
+def admin_recipients():
+    admin_email = getattr(settings, 'ADMIN_EMAIL', None) or getattr(settings, 'DEFAULT_FROM_EMAIL', None)
+    return [admin_email] if admin_email else []
+
+
+def enqueue(event, subject, body, recipients, order=None, reply_to=''):
+    """Encola un email. Con order, un segundo aviso del mismo evento para el mismo pedido se ignora."""
+    recipients = [r for r in recipients if r]
+    if not recipients:
+        return
+    OutboxEmail.objects.bulk_create([
+        OutboxEmail(
+            event=event,
+            order=order,
+            subject=subject,
+            body=body,
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            recipients=','.join(recipients),
+            reply_to=reply_to,
+        )
+    ], ignore_conflicts=True)
+
+
+# --- Avisos de la tienda ---
+
+def enqueue_new_order(order, lines):
+    """Aviso al admin de un pedido nuevo. lines: las líneas del pedido (con product cargado)."""
+    detail = '\n'.join(f'  - {line.product.name} x {line.quantity}' for line in lines)
+    enqueue(
+        'new_order',
+        f'Nuevo Pedido: {order.order_number}',
+        (
+            f'Se ha recibido un nuevo pedido:\n\n'
+            f'Número de Pedido: {order.order_number}\n'
+            f'Usuario: {order.user.email} ({order.user.get_full_name()})\n'
+            f'Total: ${float(order.total):.2f}\n'
+            f'Método de Pago: {order.get_payment_method_display()}\n'
+            f'Items ({len(lines)}):\n{detail}\n\n'
+            'Accede al panel de administración para procesarlo.'
+        ),
+        admin_recipients(),
+        order=order,
+    )
+
+
+def enqueue_new_order_later(order_id):
+    """Tras el commit: aviso de un pedido creado fuera de place_order (admin, serializer)."""
+    def run():
+        order = Order.objects.select_related('user').filter(pk=order_id).first()
+        if order is not None:
+            enqueue_new_order(order, list(order.items.select_related('product')))
+    transaction.on_commit(run)
+
+
+def enqueue_order_cancelled(order, reason):
+    enqueue(
+        'order_cancelled',
+        f'Pedido cancelado por usuario: {order.order_number}',
+        (
+            f'El usuario {order.user.email} ha cancelado el pedido {order.order_number}.\n\n'
+            f'Motivo: {reason}\n\n'
+            'Revisa el panel de administración.'
+        ),
+        admin_recipients(),
+        order=order,
+    )
+
+
+# --- Worker ---
+
+def _claim_batch(batch_size, exclude_ids=()):
+    """Siguiente lote pendiente. En PostgreSQL las filas quedan bloqueadas (SKIP LOCKED) para
+    que varios workers no envíen el mismo email; debe llamarse dentro de una transacción."""
+    return list(
+        OutboxEmail.objects.select_for_update(skip_locked=True)
+        .filter(status='pending')
+        .exclude(pk__in=exclude_ids)
+        .order_by('id')[:batch_size]
+    )
+
+
+def _build_message(entry, connection):
+    return EmailMessage(
+        subject=entry.subject,
+        body=entry.body,
+        from_email=entry.from_email,
+        to=entry.recipients.split(','),
+        reply_to=[entry.reply_to] if entry.reply_to else None,
+        connection=connection,
+    )
+
+
+def deliver_batch(connection, batch_size=DEFAULT_BATCH_SIZE, max_attempts=DEFAULT_MAX_ATTEMPTS, exclude_ids=()):
+    """Envía un lote por la conexión dada (ya abierta). Devuelve (ids enviados, ids fallidos)."""
+    sent_ids, failed_ids = [], []
+    with transaction.atomic():
+        for entry in _claim_batch(batch_size, exclude_ids):
+            try:
+                connection.send_messages([_build_message(entry, connection)])
+            except Exception as e:
+                failed_ids.append(entry.pk)
+                OutboxEmail.objects.filter(pk=entry.pk).update(
+                    attempts=F('attempts') + 1,
+                    last_error=str(e)[:1000],
+                    status='failed' if entry.attempts + 1 >= max_attempts else 'pending',
+                )
+                # La conexión puede haber quedado inservible: se reabre para el resto del lote
+                try:
+                    connection.close()
+                    connection.open()
+                except Exception:
+                    break  # servidor caído: se guarda lo enviado y se reintenta en la próxima pasada
+            else:
+                sent_ids.append(entry.pk)
+        if sent_ids:
+            OutboxEmail.objects.filter(pk__in=sent_ids).update(
+                status='sent', sent_at=timezone.now(), attempts=F('attempts') + 1, last_error='',
+            )
+    return sent_ids, failed_ids
+
+
+def _record_connection_failure(error, batch_size, max_attempts):
+    """Sin conexión: cuenta un intento fallido para el siguiente lote pendiente."""
+    with transaction.atomic():
+        ids = [entry.pk for entry in _claim_batch(batch_size)]
+        OutboxEmail.objects.filter(pk__in=ids).update(
+            attempts=F('attempts') + 1,
+            last_error=str(error)[:1000],
+            status=Case(When(attempts__gte=max_attempts - 1, then=Value('failed')), default=Value('pending')),
+        )
+
+
+def deliver_pending(batch_size=DEFAULT_BATCH_SIZE, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """Vacía la cola con una sola conexión SMTP (cada email fallido se reintenta en la
+    siguiente pasada, no en esta). Devuelve (enviados, fallidos)."""
+    sent, failed = [], []
+    if not OutboxEmail.objects.filter(status='pending').exists():
+        return 0, 0
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as e:
+        logger.exception('Outbox: no se pudo conectar al servidor de correo')
+        _record_connection_failure(e, batch_size, max_attempts)
+        return 0, 0
+    try:
+        while True:
+            batch_sent, batch_failed = deliver_batch(connection, batch_size, max_attempts, exclude_ids=failed)
+            sent += batch_sent
+            failed += batch_failed
+            if len(batch_sent) + len(batch_failed) < batch_size:
+                break
+    finally:
+        connection.close()
+    return len(sent), len(failed)
@@ -0,0 +1,101 @@
+# orders/pagination.py
+"""
+Listados de pedidos por cursor sobre (created_at, id) y totales aproximados.
+
+Paginator hacía COUNT(*) + OFFSET en cada página: el coste crecía con el historial.
+Ahora cada página es un seek por el índice (muxdry/pagination.py) y el total sale de:
+
+- PostgreSQL: la estimación del planner (EXPLAIN); si es pequeña (< ORDER_COUNT_EXACT_BELOW)
+  se cuenta exacto, que ahí es barato.
+- Otros motores: COUNT(*) cacheado ORDER_COUNT_CACHE_SECONDS por consulta.
+
+Lo usan admin_orders_view, current_orders_view, profile_view y la API de OrderViewSet.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from rest_framework.exceptions import ParseError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+
+from muxdry.pagination import KeysetPaginator, InvalidCursor
+
+ORDER_LIST_ORDERING = ('-created_at', '-id')
+ORDER_PAGE_SIZE = 18
+CURSOR_PARAM = 'after'
+
+
+def _planner_rows(queryset):
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def estimated_count(queryset):
+    """(total, es_aproximado) del queryset sin recorrerlo entero en cada página."""
+    queryset = queryset.order_by().values('pk')
+    if connection.vendor == 'postgresql':
+        rows = _planner_rows(queryset)
+        if rows >= getattr(settings, 'ORDER_COUNT_EXACT_BELOW', 1000):
+            return rows, True
+        return queryset.count(), False
+    sql, params = queryset.query.sql_with_params()
+    key = 'orders:count:' + hashlib.blake2b(f'{sql}|{params!r}'.encode('utf-8'), digest_size=16).hexdigest()
+    total = cache.get(key)
+    if total is not None:
+        return total, True
+    total = queryset.count()
+    cache.set(key, total, getattr(settings, 'ORDER_COUNT_CACHE_SECONDS', 30))
+    return total, False
+
+
+def paginate_orders(request, queryset, per_page=ORDER_PAGE_SIZE, strict=False, **extra_params):
+    """Página de pedidos tras ?after= (más recientes primero). Devuelve un KeysetPage con
+    count, count_is_estimate, next_url y first_url (conservan los filtros del GET y extra_params).
+    Cursor inválido: primera página, o InvalidCursor con strict=True."""
+    paginator = KeysetPaginator(queryset, ORDER_LIST_ORDERING, per_page)
+    try:
+        page = paginator.page(request.GET.get(CURSOR_PARAM) or None)
+    except InvalidCursor:
+        if strict:
+            raise
+        page = paginator.page()
+    page.count, page.count_is_estimate = estimated_count(queryset)
+    params = request.GET.copy()
+    params.pop(CURSOR_PARAM, None)
+    params.pop('page', None)
+    params.update(extra_params)
+    page.first_url = f'{request.path}?{params.urlencode()}' if page.cursor else None
+    page.next_url = None
+    if page.has_next:
+        params[CURSOR_PARAM] = page.next_cursor
+        page.next_url = f'{request.path}?{params.urlencode()}'
+    return page
+
+
+class OrderCursorPagination(BasePagination):
+    """Paginación de la API de pedidos: {count, count_is_estimate, next, results}. Cursor inválido: 400."""
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        try:
+            self.page = paginate_orders(request, queryset, strict=True)
+        except InvalidCursor:
+            raise ParseError('Cursor no válido')
+        return self.page.items
+
+    def get_paginated_response(self, data):
+        next_url = self.page.next_url and self.request.build_absolute_uri(self.page.next_url)
+        return Response({
+            'count': self.page.count,
+            'count_is_estimate': self.page.count_is_estimate,
+            'next': next_url,
+            'results': data,
+        })
@@ -0,0 +1,219 @@
+# orders/receipts.py
+"""
+Ingesta de los comprobantes de pago que el cliente adjunta en el chat del pedido.
+
+En el request (client_send_message_view):
+- ReceiptUploadHandler escribe la subida directo a un archivo temporal por trozos (nunca
+  entera en memoria) y la descarta en cuanto supera RECEIPT_MAX_BYTES.
+- open_receipt() comprueba con Pillow que de verdad es PNG o JPEG (solo lee la cabecera).
+- strip_metadata() copia el archivo quitando EXIF/XMP/IPTC, comentarios y texto PNG sin
+  recomprimir; de la EXIF solo se conserva la orientación. Ese es el original (image).
+
+Tras el commit, en un hilo (process_in_background), se generan la copia para ver
+(image_display, lado mayor DISPLAY_MAX_SIZE) y la miniatura del chat (image_thumb).
+Hasta entonces el chat muestra el original. Lo que quede sin procesar (p.ej. el
+proceso se reinició) lo completa `python manage.py process_receipt_images`.
+"""
+import io
+import logging
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.uploadhandler import SkipFile, TemporaryFileUploadHandler
+from django.db import connection
+from PIL import Image, ImageOps
+
+from .models import OrderMessage
+
+logger = logging.getLogger(__name__)
+
+RECEIPT_MAX_BYTES = 10 * 1024 * 1024
+RECEIPT_FORMATS = ('PNG', 'JPEG')
+DISPLAY_MAX_SIZE = 1600
+THUMB_MAX_SIZE = 320
+
+ORIENTATION_TAG = 0x0112
+# Segmentos JPEG que se conservan entre los APPn: ICC (APP2) y Adobe (APP14, transformación de color)
+JPEG_KEEP_APP = (0xE2, 0xEE)
+JPEG_STANDALONE = {0x01, *range(0xD0, 0xD8)}
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+PNG_DROP_CHUNKS = (b'eXIf', b'tEXt', b'zTXt', b'iTXt', b'tIME')
+
+
+class ReceiptUploadHandler(TemporaryFileUploadHandler):
+    """Sube siempre a disco y deja de aceptar un archivo al pasar de RECEIPT_MAX_BYTES (too_large)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.too_large = False
+        self._received = 0
+
+    def new_file(self, *args, **kwargs):
+        self._received = 0
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        self._received += len(raw_data)
+        if self._received > RECEIPT_MAX_BYTES:
+            self.too_large = True
+            raise SkipFile  # el parser cierra (y borra) el temporal
+        return super().receive_data_chunk(raw_data, start)
+
+
+def open_receipt(upload):
+    """Formato real del archivo (PNG/JPEG) y su orientación EXIF; None si no es una imagen válida."""
+    try:
+        upload.seek(0)
+        with Image.open(upload) as image:
+            if image.format not in RECEIPT_FORMATS:
+                return None
+            orientation = image.getexif().get(ORIENTATION_TAG, 1) if image.format == 'JPEG' else 1
+            return image.format, orientation
+    except (OSError, Image.DecompressionBombError):
+        return None
+    finally:
+        upload.seek(0)
+
+
+def _orientation_segment(orientation):
+    exif = Image.Exif()
+    exif[ORIENTATION_TAG] = orientation
+    data = exif.tobytes()
+    return b'\xff\xe1' + struct.pack('>H', len(data) + 2) + data
+
+
+def _strip_jpeg(src, dst, orientation):
+    if src.read(2) != b'\xff\xd8':
+        raise ValueError('JPEG sin SOI')
+    dst.write(b'\xff\xd8')
+    wrote_orientation = orientation == 1
+    while True:
+        marker = src.read(2)
+        while marker[:1] == b'\xff' and marker[1:] == b'\xff':  # bytes de relleno
+            marker = b'\xff' + src.read(1)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            raise ValueError('JPEG corrupto')
+        code = marker[1]
+        if code in JPEG_STANDALONE:
+            dst.write(marker)
+            continue
+        if code == 0xDA:  # SOS: desde aquí son datos de imagen
+            if not wrote_orientation:
+                dst.write(_orientation_segment(orientation))
+            dst.write(marker)
+            shutil.copyfileobj(src, dst)
+            return
+        (length,) = struct.unpack('>H', src.read(2))
+        payload = src.read(length - 2)
+        if (0xE1 <= code <= 0xEF and code not in JPEG_KEEP_APP) or code == 0xFE:
+            if code == 0xE1 and payload.startswith(b'Exif\x00\x00') and not wrote_orientation:
+                dst.write(_orientation_segment(orientation))
+                wrote_orientation = True
+            continue
+        dst.write(marker + struct.pack('>H', length) + payload)
+
+
+def _strip_png(src, dst):
+    if src.read(8) != PNG_SIGNATURE:
+        raise ValueError('PNG sin firma')
+    dst.write(PNG_SIGNATURE)
+    while True:
+        header = src.read(8)
+        if len(header) < 8:
+            return
+        (length,) = struct.unpack('>I', header[:4])
+        kind = header[4:]
+        body = src.read(length + 4)  # datos + CRC
+        if kind not in PNG_DROP_CHUNKS:
+            dst.write(header + body)
+        if kind == b'IEND':
+            return
+
+
+def strip_metadata(upload, image_format, orientation=1):
+    """Copia sin metadatos del comprobante en un archivo temporal (hay que cerrarlo)."""
+    stripped = tempfile.NamedTemporaryFile(suffix='.upload', dir=settings.FILE_UPLOAD_TEMP_DIR)
+    upload.seek(0)
+    if image_format == 'JPEG':
+        _strip_jpeg(upload, stripped, orientation)
+    else:
+        _strip_png(upload, stripped)
+    stripped.seek(0)
+    return stripped
+
+
+def receipt_file(upload):
+    """File sin metadatos listo para OrderMessage.image, o None si no es un PNG/JPEG válido."""
+    opened = open_receipt(upload)
+    if opened is None:
+        return None
+    image_format, orientation = opened
+    try:
+        stripped = strip_metadata(upload, image_format, orientation)
+    except (ValueError, struct.error):
+        return None
+    extension = 'jpg' if image_format == 'JPEG' else 'png'
+    return File(stripped, name=f'{uuid.uuid4().hex}.{extension}')
+
+
+# --- Copias derivadas (fuera del request) ---
+
+def _jpeg_bytes(image, max_size, quality):
+    copy = image.copy()
+    copy.thumbnail((max_size, max_size), Image.LANCZOS)
+    if copy.mode in ('RGBA', 'LA', 'P'):
+        copy = copy.convert('RGBA')
+        background = Image.new('RGB', copy.size, (255, 255, 255))
+        background.paste(copy, mask=copy.getchannel('A'))
+        copy = background
+    elif copy.mode != 'RGB':
+        copy = copy.convert('RGB')
+    buffer = io.BytesIO()
+    copy.save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def process_receipt(message_id):
+    """Genera image_display e image_thumb del mensaje. True si quedó procesado."""
+    message = OrderMessage.objects.filter(pk=message_id).only('id', 'image', 'image_display', 'image_thumb').first()
+    if message is None or not message.image or message.image_thumb:
+        return False
+    try:
+        with message.image.open('rb') as original, Image.open(original) as image:
+            image = ImageOps.exif_transpose(image)  # la orientación conservada en strip_metadata
+            image.load()
+            display = _jpeg_bytes(image, DISPLAY_MAX_SIZE, 82)
+            thumb = _jpeg_bytes(image, THUMB_MAX_SIZE, 72)
+    except (OSError, Image.DecompressionBombError):
+        return False
+    stem = os.path.splitext(os.path.basename(message.image.name))[0]
+    message.image_display.save(f'{stem}.jpg', ContentFile(display), save=False)
+    message.image_thumb.save(f'{stem}.jpg', ContentFile(thumb), save=False)
+    OrderMessage.objects.filter(pk=message.pk).update(
+        image_display=message.image_display.name,
+        image_thumb=message.image_thumb.name,
+    )
+    return True
+
+
+def process_in_background(message_id):
+    def run():
+        try:
+            process_receipt(message_id)
+        except Exception:
+            # Queda pendiente para process_receipt_images
+            logger.exception('No se pudieron generar las copias del comprobante del mensaje %s', message_id)
+        finally:
+            connection.close()  # conexión propia de este hilo
+    threading.Thread(target=run, name='receipt-images', daemon=True).start()
+
+
+def pending_receipts():
+    return OrderMessage.objects.exclude(image='').exclude(image__isnull=True).filter(image_thumb='')
@@ -1,52 +1,118 @@
-from django.db.models.signals import pre_save, post_save
-from django.db.models import F
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
-from django.core.mail import send_mail
-from django.conf import settings
-from .models import Order
-
-# Almacena el status anterior para detectar transición a 'delivered'
-_prev_order_status = {}
+from products.models import Product
+from .models import Order, OrderMessage, Cart, CartItem
+from . import counters, events
+from .message_cache import message_cache
+from .outbox import enqueue_new_order_later
+from .transitions import stamp_status_dates, apply_sales_count
 
 
 @receiver(pre_save, sender=Order)
-def _store_prev_order_status(sender, instance, **kwargs):
-    if instance.pk:
-        try:
-            old = Order.objects.only('status').get(pk=instance.pk)
-            _prev_order_status[instance.pk] = old.status
-        except Order.DoesNotExist:
-            pass
+def stamp_order_status_dates(sender, instance, **kwargs):
+    """Marca shipped_at/delivered_at al cambiar el status con save()."""
+    if instance.has_changed('status'):
+        stamp_status_dates(instance)
 
 
 @receiver(post_save, sender=Order)
 def update_sales_count_on_delivered(sender, instance, **kwargs):
-    """Incrementa sales_count de cada producto cuando el pedido pasa a 'delivered'."""
-    prev = _prev_order_status.pop(instance.pk, None)
-    if instance.status != 'delivered' or prev == 'delivered':
+    """Ajusta sales_count cuando el pedido entra en (o sale de) 'delivered'. Un solo UPDATE."""
+    if not instance.has_changed('status'):
         return
-    for item in instance.items.all():
-        item.product.sales_count = F('sales_count') + item.quantity
-        item.product.save(update_fields=['sales_count'])
+    if instance.status == 'delivered':
+        apply_sales_count([instance.pk], 1)
+    elif instance.original_value('status') == 'delivered':
+        apply_sales_count([instance.pk], -1)
+
+
+@receiver(post_save, sender=Order)
+def enqueue_admin_email_on_new_order(sender, instance, created, **kwargs):
+    """Aviso al admin de los pedidos creados fuera de place_order (admin, API); place_order
+    lo encola en su propia transacción."""
+    if created and instance.status == 'pending' and not getattr(instance, '_new_order_enqueued', False):
+        enqueue_new_order_later(instance.pk)
 
 
+# --- Contadores de badges (orders/counters.py) ---
+
 @receiver(post_save, sender=Order)
-def notify_admin_on_new_order(sender, instance, created, **kwargs):
-    """Envía email al admin cuando se crea un nuevo pedido"""
-    if created and instance.status == 'pending':
-        try:
-            send_mail(
-                subject=f'🔔 Nuevo Pedido: {instance.order_number}',
-                message=f'Se ha recibido un nuevo pedido:\n\n'
-                       f'📦 Número de Pedido: {instance.order_number}\n'
-                       f'👤 Usuario: {instance.user.email} ({instance.user.get_full_name()})\n'
-                       f'💰 Total: ${instance.total:.2f}\n'
-                       f'📊 Items: {instance.items.count()}\n'
-                       f'💳 Método de Pago: {instance.get_payment_method_display()}\n\n'
-                       f'Accede al panel de administración para procesarlo.',
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[settings.ADMIN_EMAIL],
-                fail_silently=True,
-            )
-        except Exception:
-            pass
+def update_counters_on_order_save(sender, instance, created, **kwargs):
+    if created:
+        if instance.status in counters.OPEN_ORDER_STATUSES:
+            counters.bump_user_counters(instance.user_id, open_orders=1)
+            counters.bump_staff_counters(open_orders=1)
+        events.publish_new_order(instance)
+        return
+    if instance.has_changed('status'):
+        counters.refresh_order_counters([instance.user_id])
+
+
+@receiver(post_delete, sender=Order)
+def update_counters_on_order_delete(sender, instance, **kwargs):
+    # Borrado en cascada: también arrastra mensajes sin leer
+    counters.refresh_user_counters(instance.user_id)
+    counters.refresh_staff_counters()
+
+
+@receiver(post_save, sender=OrderMessage)
+def update_counters_on_message_save(sender, instance, created, **kwargs):
+    if not created:
+        return
+    user_id = instance.order.user_id
+    if instance.is_from_admin and instance.read_at is None:
+        counters.bump_user_counters(user_id, unread_messages=1)
+    elif not instance.is_from_admin and instance.read_by_admin_at is None:
+        counters.bump_staff_counters(unread_client_messages=1)
+    events.publish_new_message(instance, user_id)
+
+
+@receiver(post_delete, sender=OrderMessage)
+def update_counters_on_message_delete(sender, instance, **kwargs):
+    if instance.is_from_admin and instance.read_at is None:
+        user_id = Order.objects.filter(pk=instance.order_id).values_list('user_id', flat=True).first()
+        if user_id:
+            counters.bump_user_counters(user_id, unread_messages=-1)
+    elif not instance.is_from_admin and instance.read_by_admin_at is None:
+        counters.bump_staff_counters(unread_client_messages=-1)
+
+
+def _refresh_cart_counters(cart_id):
+    if counters.in_bulk_cart_update():
+        return
+    user_id = Cart.objects.filter(pk=cart_id).values_list('user_id', flat=True).first()
+    if user_id:
+        counters.refresh_user_counters(user_id, 'cart')
+
+
+@receiver(post_save, sender=CartItem)
+def update_counters_on_cart_item_save(sender, instance, **kwargs):
+    _refresh_cart_counters(instance.cart_id)
+
+
+@receiver(post_delete, sender=CartItem)
+def update_counters_on_cart_item_delete(sender, instance, **kwargs):
+    _refresh_cart_counters(instance.cart_id)
+
+
+@receiver(post_save, sender=Product)
+def update_cart_counters_on_price_change(sender, instance, created, update_fields=None, **kwargs):
+    """El total del carrito depende del precio: recalcula los carritos que contienen el producto."""
+    if created or (update_fields is not None and 'price' not in update_fields):
+        return
+    if not instance.has_changed('price'):
+        return
+    counters.refresh_cart_totals(instance.pk)
+
+
+# --- Caché de mensajes descifrados (orders/message_cache.py) ---
+
+@receiver(post_save, sender=OrderMessage)
+def evict_message_cache_on_update(sender, instance, created, **kwargs):
+    if not created:
+        message_cache.evict(instance.pk)
+
+
+@receiver(post_delete, sender=OrderMessage)
+def evict_message_cache_on_delete(sender, instance, **kwargs):
+    message_cache.evict(instance.pk)
@@ -0,0 +1,422 @@
+import asyncio
+import datetime
+import threading
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+from django.contrib.auth.models import User
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.db import connection, transaction
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+
+from . import events, numbering
+from products.models import Category, Product
+from .checkout import CheckoutError, place_order
+from .counters import get_user_counters
+from .message_cache import message_cache
+from .models import Cart, CartItem, Order, OrderItem, OrderMessage, OrderNumberCounter, OutboxEmail, UserCounters
+from .pagination import paginate_orders
+from .transitions import transition_orders
+from .views import _event_stream
+
+
+class LocalBrokerTests(TestCase):
+
+    def test_publish_reaches_subscribers_of_the_channel(self):
+        broker = events.LocalBroker()
+
+        async def scenario():
+            sub = broker.subscribe(['user:1', 'staff'])
+            other = broker.subscribe(['user:2'])
+            # publish() se llama desde hilos sync (signals, vistas)
+            thread = threading.Thread(target=broker.publish, args=('user:1', 'unread', {'client_unread': 3}))
+            thread.start()
+            thread.join()
+            broker.publish('staff', 'new_order', {'order_id': 7})
+            first = await sub.get(timeout=1)
+            second = await sub.get(timeout=1)
+            nothing = await other.get(timeout=0.05)
+            broker.unsubscribe(sub)
+            broker.unsubscribe(other)
+            return first, second, nothing
+
+        first, second, nothing = asyncio.run(scenario())
+        self.assertEqual(first, ('unread', {'client_unread': 3}))
+        self.assertEqual(second, ('new_order', {'order_id': 7}))
+        self.assertIsNone(nothing)
+        self.assertEqual(broker.subscriber_count('user:1'), 0)
+        self.assertEqual(broker.subscriber_count('staff'), 0)
+
+    def test_slow_client_drops_events_instead_of_blocking(self):
+        broker = events.LocalBroker(maxsize=2)
+
+        async def scenario():
+            sub = broker.subscribe(['staff'])
+            for i in range(5):
+                broker.publish('staff', 'message', {'n': i})
+            await asyncio.sleep(0)
+            received = [await sub.get(timeout=0.05) for _ in range(3)]
+            broker.unsubscribe(sub)
+            return received
+
+        received = asyncio.run(scenario())
+        self.assertEqual(received, [('message', {'n': 0}), ('message', {'n': 1}), None])
+
+    def test_format_sse(self):
+        self.assertEqual(events.format_sse('unread', {'admin_unread': 2}), 'event: unread\ndata: {"admin_unread": 2}\n\n')
+
+
+class PublishOnCommitTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('cliente', 'cliente@example.com', 'pw12345678')
+        self.staff = User.objects.create_user('admin', 'admin@example.com', 'pw12345678', is_staff=True)
+        self.order = Order.objects.create(user=self.user, subtotal=Decimal('10'), total=Decimal('10'))
+        self.published = []
+        broker = events.get_broker()
+        original = broker.publish
+        broker.publish = lambda *args: self.published.append(args)
+        self.addCleanup(setattr, broker, 'publish', original)
+
+    def test_admin_message_is_published_to_the_client_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            message = OrderMessage.objects.create(order=self.order, sender=self.staff, message='Hola', is_from_admin=True)
+        self.assertNotIn('message', [event for _, event, _ in self.published])
+        for callback in callbacks:
+            callback()
+        self.assertIn(
+            (events.user_channel(self.user.pk), 'message',
+             {'order_id': self.order.pk, 'message_id': message.pk, 'is_from_admin': True}),
+            self.published,
+        )
+
+    def test_client_message_goes_to_staff(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            OrderMessage.objects.create(order=self.order, sender=self.user, message='Pagado', is_from_admin=False)
+        channels = [channel for channel, event, _ in self.published if event == 'message']
+        self.assertEqual(channels, [events.STAFF_CHANNEL])
+
+
+class EventsStreamViewTests(TestCase):
+    url = '/orders/api/eventos/'
+
+    def setUp(self):
+        self.user = User.objects.create_user('cliente', 'cliente@example.com', 'pw12345678')
+
+    def test_wsgi_answers_204(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(self.url).status_code, 204)
+
+    async def test_anonymous_is_rejected(self):
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response.status_code, 401)
+
+    async def test_stream_sends_initial_count_and_published_events(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        try:
+            self.assertEqual(await anext(stream), b'retry: 5000\n\n')
+            self.assertEqual(await anext(stream), b'event: unread\ndata: {"client_unread": 0}\n\n')
+            broker = events.get_broker()
+            self.assertEqual(broker.subscriber_count(events.user_channel(self.user.pk)), 1)
+            broker.publish(events.user_channel(self.user.pk), 'message', {'order_id': 1})
+            broker.publish(events.STAFF_CHANNEL, 'new_order', {'order_id': 1})  # no es staff
+            self.assertEqual(await anext(stream), b'event: message\ndata: {"order_id": 1}\n\n')
+        finally:
+            await stream.aclose()
+
+    async def test_closing_the_stream_unsubscribes(self):
+        broker = events.get_broker()
+        stream = _event_stream(['user:99'], {'client_unread': 0})
+        await anext(stream)
+        self.assertEqual(broker.subscriber_count('user:99'), 1)
+        await stream.aclose()  # el cliente se desconectó
+        self.assertEqual(broker.subscriber_count('user:99'), 0)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'LISTEN/NOTIFY requiere PostgreSQL')
+class PostgresBrokerTests(TransactionTestCase):
+
+    def test_notify_reaches_listener(self):
+        broker = events.PostgresBroker()
+
+        async def scenario():
+            sub = broker.subscribe(['staff'])
+            await asyncio.sleep(0.5)  # el hilo abre su conexión y hace LISTEN
+            await asyncio.to_thread(broker.publish, 'staff', 'new_order', {'order_id': 1})
+            item = await sub.get(timeout=5)
+            broker.unsubscribe(sub)
+            return item
+
+        self.assertEqual(asyncio.run(scenario()), ('new_order', {'order_id': 1}))
+
+
+class OrderPaginationTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('cliente', 'cliente@example.com', 'x')
+        for _ in range(5):
+            Order.objects.create(user=self.user, status='pending')
+        # Mismo created_at en todos: el id desempata entre páginas
+        Order.objects.update(created_at=timezone.now())
+        self.expected = list(Order.objects.order_by('-id').values_list('id', flat=True))
+
+    def test_pages_through_equal_dates_without_gaps_or_repeats(self):
+        ids, url = [], '/orders/mis-pedidos/'
+        while url:
+            page = paginate_orders(RequestFactory().get(url), Order.objects.all(), per_page=2)
+            ids.extend(o.id for o in page)
+            url = page.next_url
+        self.assertEqual(ids, self.expected)
+
+    def test_invalid_cursor_restarts_html_and_is_rejected_by_api(self):
+        self.client.force_login(self.user)
+        response = self.client.get('/orders/mis-pedidos/', {'after': 'garbage'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([o.id for o in response.context['pedidos']], self.expected)
+        self.assertIsNone(response.context['page_obj'].first_url)
+
+        api = APIClient()
+        api.force_authenticate(self.user)
+        self.assertEqual(api.get('/orders/orders/', {'after': 'garbage'}).status_code, 400)
+        data = api.get('/orders/orders/').json()
+        self.assertEqual([row['id'] for row in data['results']], self.expected)
+
+
+@mock.patch('orders.views.CHAT_PAGE_SIZE', 2)
+class ChatCursorTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('cliente', 'cliente@example.com', 'x')
+        self.order = Order.objects.create(user=self.user, status='pending')
+        self.ids = [
+            OrderMessage.objects.create(order=self.order, sender=self.user, message=f'm{i}').id
+            for i in range(5)
+        ]
+        self.client.force_login(self.user)
+        self.url = f'/orders/pedido/{self.order.id}/mensajes/'
+
+    def _ids(self, **params):
+        data = self.client.get(self.url, params).json()
+        return [m['id'] for m in data['messages']], data
+
+    def test_older_and_newer_pages(self):
+        ids, data = self._ids()
+        self.assertEqual(ids, self.ids[-2:])
+        self.assertTrue(data['has_older'])
+        ids, data = self._ids(before_id=self.ids[3])
+        self.assertEqual(ids, self.ids[1:3])
+        ids, data = self._ids(since_id=self.ids[0])
+        self.assertEqual(ids, self.ids[1:3])
+        self.assertTrue(data['has_newer'])
+        self.assertEqual(self._ids(since_id=self.ids[-1])[0], [])
+
+    def test_malformed_cursor_is_rejected(self):
+        for params in ({'since_id': 'garbage'}, {'before_id': '-1'}, {'since_id': str(10 ** 30)}):
+            self.assertEqual(self.client.get(self.url, params).status_code, 400, params)
+
+
+class MessageCacheStatsViewTests(TestCase):
+
+    def setUp(self):
+        message_cache.clear()
+        self.addCleanup(message_cache.clear)
+        self.user = User.objects.create_user('cliente', 'cliente@example.com', 'x')
+        order = Order.objects.create(user=self.user)
+        self.pk = OrderMessage.objects.create(order=order, sender=self.user, message='hola').pk
+        self.url = '/orders/api/cache-stats/'
+
+    def test_staff_only(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+    def test_reports_and_resets_counters(self):
+        message_cache.clear()
+        for _ in range(2):
+            OrderMessage.objects.get(pk=self.pk).message
+        self.client.force_login(User.objects.create_user('staff', 'staff@example.com', 'x', is_staff=True))
+        data = self.client.get(self.url, {'reset': 1}).json()
+        self.assertEqual((data['misses'], data['hits'], data['size']), (1, 1, 1))
+        data = self.client.get(self.url).json()
+        self.assertEqual((data['misses'], data['hits'], data['size']), (0, 0, 1))
+
+
+class OrderNumberTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('cliente', 'cliente@example.com', 'pw12345678')
+
+    def test_numbers_are_assigned_on_save_and_restart_every_day(self):
+        day = datetime.date(2026, 3, 1)
+        with mock.patch('django.utils.timezone.localdate', return_value=day):
+            first = Order.objects.create(user=self.user)
+            second = Order.objects.create(user=self.user)
+        with mock.patch('django.utils.timezone.localdate', return_value=day + datetime.timedelta(days=1)):
+            next_day = Order.objects.create(user=self.user)
+        if connection.vendor == 'sqlite':
+            self.assertEqual(
+                [first.order_number, second.order_number, next_day.order_number],
+                ['MUX-20260301-000001', 'MUX-20260301-000002', 'MUX-20260302-000001'],
+            )
+        self.assertNotEqual(first.order_number, second.order_number)
+        self.assertTrue(next_day.order_number.startswith('MUX-20260302-'))
+
+    def test_existing_number_is_kept(self):
+        order = Order.objects.create(user=self.user, order_number='MUX-20200101-000009')
+        self.assertEqual(order.order_number, 'MUX-20200101-000009')
+        self.assertFalse(OrderNumberCounter.objects.exists())
+
+    def test_suffix_does_not_wrap(self):
+        self.assertEqual(numbering.format_order_number(datetime.date(2026, 3, 1), 1234567), 'MUX-20260301-1234567')
+
+    def test_admin_add_form_does_not_allocate_numbers(self):
+        admin = User.objects.create_superuser('root', 'root@example.com', 'pw12345678')
+        self.client.force_login(admin)
+        for _ in range(2):
+            self.assertEqual(self.client.get('/panel-interno-mux/orders/order/add/').status_code, 200)
+        self.assertFalse(OrderNumberCounter.objects.exists())
+
+
+class BlockAllocatorTests(TestCase):
+
+    def test_hands_out_reserved_ranges_per_day(self):
+        allocator = numbering.BlockAllocator(block_size=3)
+        reserved = {}
+
+        def reserve(day):
+            reserved[day] = reserved.get(day, 0) + allocator.block_size
+            return reserved[day]
+
+        allocator.reserve = reserve
+        day = datetime.date(2026, 3, 1)
+        self.assertEqual([allocator.next_value(day) for _ in range(4)], [1, 2, 3, 4])
+        self.assertEqual(reserved[day], 6)
+        self.assertEqual(allocator.next_value(day + datetime.timedelta(days=1)), 1)
+
+    @skipUnless(connection.vendor == 'postgresql', 'la reserva en conexión propia es para PostgreSQL')
+    def test_reservation_commits_outside_the_order_transaction(self):
+        allocator = numbering.BlockAllocator(block_size=5)
+        day = datetime.date(2000, 1, 1)
+        try:
+            with transaction.atomic():
+                last = allocator.reserve(day)
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertEqual(allocator.reserve(day), last + 5)
+
+
+class TransitionOrdersTests(TestCase):
+
+    def setUp(self):
+        category = Category.objects.create(name='Barras', slug='barras')
+        self.products = [
+            Product.objects.create(
+                name=f'Producto {i}', slug=f'producto-{i}', description='-', category=category,
+                price=Decimal('2.00'), sku=f'SKU-{i}', stock=50,
+            )
+            for i in range(2)
+        ]
+
+    def _orders(self, users, status='confirmed'):
+        orders = []
+        for n, user in enumerate(users):
+            order = Order.objects.create(user=user, status=status)
+            for product in self.products:
+                OrderItem.objects.create(order=order, product=product, quantity=n + 1, price=product.price)
+            orders.append(order)
+        return orders
+
+    def _sales(self):
+        return list(Product.objects.order_by('pk').values_list('sales_count', flat=True))
+
+    def test_bulk_delivery_counts_sales_once_and_keeps_existing_dates(self):
+        user = User.objects.create_user('cliente', 'cliente@example.com', 'pw12345678')
+        orders = self._orders([user, user, user])
+        earlier = timezone.now() - datetime.timedelta(days=3)
+        Order.objects.filter(pk=orders[0].pk).update(status='shipped', delivered_at=earlier)
+        ids = [order.pk for order in orders]
+
+        self.assertEqual(transition_orders(ids, 'delivered'), 3)
+        self.assertEqual(self._sales(), [6, 6])  # 1 + 2 + 3 por producto
+        self.assertEqual(transition_orders(ids, 'delivered'), 0)
+        self.assertEqual(self._sales(), [6, 6])
+        dates = dict(Order.objects.filter(pk__in=ids).values_list('pk', 'delivered_at'))
+        self.assertEqual(dates[orders[0].pk], earlier)
+        self.assertTrue(all(dates[pk] and dates[pk] > earlier for pk in ids[1:]))
+
+        self.assertEqual(transition_orders(ids[2:], 'cancelled'), 1)
+        self.assertEqual(self._sales(), [3, 3])
+
+    def test_counters_are_refreshed_with_a_fixed_number_of_queries(self):
+        def run(n):
+            users = [User.objects.create_user(f'u{n}-{i}', f'u{n}-{i}@example.com', 'pw') for i in range(n)]
+            for user in users[::2]:
+                get_user_counters(user)  # unos con fila de contadores y otros sin ella
+            orders = self._orders(users)
+            with CaptureQueriesContext(connection) as ctx:
+                transition_orders([order.pk for order in orders], 'delivered')
+            return users, len(ctx.captured_queries)
+
+        _, few = run(2)
+        users, many = run(6)
+        self.assertEqual(few, many)
+        self.assertEqual(
+            list(UserCounters.objects.filter(user__in=users).values_list('open_orders', flat=True)),
+            [0] * len(users),
+        )
+        self.assertEqual(transition_orders(Order.objects.filter(user=users[1]), 'shipped'), 1)
+        self.assertEqual(UserCounters.objects.get(user=users[1]).open_orders, 1)
+
+
+@override_settings(ADMIN_EMAIL='admin@example.com')
+class PlaceOrderTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('cliente', 'cliente@example.com', 'pw12345678')
+        category = Category.objects.create(name='Barras', slug='barras')
+        self.bar = Product.objects.create(
+            name='Barra', slug='barra', description='-', category=category, price=Decimal('3.00'), sku='B1', stock=5,
+        )
+        self.gel = Product.objects.create(
+            name='Gel', slug='gel', description='-', category=category, price=Decimal('1.50'), sku='G1', stock=1,
+        )
+        self.cart = Cart.objects.create(user=self.user)
+
+    def _lines(self, **quantities):
+        for name, quantity in quantities.items():
+            CartItem.objects.create(cart=self.cart, product=getattr(self, name), quantity=quantity)
+        return list(self.cart.items.select_related('product'))
+
+    def _stock(self):
+        return list(Product.objects.order_by('pk').values_list('stock', flat=True))
+
+    def test_shortage_leaves_everything_unchanged(self):
+        lines = self._lines(bar=2, gel=2)
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaisesMessage(CheckoutError, 'Stock insuficiente para Gel'):
+                place_order(self.user, lines, payment_method='transfer')
+        self.assertEqual(self._stock(), [5, 1])
+        self.assertEqual(self.cart.items.count(), 2)
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+        self.assertFalse(OutboxEmail.objects.exists())
+
+    def test_success_decrements_stock_clears_cart_and_enqueues_once(self):
+        lines = self._lines(bar=2, gel=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            order = place_order(self.user, lines, shipping=Decimal('1.00'), payment_method='transfer')
+        self.assertEqual(self._stock(), [3, 0])
+        self.assertFalse(self.cart.items.exists())
+        self.assertEqual((order.status, order.subtotal, order.total), ('pending', Decimal('7.50'), Decimal('8.50')))
+        self.assertEqual(sorted(order.items.values_list('product_id', 'quantity')), [(self.bar.pk, 2), (self.gel.pk, 1)])
+        self.assertEqual(list(OutboxEmail.objects.values_list('event', 'order_id')), [('new_order', order.pk)])
+
+    def test_empty_cart_is_rejected(self):
+        with self.assertRaisesMessage(CheckoutError, 'El carrito está vacío'):
+            place_order(self.user, [])
@@ -0,0 +1,83 @@
+# orders/transitions.py
+"""
+Cambios de estado de pedidos en bloque.
+
+transition_orders() mueve N pedidos a un estado con un número fijo de sentencias:
+bloquea las filas, actualiza status/fechas con un UPDATE, ajusta Product.sales_count
+con un UPDATE agrupado (suma de cantidades por producto) y recalcula los badges de
+los usuarios afectados. La usan las acciones del admin, el panel admin_orders_view
+y la API. Los save() individuales pasan por los signals (orders/signals.py), que
+reutilizan stamp_status_dates() y apply_sales_count().
+"""
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from products.models import Product
+from .models import Order, OrderItem
+from .counters import refresh_order_counters
+
+# Fecha que se marca al entrar en cada estado (solo la primera vez)
+STATUS_DATE_FIELDS = {
+    'shipped': 'shipped_at',
+    'delivered': 'delivered_at',
+}
+
+
+def stamp_status_dates(order, now=None):
+    """Marca shipped_at/delivered_at en una instancia según su status (si aún no tiene fecha)."""
+    field = STATUS_DATE_FIELDS.get(order.status)
+    if field and getattr(order, field) is None:
+        setattr(order, field, now or timezone.now())
+
+
+def apply_sales_count(order_ids, sign=1):
+    """Suma (sign=1) o resta (sign=-1) a sales_count las cantidades vendidas en esos pedidos.
+    Un solo UPDATE: cada producto recibe la suma de sus cantidades en el conjunto."""
+    order_items = OrderItem.objects.filter(order_id__in=order_ids)
+    sold = (
+        order_items.filter(product_id=OuterRef('pk'))
+        .order_by()
+        .values('product_id')
+        .annotate(total=Sum('quantity'))
+        .values('total')
+    )
+    return Product.objects.filter(pk__in=order_items.values('product_id')).update(
+        sales_count=F('sales_count') + sign * Subquery(sold)
+    )
+
+
+def transition_orders(orders, new_status):
+    """Mueve los pedidos (queryset o lista de ids) a new_status. Devuelve cuántos cambiaron;
+    los que ya estaban en ese estado no se tocan."""
+    if new_status not in dict(Order.STATUS_CHOICES):
+        raise ValueError(f'Estado no válido: {new_status}')
+    if isinstance(orders, (list, tuple, set)):
+        orders = list(orders)
+    else:
+        orders = orders.values('pk')
+    with transaction.atomic():
+        rows = list(
+            Order.objects.select_for_update()
+            .filter(pk__in=orders)
+            .exclude(status=new_status)
+            .values_list('pk', 'user_id', 'status')
+        )
+        if not rows:
+            return 0
+        ids = [pk for pk, _, _ in rows]
+        now = timezone.now()
+        values = {'status': new_status, 'updated_at': now}
+        date_field = STATUS_DATE_FIELDS.get(new_status)
+        if date_field:
+            values[date_field] = Coalesce(date_field, now)
+        Order.objects.filter(pk__in=ids).update(**values)
+        if new_status == 'delivered':
+            apply_sales_count(ids, 1)
+        else:
+            leaving = [pk for pk, _, status in rows if status == 'delivered']
+            if leaving:
+                apply_sales_count(leaving, -1)
+        refresh_order_counters({user_id for _, user_id, _ in rows})
+    return len(ids)
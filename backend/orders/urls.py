@@ -5,8 +5,8 @@ from .views import (
     add_to_cart_view, current_orders_view, admin_orders_view, remove_cart_item_view,
     update_cart_item_view, cancel_order_view,
     order_detail_json_view, order_messages_json_view, admin_order_detail_json_view, admin_send_message_view,
-    client_send_message_view, unread_count_json_view,
-    invoice_view, admin_set_payment_reference_view,
+    client_send_message_view, order_receipt_view, unread_count_json_view, events_stream_view,
+    invoice_view, admin_set_payment_reference_view, message_cache_stats_view,
 )
 
 app_name = 'orders'
@@ -29,7 +29,10 @@ urlpatterns = [
     path('mis-pedidos/panel-admin/pedido/<int:order_id>/detalle/', admin_order_detail_json_view, name='admin_order_detail_json'),
     path('mis-pedidos/panel-admin/enviar-mensaje/', admin_send_message_view, name='admin_send_message'),
     path('pedido/<int:order_id>/responder/', client_send_message_view, name='client_send_message'),
+    path('pedido/<int:order_id>/comprobante/<int:message_id>/<str:kind>/', order_receipt_view, name='order_receipt'),
     path('api/unread-count/', unread_count_json_view, name='unread_count_json'),
+    path('api/eventos/', events_stream_view, name='events_stream'),
+    path('api/cache-stats/', message_cache_stats_view, name='message_cache_stats'),
     path('pedido/<int:order_id>/factura/', invoice_view, name='invoice'),
     path('mis-pedidos/panel-admin/pedido/referencia-pago/', admin_set_payment_reference_view, name='admin_set_payment_reference'),
     path('', include(router.urls)),
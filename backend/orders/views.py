@@ -1,26 +1,43 @@
+import os
+
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.utils import timezone
 from django.db import transaction, models
-from django.db.models import Count
-from django.core.mail import send_mail
+from django.db.models import Count, Max, Q
 from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse, HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.core.handlers.asgi import ASGIRequest
+from asgiref.sync import sync_to_async
 from django.templatetags.static import static
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from .models import Order, OrderItem, Cart, CartItem, OrderMessage
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from .models import Order, Cart, CartItem, OrderMessage, OPEN_ORDER_STATUSES
 from .serializers import OrderSerializer, CreateOrderSerializer
+from .checkout import place_order, CheckoutError
+from .outbox import enqueue_order_cancelled
+from .transitions import transition_orders
+from .pagination import paginate_orders, OrderCursorPagination
+from .receipts import ReceiptUploadHandler, receipt_file, process_in_background
+from .counters import get_user_counters, get_staff_counters, bump_user_counters, bump_staff_counters
+from .message_cache import message_cache
+from . import events
 from products.models import Product
+from muxdry.conditional import conditional, make_etag
+from muxdry.pagination import InvalidCursor
+from muxdry.sendfile import sendfile
 
 
 class OrderViewSet(viewsets.ModelViewSet):
     """API para pedidos"""
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = OrderCursorPagination  # ?after= sobre (created_at, id)
     
     def get_queryset(self):
         """Usuarios solo ven sus propios pedidos, admins ven todos"""
@@ -37,77 +54,24 @@ class OrderViewSet(viewsets.ModelViewSet):
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
         cart, _ = Cart.objects.get_or_create(user=request.user)
-        cart_items = cart.items.all()
-        
-        if not cart_items.exists():
-            return Response(
-                {'error': 'El carrito está vacío'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        # Validar stock (asumiendo que Product tiene campo stock)
-        for item in cart_items:
-            if hasattr(item.product, 'stock') and item.product.stock < item.quantity:
-                return Response(
-                    {'error': f'Stock insuficiente para {item.product.name}'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-        
-        with transaction.atomic():
-            subtotal = cart.total_price
-            shipping = serializer.validated_data.get('shipping', 0)
-            tax = serializer.validated_data.get('tax', 0)
-            total = subtotal + shipping + tax
-
-            order = Order.objects.create(
-                user=request.user,
-                status='pending',
-                payment_method=serializer.validated_data.get('payment_method', 'transfer'),
-                shipping_name=serializer.validated_data.get('shipping_name', ''),
-                shipping_address=serializer.validated_data.get('shipping_address', ''),
-                shipping_city=serializer.validated_data.get('shipping_city', ''),
-                shipping_phone=serializer.validated_data.get('shipping_phone', ''),
-                shipping_email=serializer.validated_data.get('shipping_email', request.user.email or ''),
-                notes=serializer.validated_data.get('notes', ''),
-                subtotal=subtotal,
-                shipping=shipping,
-                tax=tax,
-                total=total,
-            )
-            
-            # Crear items del pedido
-            for cart_item in cart_items:
-                OrderItem.objects.create(
-                    order=order,
-                    product=cart_item.product,
-                    quantity=cart_item.quantity,
-                    price=cart_item.product.price,
-                )
-                # Reducir stock si existe
-                if hasattr(cart_item.product, 'stock'):
-                    cart_item.product.stock -= cart_item.quantity
-                    cart_item.product.save()
-            
-            # Vaciar carrito
-            cart.items.all().delete()
-        
-        # Enviar notificación al admin
+        data = serializer.validated_data
         try:
-            admin_email = getattr(settings, 'ADMIN_EMAIL', settings.DEFAULT_FROM_EMAIL)
-            send_mail(
-                subject=f'Nuevo Pedido: {order.order_number}',  # CORREGIDO: era 'numero_pedido'
-                message=f'Se ha recibido un nuevo pedido:\n\n'
-                       f'Número de Pedido: {order.order_number}\n'
-                       f'Usuario: {order.user.email}\n'
-                       f'Total: ${float(order.total):.2f}\n'
-                       f'Items: {order.items.count()}\n\n'
-                       f'Accede al panel de administración para procesarlo.',
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[admin_email],
-                fail_silently=True,
+            order = place_order(
+                request.user,
+                cart.items.select_related('product'),
+                shipping=data.get('shipping', 0),
+                tax=data.get('tax', 0),
+                payment_method=data.get('payment_method', 'transfer'),
+                shipping_name=data.get('shipping_name', ''),
+                shipping_address=data.get('shipping_address', ''),
+                shipping_city=data.get('shipping_city', ''),
+                shipping_phone=data.get('shipping_phone', ''),
+                shipping_email=data.get('shipping_email', request.user.email or ''),
+                notes=data.get('notes', ''),
             )
-        except Exception:
-            pass  # No fallar si el email no se puede enviar
+        except CheckoutError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
         
         response_serializer = OrderSerializer(order)
         return Response(response_serializer.data, status=status.HTTP_201_CREATED)
@@ -118,8 +82,9 @@ class OrderViewSet(viewsets.ModelViewSet):
         orders = self.get_queryset().filter(
             status__in=['pending', 'processing']  # CORREGIDO: usando strings
         )
-        serializer = self.get_serializer(orders, many=True)
-        return Response(serializer.data)
+        page = self.paginate_queryset(orders)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
     
     @action(detail=False, methods=['get'], url_path='history')
     def order_history(self, request):
@@ -137,8 +102,27 @@ class OrderViewSet(viewsets.ModelViewSet):
             # Fecha específica (formato: YYYY-MM-DD)
             queryset = queryset.filter(created_at__date=date_filter)
         
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+    
+    @action(detail=False, methods=['post'], url_path='set-status')
+    def set_status(self, request):
+        """Cambia el estado de varios pedidos (solo staff). Body: {"order_ids": [..], "status": "shipped"}"""
+        if not request.user.is_staff:
+            return Response({'error': 'No autorizado'}, status=status.HTTP_403_FORBIDDEN)
+        new_status = request.data.get('status')
+        order_ids = request.data.get('order_ids') or []
+        if isinstance(order_ids, (str, int)):
+            order_ids = [order_ids]
+        if new_status not in dict(Order.STATUS_CHOICES):
+            return Response({'error': 'Estado no válido'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            order_ids = [int(pk) for pk in order_ids]
+        except (TypeError, ValueError):
+            return Response({'error': 'order_ids debe ser una lista de ids'}, status=status.HTTP_400_BAD_REQUEST)
+        updated = transition_orders(order_ids, new_status)
+        return Response({'updated': updated, 'status': new_status})
     
     @action(detail=True, methods=['get'], url_path='details')
     def order_details(self, request, pk=None):
@@ -192,7 +176,6 @@ def _staff_required(user):
 @user_passes_test(_staff_required, login_url='/accounts/login/')
 def admin_orders_view(request):
     """Panel de solicitudes de pedidos: solo staff. Lista todos los pedidos y permite cambiar estado."""
-    from django.core.paginator import Paginator
     from django.utils import timezone
     from datetime import timedelta
 
@@ -200,15 +183,10 @@ def admin_orders_view(request):
     if request.method == 'POST' and request.POST.get('order_id') and request.POST.get('new_status'):
         order_id = request.POST.get('order_id')
         new_status = request.POST.get('new_status')
-        order = Order.objects.filter(pk=order_id).first()
+        order = Order.objects.filter(pk=order_id).only('pk', 'order_number').first()
         if order and new_status in dict(Order.STATUS_CHOICES):
-            order.status = new_status
-            if new_status == 'shipped':
-                order.shipped_at = order.shipped_at or timezone.now()
-            elif new_status == 'delivered':
-                order.delivered_at = order.delivered_at or timezone.now()
-            order.save()
-            messages.success(request, f'Pedido {order.order_number} actualizado a {order.get_status_display()}.')
+            transition_orders([order.pk], new_status)
+            messages.success(request, f'Pedido {order.order_number} actualizado a {dict(Order.STATUS_CHOICES)[new_status]}.')
         qs = request.GET.urlencode()
         return redirect('orders:admin_orders' + ('?' + qs if qs else ''))
 
@@ -228,10 +206,8 @@ def admin_orders_view(request):
         orders_qs = orders_qs.filter(
             models.Q(order_number__icontains=q) | models.Q(user__email__icontains=q) | models.Q(notes__icontains=q)
         )
-    paginator = Paginator(orders_qs, 18)
-    page = request.GET.get('page', 1)
-    page_obj = paginator.get_page(page)
-    orders_list = page_obj.object_list
+    page_obj = paginate_orders(request, orders_qs)
+    orders_list = page_obj.items
     order_ids = [o.id for o in orders_list]
     unread_client_counts = dict(
         OrderMessage.objects.filter(
@@ -255,14 +231,13 @@ def admin_orders_view(request):
 
 @login_required
 def current_orders_view(request):
-    """Página HTML con pedidos actuales. Filtros: period, date, q. Paginación por 10."""
-    from django.core.paginator import Paginator
+    """Página HTML con pedidos actuales. Filtros: period, date, q. Paginación por cursor (orders/pagination.py)."""
     from django.utils import timezone
     from datetime import timedelta
 
     pedidos_qs = Order.objects.filter(
         user=request.user,
-        status__in=['pending', 'confirmed', 'processing', 'shipped']
+        status__in=OPEN_ORDER_STATUSES
     ).prefetch_related('items__product').order_by('-created_at')
 
     # Filtros
@@ -282,10 +257,8 @@ def current_orders_view(request):
             models.Q(order_number__icontains=q) | models.Q(notes__icontains=q)
         )
 
-    paginator = Paginator(pedidos_qs, 18)
-    page = request.GET.get('page', 1)
-    page_obj = paginator.get_page(page)
-    pedidos = page_obj.object_list
+    page_obj = paginate_orders(request, pedidos_qs)
+    pedidos = page_obj.items
 
     from django.db.models import Count
     order_ids = [p.id for p in pedidos]
@@ -324,23 +297,9 @@ def cancel_order_view(request):
         return redirect('orders:current_orders')
     order.status = 'cancelled'
     order.notes = (order.notes or '') + f'\n[Cancelado por usuario] {reason}'
-    order.save()
-    try:
-        admin_email = getattr(settings, 'ADMIN_EMAIL', None) or getattr(settings, 'DEFAULT_FROM_EMAIL', None)
-        if admin_email:
-            send_mail(
-                subject=f'Pedido cancelado por usuario: {order.order_number}',
-                message=(
-                    f'El usuario {request.user.email} ha cancelado el pedido {order.order_number}.\n\n'
-                    f'Motivo: {reason}\n\n'
-                    'Revisa el panel de administración.'
-                ),
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[admin_email],
-                fail_silently=True,
-            )
-    except Exception:
-        pass
+    with transaction.atomic():
+        order.save()
+        enqueue_order_cancelled(order, reason)
     messages.success(request, f'Pedido {order.order_number} cancelado. Se ha notificado al administrador.')
     return redirect('orders:current_orders')
 
@@ -417,83 +376,38 @@ def update_cart_item_view(request):
     return redirect(request.META.get('HTTP_REFERER') or 'orders:cart')
 
 
+def _checkout_form_fields(request):
+    """Campos de Order del formulario extendido de checkout (datos, pago, envío)."""
+    first_name = (request.POST.get('first_name') or '').strip() or (request.user.first_name or '')
+    last_name = (request.POST.get('last_name') or '').strip() or (request.user.last_name or '')
+    return {
+        'payment_method': request.POST.get('payment_method') or 'transfer',
+        'document': (request.POST.get('document') or '').strip(),
+        'shipping_type': request.POST.get('shipping_type') or 'delivery_caracas',
+        'shipping_agency': (request.POST.get('shipping_agency') or '').strip(),
+        'office_pickup': request.POST.get('office_pickup') == 'on',
+        'central_address': (request.POST.get('central_address') or '').strip(),
+        'shipping_name': f"{first_name} {last_name}".strip() or request.user.get_full_name() or request.user.username,
+        'shipping_address': (request.POST.get('shipping_address') or '').strip(),
+        'shipping_city': (request.POST.get('shipping_city') or '').strip(),
+        'shipping_phone': (request.POST.get('shipping_phone') or '').strip(),
+        'shipping_email': request.user.email or '',
+        'notes': (request.POST.get('notes') or '').strip(),
+    }
+
+
 @login_required
 def create_order_from_cart_view(request):
     """Crea Order desde el carrito con formulario extendido (datos, pago, envío)."""
     if request.method != 'POST':
         return redirect('orders:cart')
     cart = get_object_or_404(Cart, user=request.user)
-    cart_items = cart.items.select_related('product').all()
-    if not cart_items.exists():
-        messages.warning(request, 'El carrito está vacío.')
-        return redirect('orders:cart')
-
-    first_name = (request.POST.get('first_name') or '').strip() or (request.user.first_name or '')
-    last_name = (request.POST.get('last_name') or '').strip() or (request.user.last_name or '')
-    document = (request.POST.get('document') or '').strip()
-    payment_method = request.POST.get('payment_method') or 'transfer'
-    shipping_type = request.POST.get('shipping_type') or 'delivery_caracas'
-    shipping_agency = (request.POST.get('shipping_agency') or '').strip()
-    office_pickup = request.POST.get('office_pickup') == 'on'
-    central_address = (request.POST.get('central_address') or '').strip()
-    shipping_address = (request.POST.get('shipping_address') or '').strip()
-    shipping_city = (request.POST.get('shipping_city') or '').strip()
-    shipping_phone = (request.POST.get('shipping_phone') or '').strip()
-    notes = (request.POST.get('notes') or '').strip()
-    shipping_name = f"{first_name} {last_name}".strip() or request.user.get_full_name() or request.user.username
-
-    subtotal = cart.total_price
-    shipping = 0
-    tax = 0
-    total = subtotal + shipping + tax
-    with transaction.atomic():
-        order = Order.objects.create(
-            user=request.user,
-            status='pending',
-            payment_method=payment_method,
-            document=document,
-            shipping_type=shipping_type,
-            shipping_agency=shipping_agency or '',
-            office_pickup=office_pickup,
-            central_address=central_address,
-            shipping_name=shipping_name,
-            shipping_address=shipping_address,
-            shipping_city=shipping_city,
-            shipping_phone=shipping_phone,
-            shipping_email=request.user.email or '',
-            notes=notes,
-            subtotal=subtotal,
-            shipping=shipping,
-            tax=tax,
-            total=total,
-        )
-        for item in cart_items:
-            OrderItem.objects.create(
-                order=order,
-                product=item.product,
-                quantity=item.quantity,
-                price=item.product.price,
-            )
-        cart.items.all().delete()
+    form = _checkout_form_fields(request)
     try:
-        admin_email = getattr(settings, 'ADMIN_EMAIL', None) or getattr(settings, 'DEFAULT_FROM_EMAIL', None)
-        if admin_email:
-            send_mail(
-                subject=f'Nuevo Pedido: {order.order_number}',
-                message=(
-                    f'Nuevo pedido recibido.\n\n'
-                    f'Número: {order.order_number}\n'
-                    f'Usuario: {order.user.email}\n'
-                    f'Total: ${float(order.total):.2f}\n'
-                    f'Ítems: {order.items.count()}\n\n'
-                    'Revisa el panel de administración.'
-                ),
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[admin_email],
-                fail_silently=True,
-            )
-    except Exception:
-        pass
+        order = place_order(request.user, cart.items.select_related('product'), **form)
+    except CheckoutError as e:
+        messages.warning(request, f'{e}.')
+        return redirect('orders:cart')
     messages.success(
         request,
         '¡Solicitud enviada exitosamente! Será atendida lo antes posible. '
@@ -516,86 +430,114 @@ def create_order_single_item_view(request):
     if not item:
         messages.warning(request, 'El producto no está en tu carrito.')
         return redirect('orders:cart')
-    product_name = item.product.name
-    qty = item.quantity
-    subtotal = item.total_price
-    shipping = 0
-    tax = 0
-    total = subtotal + shipping + tax
-
-    first_name = (request.POST.get('first_name') or '').strip() or (request.user.first_name or '')
-    last_name = (request.POST.get('last_name') or '').strip() or (request.user.last_name or '')
-    document = (request.POST.get('document') or '').strip()
-    payment_method = request.POST.get('payment_method') or 'transfer'
-    shipping_type = request.POST.get('shipping_type') or 'delivery_caracas'
-    shipping_agency = (request.POST.get('shipping_agency') or '').strip()
-    office_pickup = request.POST.get('office_pickup') == 'on'
-    central_address = (request.POST.get('central_address') or '').strip()
-    shipping_address = (request.POST.get('shipping_address') or '').strip()
-    shipping_city = (request.POST.get('shipping_city') or '').strip()
-    shipping_phone = (request.POST.get('shipping_phone') or '').strip()
-    notes = (request.POST.get('notes') or '').strip()
-    shipping_name = f"{first_name} {last_name}".strip() or request.user.get_full_name() or request.user.username
-
-    with transaction.atomic():
-        order = Order.objects.create(
-            user=request.user,
-            status='pending',
-            payment_method=payment_method,
-            document=document,
-            shipping_type=shipping_type,
-            shipping_agency=shipping_agency or '',
-            office_pickup=office_pickup,
-            central_address=central_address,
-            shipping_name=shipping_name,
-            shipping_address=shipping_address,
-            shipping_city=shipping_city,
-            shipping_phone=shipping_phone,
-            shipping_email=request.user.email or '',
-            subtotal=subtotal,
-            shipping=shipping,
-            tax=tax,
-            total=total,
-            notes=notes,
-        )
-        OrderItem.objects.create(
-            order=order,
-            product=item.product,
-            quantity=qty,
-            price=item.product.price,
-        )
-        item.delete()
+    form = _checkout_form_fields(request)
     try:
-        admin_email = getattr(settings, 'ADMIN_EMAIL', None) or getattr(settings, 'DEFAULT_FROM_EMAIL', None)
-        if admin_email:
-            send_mail(
-                subject=f'Nuevo Pedido (solo producto): {order.order_number}',
-                message=(
-                    f'Nuevo pedido (solo un producto).\n\n'
-                    f'Número: {order.order_number}\n'
-                    f'Usuario: {order.user.email}\n'
-                    f'Producto: {product_name} x {qty}\n'
-                    f'Total: ${float(order.total):.2f}\n\n'
-                    'Revisa el panel de administración.'
-                ),
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[admin_email],
-                fail_silently=True,
-            )
-    except Exception:
-        pass
+        order = place_order(request.user, [item], **form)
+    except CheckoutError as e:
+        messages.warning(request, f'{e}.')
+        return redirect('orders:cart')
     messages.success(request, f'Pedido {order.order_number} realizado (solo ese producto).')
     return redirect('orders:current_orders')
 
 
-def _order_detail_data(order):
-    """Helper para serializar detalle de pedido incluyendo mensajes."""
-    items = [{'name': i.product.name, 'quantity': i.quantity, 'price': str(i.price), 'total': str(i.total)} for i in order.items.all()]
-    msgs = []
-    for m in order.messages.all().order_by('created_at'):
-        d = {'id': m.id, 'message': m.message, 'is_from_admin': m.is_from_admin, 'created_at': m.created_at.strftime('%d/%m/%Y %H:%M')}
-        d['image_url'] = m.image.url if m.image else None
-        msgs.append(d)
+CHAT_PAGE_SIZE = 50
+
+
+def _cursor_param(params, name):
+    """Id de mensaje del cursor, None si no viene. InvalidCursor si no es un id válido."""
+    if not params.get(name):
+        return None
+    try:
+        value = int(params[name])
+    except (TypeError, ValueError) as exc:
+        raise InvalidCursor(params[name]) from exc
+    if not 0 <= value <= models.BigIntegerField.MAX_BIGINT:
+        raise InvalidCursor(params[name])
+    return value
+
+
+def _message_data(m):
+    return {
+        'id': m.id,
+        'message': m.message,
+        'is_from_admin': m.is_from_admin,
+        'created_at': m.created_at.strftime('%d/%m/%Y %H:%M'),
+        'read': m.read_at is not None,
+        **_receipt_urls(m),
+    }
+
+
+def _receipt_urls(m):
+    """Miniatura para el chat, copia para el lightbox y original (solo bajo demanda), por
+    order_receipt_view. Mientras orders/receipts.py no generó las copias, todas apuntan al original."""
+    if not m.image:
+        return {'image_url': None, 'display_url': None, 'thumb_url': None}
+    original = reverse('orders:order_receipt', args=[m.order_id, m.pk, 'original'])
+    return {
+        'image_url': original,
+        'display_url': reverse('orders:order_receipt', args=[m.order_id, m.pk, 'display']) if m.image_display else original,
+        'thumb_url': reverse('orders:order_receipt', args=[m.order_id, m.pk, 'thumb']) if m.image_thumb else original,
+    }
+
+
+RECEIPT_FIELDS = {'original': 'image', 'display': 'image_display', 'thumb': 'image_thumb'}
+
+
+@login_required
+def order_receipt_view(request, order_id, message_id, kind):
+    """Comprobante del chat (original, display o thumb): solo el dueño del pedido o staff.
+    Los bytes los entrega el servidor web (muxdry/sendfile.py); MEDIA_ROOT/order_messages no es público."""
+    field = RECEIPT_FIELDS.get(kind)
+    if field is None:
+        raise Http404
+    msg = get_object_or_404(
+        OrderMessage.objects.select_related('order').only('order__user_id', *RECEIPT_FIELDS.values()),
+        pk=message_id, order_id=order_id,
+    )
+    if msg.order.user_id != request.user.id and not request.user.is_staff:
+        raise Http404
+    file = getattr(msg, field)
+    if not file:
+        raise Http404
+    return sendfile(request, file.path, cache_control='private, max-age=86400')
+
+
+def _chat_page(order, params):
+    """
+    Página del chat por cursor (ids ascendentes):
+    - since_id: mensajes nuevos (id > since_id), hasta CHAT_PAGE_SIZE; has_newer si quedan más.
+    - before_id: los CHAT_PAGE_SIZE anteriores a before_id; has_older si quedan más.
+    - sin cursor: los últimos CHAT_PAGE_SIZE.
+    Cursor que no es un id: InvalidCursor (las vistas responden 400).
+    """
+    since_id = _cursor_param(params, 'since_id')
+    before_id = _cursor_param(params, 'before_id')
+    qs = order.messages.all()
+    has_older = has_newer = False
+    if since_id is not None:
+        msgs = list(qs.filter(id__gt=since_id).order_by('id')[:CHAT_PAGE_SIZE + 1])
+        has_newer = len(msgs) > CHAT_PAGE_SIZE
+        msgs = msgs[:CHAT_PAGE_SIZE]
+    else:
+        if before_id is not None:
+            qs = qs.filter(id__lt=before_id)
+        msgs = list(qs.order_by('-id')[:CHAT_PAGE_SIZE + 1])
+        has_older = len(msgs) > CHAT_PAGE_SIZE
+        msgs = msgs[:CHAT_PAGE_SIZE][::-1]
+    return {
+        'messages': msgs,
+        'since_id': since_id,
+        'has_older': has_older,
+        'has_newer': has_newer,
+    }
+
+
+def _order_detail_data(order, chat=None):
+    """Helper para serializar detalle de pedido incluyendo la última página del chat."""
+    items = [{'name': i.product.name, 'quantity': i.quantity, 'price': str(i.price), 'total': str(i.total)} for i in order.items.select_related('product')]
+    if chat is None:
+        chat = _chat_page(order, {})
+    msgs = [_message_data(m) for m in chat['messages']]
     return {
         'order_number': order.order_number,
         'created_at': order.created_at.strftime('%d/%m/%Y %H:%M'),
@@ -614,12 +556,48 @@ def _order_detail_data(order):
         'total': str(order.total),
         'items': items,
         'messages': msgs,
+        'has_older_messages': chat['has_older'],
         'user_email': order.user.email,
         'payment_reference': order.payment_reference or '',
     }
 
 
+def _order_state(**filters):
+    """Lo que cambia el JSON del pedido, en una consulta: (updated_at, último mensaje, mensajes
+    leídos, comprobantes procesados). updated_at cubre estado, referencia y datos del pedido."""
+    return Order.objects.filter(**filters).values_list('updated_at').annotate(
+        last_message=Max('messages__id'),
+        read=Count('messages', filter=Q(messages__read_at__isnull=False)),
+        processed=Count('messages', filter=Q(messages__image_thumb__gt='')),
+    ).order_by('pk').first()
+
+
+def _order_etag(request, order_id):
+    # None si el pedido no es del usuario (la vista responde 404) o en el sondeo con since_id,
+    # cuya URL cambia en cada petición (sin mensajes nuevos responde una lista vacía)
+    if request.GET.get('since_id'):
+        return None
+    state = _order_state(pk=order_id, user=request.user)
+    return state and make_etag('order', order_id, request.GET.urlencode(), *state)
+
+
+def _admin_order_etag(request, order_id):
+    if request.GET.get('since_id'):
+        return None
+    state = _order_state(pk=order_id)
+    return state and make_etag('admin-order', order_id, request.GET.urlencode(), *state)
+
+
+def _has_unread(messages, from_admin):
+    """True si la página del chat trae mensajes del otro lado sin leer. Los no leídos son
+    siempre los más recientes (se marcan todos a la vez), así que basta con mirar la página."""
+    if from_admin:
+        return any(m.is_from_admin and m.read_at is None for m in messages)
+    return any(not m.is_from_admin and m.read_by_admin_at is None for m in messages)
+
+
 @login_required
+@conditional(etag_func=_order_etag)
 def order_detail_json_view(request, order_id):
     """Devuelve detalles del pedido en JSON (para modal Ver mi pedido)."""
     order = get_object_or_404(Order, pk=order_id, user=request.user)
@@ -627,37 +605,47 @@ def order_detail_json_view(request, order_id):
 
 
 @login_required
+@conditional(etag_func=_order_etag)
 def order_messages_json_view(request, order_id):
-    """Devuelve mensajes del pedido y marca como leídos."""
-    from django.utils import timezone
+    """
+    Devuelve mensajes del pedido (por cursor, ver _chat_page) y marca como leídos los del admin.
+    Con ?since_id=N y sin mensajes nuevos, messages viene vacío.
+    """
     order = get_object_or_404(Order, pk=order_id, user=request.user)
-    msgs = list(order.messages.all().order_by('created_at'))
-    msgs_list = []
-    for m in msgs:
-        d = {
-            'id': m.id,
-            'message': m.message,
-            'is_from_admin': m.is_from_admin,
-            'created_at': m.created_at.strftime('%d/%m/%Y %H:%M'),
-            'read': m.read_at is not None,
-        }
-        if m.image:
-            d['image_url'] = m.image.url
-        else:
-            d['image_url'] = None
-        msgs_list.append(d)
-    order.messages.filter(is_from_admin=True, read_at__isnull=True).update(read_at=timezone.now())
-    return JsonResponse({'messages': msgs_list})
+    try:
+        chat = _chat_page(order, request.GET)
+    except InvalidCursor:
+        return JsonResponse({'error': 'Cursor no válido'}, status=400)
+    # Solo hay UPDATE si este pedido tiene mensajes del admin sin leer
+    if _has_unread(chat['messages'], from_admin=True):
+        marked = order.messages.filter(is_from_admin=True, read_at__isnull=True).update(read_at=timezone.now())
+        bump_user_counters(order.user_id, unread_messages=-marked)
+    return JsonResponse({
+        'messages': [_message_data(m) for m in chat['messages']],
+        'has_older': chat['has_older'],
+        'has_newer': chat['has_newer'],
+    })
 
 
 @login_required
 @user_passes_test(_staff_required, login_url='/accounts/login/')
+@conditional(etag_func=_admin_order_etag)
 def admin_order_detail_json_view(request, order_id):
-    """Admin: devuelve detalles de cualquier pedido. ?mark_client_read=1 marca mensajes del cliente como leídos."""
+    """Admin: devuelve detalles de cualquier pedido. ?mark_client_read=1 marca mensajes del cliente como leídos.
+    Acepta los cursores del chat (since_id / before_id); con since_id y sin novedades solo devuelve
+    messages vacío (sin los datos del pedido)."""
     order = get_object_or_404(Order, pk=order_id)
-    if request.GET.get('mark_client_read'):
-        order.messages.filter(is_from_admin=False, read_by_admin_at__isnull=True).update(read_by_admin_at=timezone.now())
-    data = _order_detail_data(order)
+    try:
+        chat = _chat_page(order, request.GET)
+    except InvalidCursor:
+        return JsonResponse({'error': 'Cursor no válido'}, status=400)
+    if request.GET.get('mark_client_read') and _has_unread(chat['messages'], from_admin=False):
+        marked = order.messages.filter(is_from_admin=False, read_by_admin_at__isnull=True).update(read_by_admin_at=timezone.now())
+        bump_staff_counters(unread_client_messages=-marked)
+    if chat['since_id'] is not None and not chat['messages']:
+        return JsonResponse({'messages': [], 'has_newer_messages': False})
+    data = _order_detail_data(order, chat)
+    data['has_newer_messages'] = chat['has_newer']
     return JsonResponse(data)
 
 
@@ -677,33 +665,50 @@ def admin_send_message_view(request):
 
 
 @login_required
+@csrf_exempt
 def client_send_message_view(request, order_id):
-    """Cliente responde en el chat del pedido. POST message (opcional), image (opcional). order_id viene de la URL."""
+    """Cliente responde en el chat del pedido. POST message (opcional), image (opcional). order_id viene de la URL.
+    El comprobante va a disco por trozos (orders/receipts.py): los upload handlers se cambian antes de
+    leer request.POST, por eso el CSRF se comprueba dentro, en _client_send_message."""
+    request.upload_handlers = [ReceiptUploadHandler(request)]
+    return _client_send_message(request, order_id)
+
+
+@csrf_protect
+def _client_send_message(request, order_id):
     if request.method != 'POST':
         return JsonResponse({'error': 'Método no permitido'}, status=405)
     message = (request.POST.get('message') or '').strip()
     image = request.FILES.get('image')
+    # Validar imagen: solo PNG o JPG, máximo 10MB (el handler deja de leerla al pasar el límite)
+    if request.upload_handlers[0].too_large:
+        return JsonResponse({'error': 'La imagen no debe superar 10 MB.'}, status=400)
     if not message and not image:
         return JsonResponse({'error': 'Debes incluir un mensaje o una imagen (comprobante de pago)'}, status=400)
     order = get_object_or_404(Order, pk=order_id, user=request.user)
-    # Validar imagen: solo PNG o JPG, máximo 10MB
+    receipt = None
     if image:
         allowed_types = ('image/png', 'image/jpeg', 'image/jpg')
-        if image.content_type not in allowed_types:
+        if image.content_type in allowed_types:
+            receipt = receipt_file(image)  # PNG/JPEG real, sin EXIF
+        if receipt is None:
             return JsonResponse({'error': 'Solo se permiten imágenes PNG o JPG.'}, status=400)
-        if image.size > 10 * 1024 * 1024:
-            return JsonResponse({'error': 'La imagen no debe superar 10 MB.'}, status=400)
     msg_text = message or '(Comprobante de pago adjunto)'
-    msg = OrderMessage.objects.create(
-        order=order,
-        sender=request.user,
-        message=msg_text,
-        is_from_admin=False,
-        image=image,
-    )
+    try:
+        msg = OrderMessage.objects.create(
+            order=order,
+            sender=request.user,
+            message=msg_text,
+            is_from_admin=False,
+            image=receipt,
+        )
+    finally:
+        if receipt is not None:
+            receipt.close()
     data = {'ok': True, 'message_id': msg.id}
     if msg.image:
-        data['image_url'] = msg.image.url
+        transaction.on_commit(lambda: process_in_background(msg.pk))
+        data.update(_receipt_urls(msg))
     return JsonResponse(data)
 
 
@@ -714,7 +719,18 @@ def _can_view_invoice(request, order):
     return order.user_id == request.user.id or request.user.is_staff
 
 
+def _invoice_etag(request, order_id):
+    """Pedido entregado, datos del cliente que salen en la factura y el Referer (botón volver)."""
+    row = Order.objects.filter(pk=order_id, status='delivered').values_list(
+        'user_id', 'updated_at', 'user__first_name', 'user__last_name', 'user__email', 'user__profile__phone',
+    ).first()
+    if row is None or (row[0] != request.user.id and not request.user.is_staff):
+        return None
+    return make_etag('invoice', order_id, request.user.is_staff, request.META.get('HTTP_REFERER', ''), *row)
+
+
 @login_required
+@conditional(etag_func=_invoice_etag)
 def invoice_view(request, order_id):
     """Vista de factura (solo pedidos entregados). Cliente o admin."""
     order = get_object_or_404(Order, pk=order_id)
@@ -760,25 +776,65 @@ def admin_set_payment_reference_view(request):
         return JsonResponse({'error': 'order_id requerido'}, status=400)
     order = get_object_or_404(Order, pk=order_id)
     order.payment_reference = ref[:120]
-    order.save(update_fields=['payment_reference'])
+    order.save(update_fields=['payment_reference', 'updated_at'])  # updated_at: ETag del pedido
     return JsonResponse({'ok': True, 'payment_reference': order.payment_reference})
 
 
+def _unread_payload(user):
+    if user.is_staff:
+        return {'admin_unread': get_staff_counters().unread_client_messages}
+    return {'client_unread': get_user_counters(user).unread_messages}
+
+
 @login_required
 def unread_count_json_view(request):
     """Devuelve conteo de mensajes no leídos para actualizar badges del header."""
-    data = {}
-    if request.user.is_staff:
-        count = OrderMessage.objects.filter(
-            is_from_admin=False,
-            read_by_admin_at__isnull=True
-        ).count()
-        data['admin_unread'] = count
-    else:
-        count = OrderMessage.objects.filter(
-            order__user=request.user,
-            is_from_admin=True,
-            read_at__isnull=True
-        ).count()
-        data['client_unread'] = count
-    return JsonResponse(data)
\ No newline at end of file
+    return JsonResponse(_unread_payload(request.user))
+
+
+EVENTS_HEARTBEAT_SECONDS = 25
+
+
+async def _event_stream(channels, initial):
+    broker = events.get_broker()
+    sub = broker.subscribe(channels)
+    try:
+        yield 'retry: 5000\n\n'
+        yield events.format_sse('unread', initial)
+        while True:
+            item = await sub.get(timeout=EVENTS_HEARTBEAT_SECONDS)
+            if item is None:
+                yield ': ping\n\n'
+            else:
+                yield events.format_sse(*item)
+    finally:
+        broker.unsubscribe(sub)
+
+
+@login_required
+@user_passes_test(_staff_required, login_url='/accounts/login/')
+def message_cache_stats_view(request):
+    """Contadores de la caché de mensajes descifrados (orders/message_cache.py, de este worker).
+    ?reset=1 los pone a cero."""
+    data = {'pid': os.getpid(), **message_cache.stats()}
+    if request.GET.get('reset'):
+        message_cache.reset_stats()
+    return JsonResponse(data)
+
+
+async def events_stream_view(request):
+    """SSE: conteos de no leídos, mensajes nuevos del chat y (admin) pedidos nuevos.
+    Solo bajo ASGI; bajo WSGI responde 204 para que EventSource no reconecte y la página siga como antes."""
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    user = await sync_to_async(lambda: request.user if request.user.is_authenticated else None)()
+    if user is None:
+        return JsonResponse({'error': 'auth_required'}, status=401)
+    channels = [events.user_channel(user.pk)]
+    if user.is_staff:
+        channels.append(events.STAFF_CHANNEL)
+    initial = await sync_to_async(_unread_payload)(user)
+    response = StreamingHttpResponse(_event_stream(channels, initial), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx: no bufferizar el stream
+    return response
@@ -4,3 +4,16 @@ from django.apps import AppConfig
 class ProductsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'products'
+
+    def ready(self):
+        import products.signals  # noqa
+        from django.core.signals import request_started
+        request_started.connect(_warm_autocomplete, dispatch_uid='products.warm_autocomplete')
+
+
+def _warm_autocomplete(**kwargs):
+    """Primer request del proceso: construye el índice de sugerencias en segundo plano."""
+    from django.core.signals import request_started
+    from .autocomplete import autocomplete_index
+    request_started.disconnect(dispatch_uid='products.warm_autocomplete')
+    autocomplete_index.build_in_background()
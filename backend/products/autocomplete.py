@@ -0,0 +1,188 @@
+# products/autocomplete.py
+"""
+Sugerencias de búsqueda (search-as-you-type) servidas desde memoria.
+
+Cada proceso mantiene un índice de prefijos: una lista ordenada de (palabra, entrada)
+sobre la que se busca con bisect. Las palabras salen del nombre y SKU de cada
+producto y del nombre de cada categoría, sin acentos (fold_accents de products/search.py).
+La vista nunca consulta la BD: si el índice no está listo devuelve [] y lo construye
+un hilo aparte.
+
+- Arranque: el primer request del proceso lanza la construcción en segundo plano
+  (products/apps.py).
+- Cambios: los signals de Product/Category actualizan solo esa entrada (tras commit).
+- Cambios que no pasan por signals (queryset.update de sales_count, otros workers):
+  el índice se reconstruye en segundo plano cada AUTOCOMPLETE_REFRESH_SECONDS.
+"""
+import heapq
+import logging
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import namedtuple
+
+from django.conf import settings
+from django.urls import reverse
+
+from .search import query_terms
+
+logger = logging.getLogger(__name__)
+
+Suggestion = namedtuple('Suggestion', ['kind', 'pk', 'label', 'url', 'score'])
+
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 20
+
+
+def _product_suggestion(product, sales_count=None):
+    return Suggestion(
+        'product', product.pk, product.name,
+        reverse('products:product_detail', args=[product.slug]),
+        product.sales_count if sales_count is None else sales_count,
+    )
+
+
+def _category_suggestion(category, score=0):
+    return Suggestion('category', category.pk, category.name, reverse('products:category', args=[category.slug]), score)
+
+
+def _words(*texts):
+    words = set()
+    for text in texts:
+        words.update(query_terms(text or ''))
+    return words
+
+
+class PrefixIndex:
+    """Índice de prefijos inmutable por lectura: las escrituras crean listas nuevas bajo un lock
+    y las publican con una sola asignación, así las lecturas no necesitan lock.
+    Un cambio de una entrada copia la lista (memcpy) y solo mueve sus propias claves con
+    bisect/insort: no se recorre ni se reordena el resto."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = []       # [(palabra, (kind, pk))] ordenada
+        self._entries = {}    # (kind, pk) -> Suggestion
+        self._entry_words = {}  # (kind, pk) -> palabras indexadas de la entrada
+        self.built_at = None
+        self._building = False
+
+    # --- Lectura ---
+
+    @property
+    def ready(self):
+        return self.built_at is not None
+
+    def _candidates(self, keys, prefix):
+        found = set()
+        i = bisect_left(keys, (prefix,))
+        while i < len(keys) and keys[i][0].startswith(prefix):
+            found.add(keys[i][1])
+            i += 1
+        return found
+
+    def suggest(self, q, limit=DEFAULT_LIMIT):
+        """Top-`limit` entradas por score cuyas palabras empiezan por cada término de q."""
+        terms = query_terms(q)
+        if not terms:
+            return []
+        keys, entries = self._keys, self._entries
+        matches = None
+        for term in sorted(set(terms), key=len, reverse=True):
+            found = self._candidates(keys, term)
+            matches = found if matches is None else matches & found
+            if not matches:
+                return []
+        hits = [entries[entry_id] for entry_id in matches if entry_id in entries]
+        return heapq.nlargest(limit, hits, key=lambda s: (s.score, s.kind == 'category', -s.pk))
+
+    # --- Escritura ---
+
+    def build(self):
+        """Reconstruye todo desde la BD (una consulta por modelo)."""
+        from django.db.models import Sum
+        from .models import Product, Category
+
+        entries, entry_words = {}, {}
+        for product in Product.objects.only('pk', 'name', 'slug', 'sku', 'sales_count'):
+            entry_id = ('product', product.pk)
+            entries[entry_id] = _product_suggestion(product)
+            entry_words[entry_id] = _words(product.name, product.sku)
+        for category in Category.objects.annotate(sales=Sum('products__sales_count')).only('pk', 'name', 'slug'):
+            entry_id = ('category', category.pk)
+            entries[entry_id] = _category_suggestion(category, category.sales or 0)
+            entry_words[entry_id] = _words(category.name)
+        keys = sorted((word, entry_id) for entry_id, words in entry_words.items() for word in words)
+        with self._lock:
+            self._keys, self._entries, self._entry_words = keys, entries, entry_words
+            self.built_at = time.monotonic()
+
+    def _replace(self, entry_id, suggestion=None, words=()):
+        with self._lock:
+            if not self.ready:
+                return  # la construcción completa ya incluirá el cambio
+            keys = list(self._keys)
+            for word in self._entry_words.get(entry_id, ()):
+                i = bisect_left(keys, (word, entry_id))
+                if i < len(keys) and keys[i] == (word, entry_id):
+                    del keys[i]
+            for word in words:
+                insort(keys, (word, entry_id))
+            entries, entry_words = dict(self._entries), dict(self._entry_words)
+            if suggestion is None:
+                entries.pop(entry_id, None)
+                entry_words.pop(entry_id, None)
+            else:
+                entries[entry_id] = suggestion
+                entry_words[entry_id] = set(words)
+            self._keys, self._entries, self._entry_words = keys, entries, entry_words
+
+    def update_product(self, product):
+        self._replace(('product', product.pk), _product_suggestion(product), _words(product.name, product.sku))
+
+    def remove_product(self, pk):
+        self._replace(('product', pk))
+
+    def update_category(self, category):
+        entry_id = ('category', category.pk)
+        current = self._entries.get(entry_id)
+        score = current.score if current else 0
+        self._replace(entry_id, _category_suggestion(category, score), _words(category.name))
+
+    def remove_category(self, pk):
+        self._replace(('category', pk))
+
+    # --- Construcción en segundo plano ---
+
+    def is_stale(self):
+        max_age = getattr(settings, 'AUTOCOMPLETE_REFRESH_SECONDS', 300)
+        return not self.ready or (max_age and time.monotonic() - self.built_at > max_age)
+
+    def build_in_background(self):
+        with self._lock:
+            if self._building:
+                return
+            self._building = True
+        threading.Thread(target=self._background_build, name='autocomplete-index', daemon=True).start()
+
+    def _background_build(self):
+        from django.db import connection
+        try:
+            self.build()
+        except Exception:
+            # p.ej. tablas aún sin migrar: el índice sigue vacío y se reintenta en el siguiente request
+            logger.exception('No se pudo construir el índice de sugerencias')
+        finally:
+            connection.close()  # conexión propia de este hilo
+            with self._lock:
+                self._building = False
+
+
+autocomplete_index = PrefixIndex()
+
+
+def suggest(q, limit=DEFAULT_LIMIT):
+    """Sugerencias para q sin tocar la BD; programa una reconstrucción si el índice está viejo."""
+    if autocomplete_index.is_stale():
+        autocomplete_index.build_in_background()
+    return autocomplete_index.suggest(q, limit)
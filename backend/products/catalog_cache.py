@@ -0,0 +1,214 @@
+# products/catalog_cache.py
+"""
+Caché versionada de las consultas del catálogo (home, categoría, búsqueda, detalle,
+la lista de categorías del header, el resumen de reseñas de reviews/summary.py y los
+datos ya serializados de la API del catálogo).
+
+Las claves llevan el número de versión del catálogo: catalog:<versión>:<familia>:<hash>.
+Guardar o borrar un Product o Category incrementa la versión (tras commit,
+products/signals.py), así que todas las entradas anteriores dejan de leerse de golpe
+y caducan solas; no hay que saber qué claves borrar. Una Review solo la incrementa si
+cambia la media o el número de reseñas del producto (reviews/signals.py); el resto de
+cambios de reseñas invalidan solo el resumen de su producto (versión por producto,
+reviews/summary.py).
+
+Los cambios que no pasan por signals (stock en el checkout, sales_count con
+queryset.update) se ven como mucho CATALOG_CACHE_TIMEOUT segundos después.
+Con varios workers, CATALOG_CACHE_ALIAS debe apuntar a una caché compartida
+(Redis/Memcached): con LocMem cada proceso tiene su propia versión.
+
+stats() devuelve aciertos/fallos por familia de claves (en este proceso).
+"""
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from muxdry.pagination import KeysetPaginator
+from .models import Category, Product
+from .serializers import CatalogProductSerializer
+
+# Listados del catálogo por cursor (muxdry/pagination.py): clave -> (etiqueta, orden).
+# Cada orden termina en id; los índices de Product.Meta cubren los de catálogo.
+LISTING_PAGE_SIZE = 24
+CATALOG_SORTS = {
+    'featured': ('Destacados', ('-is_featured', '-created_at', '-id')),
+    'newest': ('Más nuevos', ('-created_at', '-id')),
+    'best_sellers': ('Más vendidos', ('-sales_count', '-id')),
+    'price_asc': ('Menor precio', ('price', 'id')),
+    'price_desc': ('Mayor precio', ('-price', '-id')),
+}
+SEARCH_SORTS = {'relevance': ('Relevancia', ('-search_rank', '-id')), **CATALOG_SORTS}
+
+VERSION_KEY = 'catalog:version'
+
+
+class CatalogCache:
+
+    def __init__(self, alias='default', timeout=300):
+        self.alias = alias
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._stats = {}  # familia -> [aciertos, fallos]
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    # --- Versión ---
+
+    def version(self, key=VERSION_KEY):
+        """Versión del catálogo, o de otro contador con la misma semántica (key)."""
+        version = self.cache.get(key)
+        if version is None:
+            # Primera vez o clave expulsada: empezar en un valor nuevo (µs) para no
+            # reutilizar un espacio de claves anterior
+            self.cache.add(key, time.time_ns() // 1000, None)
+            version = self.cache.get(key)
+        return version
+
+    def bump(self, key=VERSION_KEY):
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            self.cache.set(key, time.time_ns() // 1000, None)
+
+    # --- Lecturas ---
+
+    def key(self, family, *parts):
+        digest = hashlib.blake2b(repr(parts).encode('utf-8'), digest_size=12).hexdigest()
+        return f'catalog:{self.version()}:{family}:{digest}'
+
+    def get_or_build(self, family, parts, builder):
+        """Valor de (familia, parts) en la versión actual; si no está, builder() y se guarda."""
+        key = self.key(family, *parts)
+        value = self.cache.get(key)
+        hit = value is not None
+        self.record(family, hit)
+        if not hit:
+            value = builder()
+            self.cache.set(key, value, self.timeout)
+        return value
+
+    # --- Estadísticas ---
+
+    def record(self, family, hit):
+        with self._lock:
+            counts = self._stats.setdefault(family, [0, 0])
+            counts[0 if hit else 1] += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                family: {
+                    'hits': hits,
+                    'misses': misses,
+                    'hit_ratio': round(hits / (hits + misses), 4) if hits + misses else 0.0,
+                }
+                for family, (hits, misses) in sorted(self._stats.items())
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats.clear()
+
+
+catalog_cache = CatalogCache(
+    alias=getattr(settings, 'CATALOG_CACHE_ALIAS', 'default'),
+    timeout=getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300),
+)
+
+
+def bump_catalog_version_on_commit():
+    transaction.on_commit(catalog_cache.bump)
+
+
+# --- Conjuntos cacheados ---
+
+def cached_categories():
+    return catalog_cache.get_or_build('categories', (), lambda: list(Category.objects.all()))
+
+
+def cached_home():
+    """Listas fijas de la portada: destacados, más vendidos y carrusel (el catálogo va en cached_listing)."""
+    def build():
+        # Carrusel "Más demandado": destacados o los de más ventas (hasta 4 slides)
+        viral_products = list(Product.objects.filter(is_featured=True)[:4])
+        if not viral_products:
+            viral_products = list(Product.objects.order_by('-sales_count')[:4])
+        return {
+            'featured_products': list(Product.objects.filter(is_featured=True)[:8]),
+            'best_sellers': list(Product.objects.filter(is_best_seller=True).order_by('-sales_count')[:4]),
+            'featured_product': Product.objects.filter(is_featured=True).first(),
+            'viral_products': viral_products,
+        }
+    return catalog_cache.get_or_build('home', (), build)
+
+
+def cached_category(slug):
+    """Categoría por slug o None si no existe."""
+    def build():
+        # None no se puede distinguir de un fallo de caché
+        return Category.objects.filter(slug=slug).first() or False
+    return catalog_cache.get_or_build('category', (slug,), build) or None
+
+
+def cached_listing(family, parts, queryset, sort, cursor, sorts=CATALOG_SORTS):
+    """Página (KeysetPage) del listado `queryset()` en el orden `sort` tras `cursor`.
+    queryset es un callable: en un acierto no se construye (la búsqueda consulta al construirse).
+    Cursor ilegible o de otro orden: InvalidCursor (no se guarda nada bajo ese cursor)."""
+    ordering = sorts[sort][1]
+
+    def build():
+        return KeysetPaginator(queryset(), ordering, LISTING_PAGE_SIZE).page(cursor)
+    return catalog_cache.get_or_build(f'{family}_list', (*parts, sort, cursor or ''), build)
+
+
+def cached_product(slug):
+    def build():
+        return Product.objects.filter(slug=slug).first() or False
+    return catalog_cache.get_or_build('detail', (slug,), build) or None
+
+
+# --- API del catálogo (ProductViewSet): datos ya serializados, sin request ---
+
+API_FEATURED_LIMIT = 8
+API_BEST_SELLERS_LIMIT = 8
+
+
+def _serialize(products):
+    return [dict(row) for row in CatalogProductSerializer(products, many=True).data]
+
+
+def cached_api_page(category, sort, cursor):
+    """{'results': [...], 'next_cursor': ...} de /products/products/ (category: Category o None).
+    Cursor inválido: InvalidCursor."""
+    def build():
+        queryset = Product.objects.select_related('category')
+        if category is not None:
+            queryset = queryset.filter(category=category)
+        page = KeysetPaginator(queryset, CATALOG_SORTS[sort][1], LISTING_PAGE_SIZE).page(cursor)
+        return {'results': _serialize(page.items), 'next_cursor': page.next_cursor if page.has_next else None}
+    return catalog_cache.get_or_build('api_list', (category and category.slug, sort, cursor or ''), build)
+
+
+def cached_api_product(pk):
+    def build():
+        product = Product.objects.select_related('category').filter(pk=pk).first()
+        return _serialize([product])[0] if product else False
+    return catalog_cache.get_or_build('api_detail', (pk,), build) or None
+
+
+def cached_api_featured():
+    return catalog_cache.get_or_build('api_featured', (), lambda: _serialize(
+        Product.objects.select_related('category').filter(is_featured=True).order_by('-created_at', '-id')[:API_FEATURED_LIMIT]
+    ))
+
+
+def cached_api_best_sellers():
+    return catalog_cache.get_or_build('api_best_sellers', (), lambda: _serialize(
+        Product.objects.select_related('category').filter(is_best_seller=True).order_by('-sales_count', '-id')[:API_BEST_SELLERS_LIMIT]
+    ))
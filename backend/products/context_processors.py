@@ -1,11 +1,22 @@
 # products/context_processors.py
 """Context processors para templates - hace que 'categories' esté disponible en todas las páginas."""
 
-from .models import Category
+from django.utils.functional import SimpleLazyObject
+
+from .catalog_cache import cached_categories
+from .page_cache import is_page_shell, CSRF_PLACEHOLDER
 
 
 def categories(request):
-    """Añade las categorías al contexto de todos los templates."""
+    """Añade las categorías al contexto de todos los templates (caché del catálogo, solo si se usan)."""
     return {
-        'categories': Category.objects.all(),
+        'categories': SimpleLazyObject(cached_categories),
     }
+
+
+def page_shell(request):
+    """Render para la caché de página (products/page_cache.py): el token CSRF va como marcador
+    y el header carga lo personal desde el fragmento JSON."""
+    if is_page_shell(request):
+        return {'page_shell': True, 'csrf_token': CSRF_PLACEHOLDER}
+    return {'page_shell': False}
@@ -0,0 +1,243 @@
+# products/images.py
+"""
+Derivados responsive de las imágenes del catálogo: Product.image, image_hover,
+Category.image y los archivos de assets/products que usan los templatetags como fallback.
+
+Cada fuente se reescala a DERIVATIVE_WIDTHS en AVIF y WebP (si Pillow los soporta) y JPEG:
+
+    IMAGE_DERIVATIVES_ROOT/<origen>/<ruta de la fuente>/<firma>/<ancho>.<ext>
+
+origen es media (subida) o static (assets); la firma sale del tamaño y mtime de la fuente,
+así una fuente nueva nunca reutiliza derivados viejos y se sirven como immutable.
+No se amplía: si la fuente es más estrecha que un ancho, ese derivado queda a su tamaño.
+
+Los derivados se generan al subir la imagen (products/signals.py, en un hilo tras commit),
+en bloque con `python manage.py build_image_derivatives`, o bajo demanda: mientras no
+existen, los templatetags apuntan a derivative_view, que los genera y sirve el pedido.
+"""
+import hashlib
+import logging
+import os
+import threading
+from collections import namedtuple
+from urllib.parse import quote
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.templatetags.static import static
+from django.urls import reverse
+from django.utils._os import safe_join
+from PIL import Image, ImageOps, features
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVE_WIDTHS = (160, 320, 640, 1024)
+FALLBACK_WIDTH = 640
+# Orden de preferencia en <picture>; JPEG siempre (fallback del <img>)
+FORMATS = tuple(fmt for fmt in ('avif', 'webp') if features.check(fmt)) + ('jpeg',)
+CONTENT_TYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+EXTENSIONS = {'avif': 'avif', 'webp': 'webp', 'jpeg': 'jpg'}
+SAVE_OPTIONS = {
+    'avif': {'quality': 55},
+    'webp': {'quality': 78, 'method': 4},
+    'jpeg': {'quality': 82, 'optimize': True, 'progressive': True},
+}
+SOURCE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.gif')
+# Fuentes válidas para derivative_view (la ruta llega en la URL)
+MEDIA_DIRS = ('products/', 'categories/')
+STATIC_DIRS = ('assets/',)
+
+
+def derivatives_root():
+    return getattr(settings, 'IMAGE_DERIVATIVES_ROOT', os.path.join(settings.MEDIA_ROOT, 'derivatives'))
+
+
+def derivatives_url():
+    return getattr(settings, 'IMAGE_DERIVATIVES_URL', settings.MEDIA_URL + 'derivatives/')
+
+
+class ImageSource(namedtuple('ImageSource', 'origin name')):
+    """Imagen original: origin 'media' (ruta en default_storage) o 'static' (ruta de staticfiles)."""
+
+    @classmethod
+    def media(cls, name):
+        return cls('media', name)
+
+    @classmethod
+    def static(cls, name):
+        return cls('static', name)
+
+    @property
+    def url(self):
+        return default_storage.url(self.name) if self.origin == 'media' else static(self.name)
+
+    def path(self):
+        """Ruta en disco o None si no existe o no es una fuente permitida."""
+        name = self.name
+        if '..' in name.split('/') or not name.lower().endswith(SOURCE_EXTENSIONS):
+            return None
+        try:
+            if self.origin == 'media' and name.startswith(MEDIA_DIRS):
+                path = default_storage.path(name)
+            elif self.origin == 'static' and name.startswith(STATIC_DIRS):
+                path = finders.find(name) or safe_join(settings.STATIC_ROOT, name)
+            else:
+                return None
+        except (SuspiciousFileOperation, NotImplementedError):
+            return None
+        return path if os.path.isfile(path) else None
+
+
+# --- Nombres ---
+
+_signatures = {}  # fuente -> firma (en este proceso)
+_ready = set()    # (fuente, firma) con todos los derivados en disco
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def signature(source, path=None):
+    """Hash corto del tamaño y mtime de la fuente; None si no existe."""
+    if source not in _signatures:
+        path = path or source.path()
+        if path is None:
+            return None
+        stat = os.stat(path)
+        _signatures[source] = hashlib.blake2b(
+            f'{stat.st_size}:{stat.st_mtime_ns}'.encode(), digest_size=4,
+        ).hexdigest()
+    return _signatures[source]
+
+
+def derivative_name(source, sig, width, fmt):
+    return f'{source.origin}/{source.name}/{sig}/{width}.{EXTENSIONS[fmt]}'
+
+
+def parse_derivative_name(name):
+    """(fuente, firma, ancho, formato) de un nombre de derivative_name, o None."""
+    try:
+        origin, rest = name.split('/', 1)
+        source_name, sig, filename = rest.rsplit('/', 2)
+        width, ext = filename.split('.')
+        width = int(width)
+    except ValueError:
+        return None
+    fmt = {ext: fmt for fmt, ext in EXTENSIONS.items()}.get(ext)
+    if origin not in ('media', 'static') or width not in DERIVATIVE_WIDTHS or fmt not in FORMATS:
+        return None
+    return ImageSource(origin, source_name), sig, width, fmt
+
+
+def _marker(source, sig):
+    # Último archivo que escribe generate(): si existe, están todos
+    return derivative_name(source, sig, DERIVATIVE_WIDTHS[-1], FORMATS[-1])
+
+
+def is_ready(source, sig):
+    if (source, sig) in _ready:
+        return True
+    if os.path.exists(os.path.join(derivatives_root(), _marker(source, sig))):
+        _ready.add((source, sig))
+        return True
+    return False
+
+
+# --- Generación ---
+
+def _source_lock(source):
+    with _locks_guard:
+        return _locks.setdefault(source, threading.Lock())
+
+
+def _flatten(image, fmt):
+    if fmt != 'jpeg':
+        return image if image.mode in ('RGB', 'RGBA') else image.convert('RGBA')
+    if image.mode in ('RGBA', 'LA', 'P'):
+        # JPEG no tiene transparencia: fondo blanco como el de las tarjetas
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def generate(source, force=False):
+    """Escribe los derivados de `source` que falten (todos con force). Devuelve cuántos escribió;
+    None si la fuente no existe o no es una imagen válida."""
+    path = source.path()
+    if path is None:
+        return None
+    sig = signature(source, path)
+    with _source_lock(source):
+        if not force and is_ready(source, sig):
+            return 0
+        try:
+            with Image.open(path) as original:
+                original = ImageOps.exif_transpose(original)
+                original.load()
+        except (OSError, Image.DecompressionBombError):
+            return None
+        written = 0
+        for width in DERIVATIVE_WIDTHS:
+            resized = original.copy()
+            resized.thumbnail((width, width * 4), Image.LANCZOS)
+            for fmt in FORMATS:
+                target = os.path.join(derivatives_root(), derivative_name(source, sig, width, fmt))
+                if not force and os.path.exists(target):
+                    continue
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                tmp = f'{target}.{threading.get_ident()}.tmp'
+                _flatten(resized, fmt).save(tmp, fmt.upper(), **SAVE_OPTIONS[fmt])
+                os.replace(tmp, target)  # nunca se sirve un archivo a medio escribir
+                written += 1
+        _ready.add((source, sig))
+        return written
+
+
+def generate_in_background(sources):
+    """Genera los derivados de `sources` en un hilo (tras subir imágenes)."""
+    sources = [source for source in sources if source]
+    if not sources:
+        return
+
+    def run():
+        for source in sources:
+            try:
+                generate(source)
+            except Exception:
+                # Se reintenta bajo demanda desde derivative_view
+                logger.exception('No se pudieron generar los derivados de %s', source.name)
+    threading.Thread(target=run, name='image-derivatives', daemon=True).start()
+
+
+# --- URLs ---
+
+def derivative_url(source, sig, width, fmt, ready):
+    name = derivative_name(source, sig, width, fmt)
+    if ready:
+        return derivatives_url() + quote(name)
+    return reverse('products:image_derivative', args=[name])
+
+
+_srcsets = {}  # (fuente, firma) -> srcsets ya generados (no cambian)
+
+
+def srcsets(source):
+    """{'formato': 'url 160w, url 320w, ...', ..., 'src': url JPEG de FALLBACK_WIDTH}
+    o None si la fuente no existe en disco (se usa la URL original)."""
+    sig = signature(source)
+    if sig is None:
+        return None
+    if (source, sig) in _srcsets:
+        return _srcsets[source, sig]
+    ready = is_ready(source, sig)
+    result = {
+        fmt: ', '.join(f'{derivative_url(source, sig, width, fmt, ready)} {width}w' for width in DERIVATIVE_WIDTHS)
+        for fmt in FORMATS
+    }
+    result['src'] = derivative_url(source, sig, FALLBACK_WIDTH, 'jpeg', ready)
+    if ready:
+        _srcsets[source, sig] = result
+    return result
@@ -0,0 +1,42 @@
+from django.contrib.staticfiles import finders
+from django.core.management.base import BaseCommand
+from products.images import SOURCE_EXTENSIONS, ImageSource, generate
+from products.models import Category, Product
+
+
+class Command(BaseCommand):
+    help = 'Genera los derivados responsive (products/images.py) de assets/products y de las imágenes subidas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Regenerar aunque ya existan')
+        parser.add_argument('--static-only', action='store_true', help='Solo assets/products')
+
+    def _sources(self, static_only):
+        seen = set()
+        for finder in finders.get_finders():
+            for path, storage in finder.list(['CVS', '.*', '*~']):
+                path = path.replace('\\', '/')
+                # STATICFILES_DIRS monta ../assets con prefijo 'assets'
+                if getattr(storage, 'prefix', None):
+                    path = f'{storage.prefix}/{path}'
+                if path.startswith('assets/products/') and path.lower().endswith(SOURCE_EXTENSIONS):
+                    seen.add(ImageSource.static(path))
+        if not static_only:
+            for image, hover in Product.objects.values_list('image', 'image_hover'):
+                seen.update(ImageSource.media(name) for name in (image, hover) if name)
+            seen.update(ImageSource.media(name) for name in Category.objects.values_list('image', flat=True) if name)
+        return sorted(seen)
+
+    def handle(self, *args, **options):
+        written = failed = 0
+        sources = self._sources(options['static_only'])
+        for source in sources:
+            count = generate(source, force=options['force'])
+            if count is None:
+                failed += 1
+                self.stderr.write(f'No se pudo leer: {source.origin}:{source.name}')
+            else:
+                written += count
+        self.stdout.write(self.style.SUCCESS(
+            f'Derivados: {len(sources)} imagen(es), {written} archivo(s) escritos, {failed} con error'
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from products.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice de búsqueda de productos (products/search.py)'
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        total = backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Índice de búsqueda reconstruido ({type(backend).__name__}): {total} producto(s)'))
@@ -0,0 +1,77 @@
+# Generated manually for the full-text product search index (products/search.py)
+
+from django.db import migrations
+
+POSTGRES_CREATE = [
+    'CREATE EXTENSION IF NOT EXISTS unaccent',
+    """
+    DO $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'muxdry_es') THEN
+            CREATE TEXT SEARCH CONFIGURATION muxdry_es (COPY = spanish);
+            ALTER TEXT SEARCH CONFIGURATION muxdry_es
+                ALTER MAPPING FOR hword, hword_part, word WITH unaccent, spanish_stem;
+        END IF;
+    END
+    $$
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS products_search (
+        product_id bigint PRIMARY KEY REFERENCES products_product (id) ON DELETE CASCADE,
+        document tsvector NOT NULL
+    )
+    """,
+    'CREATE INDEX IF NOT EXISTS products_search_document_gin ON products_search USING gin (document)',
+    """
+    INSERT INTO products_search (product_id, document)
+    SELECT p.id,
+        setweight(to_tsvector('muxdry_es', coalesce(p.name, '')), 'A') ||
+        setweight(to_tsvector('muxdry_es', coalesce(p.sku, '')), 'A') ||
+        setweight(to_tsvector('muxdry_es', coalesce(c.name, '')), 'B') ||
+        setweight(to_tsvector('muxdry_es', coalesce(p.description, '')), 'C')
+    FROM products_product p JOIN products_category c ON c.id = p.category_id
+    ON CONFLICT (product_id) DO NOTHING
+    """,
+]
+
+SQLITE_CREATE = (
+    'CREATE VIRTUAL TABLE IF NOT EXISTS products_search USING fts5('
+    "name, sku, category, description, tokenize='unicode61 remove_diacritics 2')"
+)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        for sql in POSTGRES_CREATE:
+            schema_editor.execute(sql)
+    elif vendor == 'sqlite':
+        from products.search import normalize_text
+
+        try:
+            schema_editor.execute(SQLITE_CREATE)
+        except Exception:
+            return  # SQLite sin FTS5: products/search.py usa icontains
+        Product = apps.get_model('products', 'Product')
+        rows = Product.objects.values_list('pk', 'name', 'sku', 'category__name', 'description')
+        with schema_editor.connection.cursor() as cursor:
+            cursor.executemany(
+                'INSERT INTO products_search (rowid, name, sku, category, description) VALUES (%s, %s, %s, %s, %s)',
+                [(pk, *(normalize_text(value or '') for value in values)) for pk, *values in rows],
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('postgresql', 'sqlite'):
+        schema_editor.execute('DROP TABLE IF EXISTS products_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_productfavorite'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,74 @@
+# Generated manually for denormalized review aggregates
+
+from django.db import migrations, models
+
+
+def backfill_ratings(apps, schema_editor):
+    from django.db.models import Count, FloatField, IntegerField, OuterRef, Subquery, Value
+    from django.db.models.functions import Cast, Coalesce, NullIf
+
+    Product = apps.get_model('products', 'Product')
+    Review = apps.get_model('reviews', 'Review')
+
+    def approved(**filters):
+        return Coalesce(Subquery(
+            Review.objects.filter(product_id=OuterRef('pk'), approved=True, **filters)
+            .order_by().values('product_id').annotate(n=Count('pk')).values('n'),
+            output_field=IntegerField(),
+        ), Value(0))
+
+    buckets = {stars: approved(rating=stars) for stars in range(1, 6)}
+    total = sum(buckets.values(), Value(0))
+    weighted = sum((stars * count for stars, count in buckets.items()), Value(0))
+    Product.objects.update(
+        review_count=total,
+        avg_rating=Coalesce(Cast(weighted, FloatField()) / Cast(NullIf(total, 0), FloatField()), Value(0.0)),
+        **{f'rating_{stars}': count for stars, count in buckets.items()},
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_product_search_index'),
+        ('reviews', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='avg_rating',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_1',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_2',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_3',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_4',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_5',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_ratings, migrations.RunPython.noop),
+    ]
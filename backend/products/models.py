@@ -1,6 +1,7 @@
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.conf import settings
+from muxdry.tracking import TrackedFieldsMixin
 
 
 class Category(models.Model):
@@ -15,7 +16,7 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
-class Product(models.Model):
+class Product(TrackedFieldsMixin, models.Model):
     name = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     description = models.TextField()
@@ -30,11 +31,37 @@ class Product(models.Model):
     is_best_seller = models.BooleanField(default=False)
     is_new = models.BooleanField(default=False, verbose_name='Etiqueta Nuevo')
     sales_count = models.IntegerField(default=0)
+    # Reseñas aprobadas, denormalizadas (las mantiene reviews/ratings.py)
+    avg_rating = models.FloatField(default=0, editable=False)
+    review_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_1 = models.PositiveIntegerField(default=0, editable=False)
+    rating_2 = models.PositiveIntegerField(default=0, editable=False)
+    rating_3 = models.PositiveIntegerField(default=0, editable=False)
+    rating_4 = models.PositiveIntegerField(default=0, editable=False)
+    rating_5 = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    # Cambios detectables sin consulta (muxdry/tracking.py): el total de los carritos depende del precio
+    tracked_fields = ('price',)
+
+    class Meta:
+        # Listados por cursor (products/catalog_cache.py CATALOG_SORTS): se recorren en cualquier sentido
+        indexes = [
+            models.Index(fields=['is_featured', 'created_at', 'id'], name='products_featured_idx'),
+            models.Index(fields=['category', 'is_featured', 'created_at', 'id'], name='products_cat_featured_idx'),
+            models.Index(fields=['created_at', 'id'], name='products_newest_idx'),
+            models.Index(fields=['sales_count', 'id'], name='products_sales_idx'),
+            models.Index(fields=['price', 'id'], name='products_price_idx'),
+        ]
     
     def __str__(self):
         return self.name
+
+    @property
+    def rating_histogram(self):
+        """[(estrellas, reseñas)] de 5 a 1."""
+        return [(stars, getattr(self, f'rating_{stars}')) for stars in range(5, 0, -1)]
     
     @property
     def is_on_sale(self):
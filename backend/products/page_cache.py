@@ -0,0 +1,161 @@
+# products/page_cache.py
+"""
+Caché de página completa para las páginas del catálogo.
+
+Las vistas marcadas con @page_cache guardan el HTML renderizado para un visitante
+anónimo (el "shell") bajo page:<versión del catálogo>:<hash de host + ruta>, así que
+cualquier cambio del catálogo (products/catalog_cache.py) invalida todas las páginas.
+La ruta solo lleva los parámetros de query que lee la vista (page_cache(params=...)),
+ordenados: ?utm_source=... o ?x=<aleatorio> no crean entradas nuevas. Si vienen otros
+parámetros se sirve la entrada de la ruta canónica, pero el render no se guarda.
+
+- page_cache(): el shell se sirve a todos, también a usuarios con sesión. Lo personal
+  del header (nombre, carrito, badges, favoritos, cerrar sesión) lo pone el navegador
+  con el fragmento JSON de /api/header/ (muxdry/views.py), que solo se pide si existe
+  la cookie AUTH_HINT_COOKIE.
+- page_cache(anonymous_only=True): el cuerpo depende del usuario (formulario de reseña);
+  los usuarios con sesión ven la página renderizada normal.
+- page_cache(version=func): func(request, *args, **kwargs) añade otra versión a la del
+  catálogo (el detalle usa la de las reseñas del producto, reviews/summary.py).
+
+El token CSRF se renderiza como CSRF_PLACEHOLDER y se sustituye por uno nuevo en cada
+respuesta. Con mensajes pendientes (contrib.messages) no se lee ni se guarda la caché.
+
+Antes de buscar en la caché se atiende el GET condicional de los anónimos
+(muxdry/conditional.py): el ETag sale de la versión del catálogo, la URL y las cookies
+de CSRF y sesión; si el navegador ya tiene esa copia, 304. Con sesión no hay ETag: la
+página puede llevar el header personal renderizado en el servidor.
+El middleware va después de CsrfViewMiddleware y MessageMiddleware.
+"""
+import hashlib
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.cache import get_conditional_response
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.functional import empty
+
+from muxdry.conditional import make_etag, revalidate
+from .catalog_cache import catalog_cache
+
+CSRF_PLACEHOLDER = 'muxdryCsrfPlaceholder0000'
+AUTH_HINT_COOKIE = 'mux_auth'
+MESSAGES_COOKIE = 'messages'
+
+
+def page_cache(view=None, anonymous_only=False, version=None, params=()):
+    """Marca una vista para la caché de página. @page_cache o @page_cache(anonymous_only=True).
+    params: los parámetros de query que lee la vista (el resto no entra en la clave)."""
+    def decorator(func):
+        func.page_cache = 'anonymous' if anonymous_only else 'shared'
+        func.page_cache_version = version
+        func.page_cache_params = frozenset(params)
+        return func
+    return decorator(view) if view is not None else decorator
+
+
+def is_page_shell(request):
+    return getattr(request, '_page_shell', False)
+
+
+def _cache_path(request, params):
+    """(ruta con solo los parámetros de params, ordenados; True si la query traía otros)."""
+    query = [(name, value) for name in sorted(params) for value in request.GET.getlist(name)]
+    extra = any(name not in params for name in request.GET)
+    return (f'{request.path}?{urlencode(query)}' if query else request.path), extra
+
+
+def _page_key(request, path, version):
+    digest = hashlib.blake2b(f'{request.get_host()}{path}'.encode('utf-8'), digest_size=16).hexdigest()
+    return f'page:{version}:{digest}'
+
+
+def _page_etag(request, path, version):
+    return make_etag(
+        'page', version, request.get_host(), path,
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME), request.COOKIES.get(settings.SESSION_COOKIE_NAME),
+    )
+
+
+def _is_authenticated(request):
+    # Sin cookie de sesión no hay usuario: evita leer la sesión
+    if settings.SESSION_COOKIE_NAME not in request.COOKIES:
+        return False
+    return request.user.is_authenticated
+
+
+def _with_csrf_token(request, content):
+    return content.replace(CSRF_PLACEHOLDER.encode(), get_token(request).encode())
+
+
+class PageCacheMiddleware(MiddlewareMixin):
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        mode = getattr(view_func, 'page_cache', None)
+        timeout = getattr(settings, 'PAGE_CACHE_TIMEOUT', 600)
+        if mode is None or request.method not in ('GET', 'HEAD'):
+            return None
+        if MESSAGES_COOKIE in request.COOKIES:
+            return None
+        if mode == 'anonymous' and _is_authenticated(request):
+            return None
+        version = catalog_cache.version()
+        extra_version = getattr(view_func, 'page_cache_version', None)
+        if extra_version is not None:
+            version = f'{version}.{extra_version(request, *view_args, **view_kwargs)}'
+        path, extra_params = _cache_path(request, getattr(view_func, 'page_cache_params', ()))
+        # ETag solo para anónimos: con sesión el header (carrito, badges, favoritos) se renderiza
+        # en el servidor cuando no se sirve el shell y no entra en el validador. En las páginas
+        # compartidas basta con que no haya cookie de sesión (no se lee la sesión para esto).
+        if mode == 'anonymous' or settings.SESSION_COOKIE_NAME not in request.COOKIES:
+            request._page_etag = _page_etag(request, path, version)
+            not_modified = get_conditional_response(request, etag=request._page_etag)
+            if not_modified is not None:
+                return not_modified
+        if not timeout:
+            return None
+        key = _page_key(request, path, version)
+        cached = catalog_cache.cache.get(key)
+        catalog_cache.record('page', cached is not None)
+        if cached is not None:
+            content, content_type = cached
+            response = HttpResponse(_with_csrf_token(request, content), content_type=content_type)
+            response['X-Page-Cache'] = 'hit'
+            return response
+        if not extra_params and not _is_authenticated(request):
+            # Este render es el shell: el context processor pone el marcador del token CSRF
+            request._page_shell = True
+            request._page_cache_key = key
+        return None
+
+    def process_response(self, request, response):
+        key = getattr(request, '_page_cache_key', None)
+        if key and response.status_code == 200 and not response.streaming:
+            catalog_cache.cache.set(
+                key, (response.content, response['Content-Type']), getattr(settings, 'PAGE_CACHE_TIMEOUT', 600),
+            )
+            response.content = _with_csrf_token(request, response.content)
+            response['X-Page-Cache'] = 'miss'
+        etag = getattr(request, '_page_etag', None)
+        if etag and response.status_code in (200, 304) and not response.has_header('ETag'):
+            response['ETag'] = etag
+            revalidate(response)
+        self._update_auth_hint(request, response)
+        return response
+
+    def _update_auth_hint(self, request, response):
+        """Cookie legible por JS que indica si pedir el fragmento del header. Solo se toca si
+        la vista ya resolvió request.user (no fuerza leer la sesión)."""
+        user = getattr(request, 'user', None)
+        if user is None or getattr(user, '_wrapped', None) is empty:
+            return
+        has_hint = AUTH_HINT_COOKIE in request.COOKIES
+        if user.is_authenticated and not has_hint:
+            response.set_cookie(
+                AUTH_HINT_COOKIE, '1', max_age=settings.SESSION_COOKIE_AGE,
+                secure=settings.SESSION_COOKIE_SECURE, samesite='Lax',
+            )
+        elif not user.is_authenticated and has_hint:
+            response.delete_cookie(AUTH_HINT_COOKIE, samesite='Lax')
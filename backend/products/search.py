@@ -0,0 +1,213 @@
+# products/search.py
+"""
+Búsqueda de texto completo de productos (nombre, descripción, SKU y categoría).
+
+Un backend por motor, elegido según la conexión (o settings.PRODUCT_SEARCH_BACKEND):
+
+- PostgreSQL: tabla products_search (product_id, document tsvector) con índice GIN.
+  Configuración de texto 'muxdry_es' = unaccent + stemmer español (migración 0005).
+  Ranking con ts_rank_cd y pesos A (nombre, SKU), B (categoría), C (descripción).
+- SQLite: tabla virtual FTS5 products_search (rowid = id del producto). FTS5 no trae
+  stemmer español: el texto se indexa y se consulta ya normalizado por
+  normalize_text() (minúsculas, sin acentos, stem ligero). Ranking con bm25().
+- Otros motores o FTS5 no disponible: icontains sobre los mismos campos, sin ranking.
+
+El índice se actualiza en los signals de Product y Category (products/signals.py);
+`python manage.py rebuild_search_index` lo reconstruye completo.
+"""
+import re
+import unicodedata
+
+from django.conf import settings
+from django.db import connection, transaction, OperationalError
+from django.db.models import Case, When, Value, FloatField, Q
+from django.utils.module_loading import import_string
+
+MAX_RESULTS = 500
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+# --- Normalización (SQLite y consultas) ---
+
+def fold_accents(text):
+    return ''.join(
+        ch for ch in unicodedata.normalize('NFKD', text) if not unicodedata.combining(ch)
+    ).lower()
+
+
+def stem_word(word):
+    """Stem ligero para español: quita plurales y la vocal final (barras -> barr, desodorantes -> desodorant)."""
+    if len(word) > 5 and word.endswith('es'):
+        word = word[:-2]
+    elif len(word) > 3 and word.endswith('s'):
+        word = word[:-1]
+    if len(word) > 4 and word[-1] in 'aeo':
+        word = word[:-1]
+    return word
+
+
+def query_terms(q):
+    """Palabras de la búsqueda sin acentos ni signos (seguras para construir la consulta)."""
+    return _WORD_RE.findall(fold_accents(q or ''))
+
+
+def normalize_text(text):
+    return ' '.join(stem_word(word) for word in query_terms(text))
+
+
+def _no_results(queryset):
+    # Vacío pero con search_rank: el listado lo ordena por él (SEARCH_SORTS 'relevance')
+    return queryset.annotate(search_rank=Value(0.0, output_field=FloatField())).none()
+
+
+def _ranked(queryset, ranked_ids):
+    """Filtra el queryset a ranked_ids [(id, rank)] y lo ordena por rank descendente."""
+    if not ranked_ids:
+        return _no_results(queryset)
+    rank = Case(
+        *[When(pk=pk, then=Value(score)) for pk, score in ranked_ids],
+        output_field=FloatField(),
+    )
+    return queryset.filter(pk__in=[pk for pk, _ in ranked_ids]).annotate(search_rank=rank).order_by('-search_rank', '-pk')
+
+
+class BaseSearchBackend:
+    def search(self, queryset, q):
+        """Productos del queryset que coinciden con q, anotados con search_rank y ordenados por él."""
+        raise NotImplementedError
+
+    def index_products(self, product_ids):
+        pass
+
+    def remove_products(self, product_ids):
+        pass
+
+    def rebuild(self, chunk_size=500):
+        from .models import Product
+        ids = list(Product.objects.values_list('pk', flat=True))
+        for start in range(0, len(ids), chunk_size):
+            self.index_products(ids[start:start + chunk_size])
+        return len(ids)
+
+
+class IcontainsSearchBackend(BaseSearchBackend):
+    """Sin índice: icontains sobre nombre, descripción, SKU y categoría."""
+
+    def search(self, queryset, q):
+        terms = (q or '').split()
+        if not terms:
+            return _no_results(queryset)
+        for term in terms:
+            queryset = queryset.filter(
+                Q(name__icontains=term) | Q(description__icontains=term)
+                | Q(sku__icontains=term) | Q(category__name__icontains=term)
+            )
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField())).order_by('-is_featured', '-created_at')
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    config = 'muxdry_es'
+
+    def search(self, queryset, q):
+        terms = query_terms(q)
+        if not terms:
+            return _no_results(queryset)
+        # Prefijos: "desodor" encuentra "desodorantes" mientras se escribe
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT product_id, ts_rank_cd(document, query) AS rank '
+                'FROM products_search, to_tsquery(%s, %s) query '
+                'WHERE document @@ query ORDER BY rank DESC LIMIT %s',
+                [self.config, tsquery, MAX_RESULTS],
+            )
+            return _ranked(queryset, cursor.fetchall())
+
+    def index_products(self, product_ids):
+        if not product_ids:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO products_search (product_id, document) '
+                'SELECT p.id, '
+                "setweight(to_tsvector(%(config)s, coalesce(p.name, '')), 'A') || "
+                "setweight(to_tsvector(%(config)s, coalesce(p.sku, '')), 'A') || "
+                "setweight(to_tsvector(%(config)s, coalesce(c.name, '')), 'B') || "
+                "setweight(to_tsvector(%(config)s, coalesce(p.description, '')), 'C') "
+                'FROM products_product p JOIN products_category c ON c.id = p.category_id '
+                'WHERE p.id = ANY(%(ids)s) '
+                'ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document',
+                {'config': self.config, 'ids': list(product_ids)},
+            )
+
+    def remove_products(self, product_ids):
+        pass  # ON DELETE CASCADE en products_search
+
+
+class SQLiteFTSSearchBackend(BaseSearchBackend):
+    # Pesos bm25 por columna: name, sku, category, description
+    weights = (10.0, 10.0, 4.0, 1.0)
+
+    def search(self, queryset, q):
+        terms = [stem_word(term) for term in query_terms(q)]
+        if not terms:
+            return _no_results(queryset)
+        match = ' '.join(f'"{term}"*' for term in terms)
+        weights = ', '.join(str(w) for w in self.weights)
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'SELECT rowid, -bm25(products_search, {weights}) FROM products_search '
+                    f'WHERE products_search MATCH %s ORDER BY bm25(products_search, {weights}) LIMIT %s',
+                    [match, MAX_RESULTS],
+                )
+                rows = cursor.fetchall()
+        except OperationalError:
+            # Sin FTS5 (o sin la tabla): búsqueda simple
+            return IcontainsSearchBackend().search(queryset, q)
+        return _ranked(queryset, rows)
+
+    def index_products(self, product_ids):
+        from .models import Product
+        if not product_ids:
+            return
+        rows = Product.objects.filter(pk__in=product_ids).values_list('pk', 'name', 'sku', 'category__name', 'description')
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                self._delete(cursor, product_ids)
+                cursor.executemany(
+                    'INSERT INTO products_search (rowid, name, sku, category, description) VALUES (%s, %s, %s, %s, %s)',
+                    [(pk, *(normalize_text(value or '') for value in values)) for pk, *values in rows],
+                )
+        except OperationalError:
+            pass
+
+    def remove_products(self, product_ids):
+        try:
+            with connection.cursor() as cursor:
+                self._delete(cursor, product_ids)
+        except OperationalError:
+            pass
+
+    def _delete(self, cursor, product_ids):
+        ids = list(product_ids)
+        cursor.execute(
+            f'DELETE FROM products_search WHERE rowid IN ({", ".join(["%s"] * len(ids))})', ids,
+        )
+
+
+_BACKENDS_BY_VENDOR = {
+    'postgresql': PostgresSearchBackend,
+    'sqlite': SQLiteFTSSearchBackend,
+}
+
+
+def get_search_backend():
+    path = getattr(settings, 'PRODUCT_SEARCH_BACKEND', '')
+    if path:
+        return import_string(path)()
+    return _BACKENDS_BY_VENDOR.get(connection.vendor, IcontainsSearchBackend)()
+
+
+def search_products(queryset, q):
+    return get_search_backend().search(queryset, q)
@@ -1,3 +1,4 @@
+from django.urls import reverse
 from rest_framework import serializers
 from .models import Category, Product
 
@@ -20,3 +21,36 @@ class ProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = '__all__'
+
+
+# --- API de solo lectura del catálogo (ProductViewSet, payloads cacheados en catalog_cache.py) ---
+
+class CatalogCategorySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Category
+        fields = ('id', 'name', 'slug')
+
+
+class CatalogProductSerializer(serializers.ModelSerializer):
+    """Producto del catálogo; sus campos son los que admite ?fields=. Sin request en el
+    contexto (el resultado se cachea para todos): las URLs son relativas."""
+    category = CatalogCategorySerializer(read_only=True)
+    url = serializers.SerializerMethodField()
+    is_on_sale = serializers.BooleanField(read_only=True)
+    discount_percentage = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Product
+        fields = (
+            'id', 'name', 'slug', 'url', 'sku', 'description', 'category',
+            'price', 'old_price', 'is_on_sale', 'discount_percentage', 'stock',
+            'image', 'image_hover', 'is_featured', 'is_best_seller', 'is_new',
+            'sales_count', 'avg_rating', 'review_count', 'created_at',
+        )
+        read_only_fields = fields
+
+    def get_url(self, obj):
+        return reverse('products:product_detail', args=[obj.slug])
+
+    def get_discount_percentage(self, obj):
+        return int(obj.discount_percentage)
@@ -0,0 +1,76 @@
+from django.db.models.signals import post_save, post_delete
+from django.db import transaction
+from django.dispatch import receiver
+from .models import Product, Category
+from .search import get_search_backend
+from .autocomplete import autocomplete_index
+from .catalog_cache import bump_catalog_version_on_commit
+from .images import ImageSource, generate_in_background
+
+
+# --- Índice de búsqueda (products/search.py): misma transacción que el guardado ---
+
+@receiver(post_save, sender=Product)
+def update_search_index_on_product_save(sender, instance, update_fields=None, **kwargs):
+    # Guardados parciales que no tocan texto (stock, sales_count...) no reindexan
+    if update_fields is not None and not {'name', 'description', 'sku', 'category'} & set(update_fields):
+        return
+    get_search_backend().index_products([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def update_search_index_on_product_delete(sender, instance, **kwargs):
+    get_search_backend().remove_products([instance.pk])
+
+
+@receiver(post_save, sender=Category)
+def update_search_index_on_category_save(sender, instance, created, **kwargs):
+    if not created:
+        get_search_backend().index_products(list(instance.products.values_list('pk', flat=True)))
+
+
+# --- Sugerencias en memoria (products/autocomplete.py): al confirmar ---
+
+@receiver(post_save, sender=Product)
+def update_autocomplete_on_product_save(sender, instance, **kwargs):
+    transaction.on_commit(lambda: autocomplete_index.update_product(instance))
+
+
+@receiver(post_delete, sender=Product)
+def update_autocomplete_on_product_delete(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: autocomplete_index.remove_product(pk))
+
+
+@receiver(post_save, sender=Category)
+def update_autocomplete_on_category_save(sender, instance, **kwargs):
+    transaction.on_commit(lambda: autocomplete_index.update_category(instance))
+
+
+@receiver(post_delete, sender=Category)
+def update_autocomplete_on_category_delete(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: autocomplete_index.remove_category(pk))
+
+
+# --- Caché del catálogo (products/catalog_cache.py): nueva versión al confirmar ---
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def bump_catalog_version(sender, **kwargs):
+    bump_catalog_version_on_commit()
+
+
+# --- Derivados responsive de las imágenes (products/images.py): en un hilo tras commit ---
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Category)
+def generate_image_derivatives(sender, instance, update_fields=None, **kwargs):
+    fields = ('image', 'image_hover') if sender is Product else ('image',)
+    if update_fields is not None:
+        fields = [field for field in fields if field in update_fields]
+    sources = [ImageSource.media(getattr(instance, field).name) for field in fields if getattr(instance, field)]
+    if sources:
+        transaction.on_commit(lambda: generate_in_background(sources))
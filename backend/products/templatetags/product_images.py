@@ -1,5 +1,14 @@
+import threading
+from collections import namedtuple
+from types import MappingProxyType
+
 from django import template
+from django.contrib.staticfiles.storage import staticfiles_storage
 from django.templatetags.static import static
+from django.utils.functional import empty
+from django.utils.html import format_html, format_html_join
+
+from products.images import CONTENT_TYPES, FORMATS, ImageSource, srcsets
 
 register = template.Library()
 
@@ -41,33 +50,119 @@ SLUG_GALLERY_IMAGES = {
 
 DEFAULT_PRODUCT_IMAGE = 'assets/products/PROXI.png'
 
+# sizes por defecto de <picture> (ancho con que se muestra la imagen)
+CARD_SIZES = '(max-width: 600px) 50vw, (max-width: 1024px) 33vw, 300px'
+
+
+StaticImages = namedtuple('StaticImages', 'main hover gallery')
+
+
+class _StaticTable:
+    """
+    Fallbacks por slug ya resueltos: slug -> StaticImages (ImageSource) y ruta -> URL de static().
+    Se construye una vez y los tags solo consultan dicts; se rehace si cambia el storage de
+    staticfiles o su manifest (ManifestStaticFilesStorage recargado: otro manifest_hash).
+    """
+
+    def __init__(self):
+        self.key = None
+        self.by_slug = self.urls = MappingProxyType({})
+        self.default = None
+        self._lock = threading.Lock()
+
+    def _current_key(self):
+        storage = staticfiles_storage._wrapped
+        if storage is empty:
+            staticfiles_storage._setup()
+            storage = staticfiles_storage._wrapped
+        # Lectura directa: sin excepción cuando el storage no tiene manifest
+        return storage, vars(storage).get('manifest_hash')
+
+    def get(self):
+        key = self._current_key()
+        if self.key != key:
+            with self._lock:
+                if self.key != key:
+                    self._build(key)
+        return self
+
+    def _build(self, key):
+        default = ImageSource.static(DEFAULT_PRODUCT_IMAGE)
+        by_slug = {}
+        for slug in {*SLUG_IMAGE_PATHS, *SLUG_HOVER_IMAGE_PATHS, *SLUG_GALLERY_IMAGES}:
+            main = ImageSource.static(SLUG_IMAGE_PATHS.get(slug, DEFAULT_PRODUCT_IMAGE))
+            # Si tenemos imagen hover alternativa por slug, usarla para que el hover se note
+            hover = ImageSource.static(SLUG_HOVER_IMAGE_PATHS[slug]) if slug in SLUG_HOVER_IMAGE_PATHS else main
+            gallery = tuple(ImageSource.static(path) for path in SLUG_GALLERY_IMAGES.get(slug, ())[:3]) or None
+            by_slug[slug] = StaticImages(main, hover, gallery)
+        paths = {DEFAULT_PRODUCT_IMAGE, *SLUG_IMAGE_PATHS.values(), *SLUG_HOVER_IMAGE_PATHS.values()}
+        paths.update(path for gallery in SLUG_GALLERY_IMAGES.values() for path in gallery)
+        urls = {}
+        for path in paths:
+            try:
+                urls[path] = static(path)
+            except ValueError:
+                pass  # sin entrada en el manifest: el tag falla al usarla, como static()
+        self.urls = MappingProxyType(urls)
+        self.by_slug = MappingProxyType(by_slug)
+        self.default = StaticImages(default, default, None)
+        self.key = key
+
+
+_static_table = _StaticTable()
+
+
+def _url(source):
+    if source.origin == 'static':
+        url = _static_table.get().urls.get(source.name)
+        if url is not None:
+            return url
+    return source.url
+
+
+def _static_images(product):
+    table = _static_table.get()
+    return table.by_slug.get(getattr(product, 'slug', None), table.default)
+
+
+def _main_source(product):
+    if product and product.image:
+        return ImageSource.media(product.image.name)
+    return _static_images(product).main
+
+
+def _hover_source(product):
+    if product and getattr(product, 'image_hover', None) and product.image_hover:
+        return ImageSource.media(product.image_hover.name)
+    if product and getattr(product, 'slug', None):
+        return _static_images(product).hover
+    return _main_source(product)
+
+
+def _gallery_sources(product):
+    gallery = _static_images(product).gallery if product else None
+    if gallery:
+        return list(gallery)
+    main = _main_source(product)
+    hover = _hover_source(product)
+    sources = [main]
+    if hover != main:
+        sources.append(hover)
+    while len(sources) < 3:
+        sources.append(main)
+    return sources[:3]
+
 
 @register.simple_tag
 def product_image_url(product):
     """Devuelve la URL de la imagen del producto (subida o fallback por slug)."""
-    if product and product.image:
-        return product.image.url
-    if product and getattr(product, 'slug', None):
-        path = SLUG_IMAGE_PATHS.get(product.slug, DEFAULT_PRODUCT_IMAGE)
-        return static(path)
-    return static(DEFAULT_PRODUCT_IMAGE)
+    return _url(_main_source(product))
 
 
 @register.simple_tag
 def product_hover_image_url(product):
     """Devuelve la URL de la imagen hover (subida, alternativa por slug, o misma que principal)."""
-    if product and getattr(product, 'image_hover', None) and product.image_hover:
-        return product.image_hover.url
-    # Si hay slug y tenemos imagen hover alternativa por slug, usarla para que el hover se note
-    if product and getattr(product, 'slug', None):
-        hover_path = SLUG_HOVER_IMAGE_PATHS.get(product.slug)
-        if hover_path:
-            return static(hover_path)
-        path = SLUG_IMAGE_PATHS.get(product.slug, DEFAULT_PRODUCT_IMAGE)
-        return static(path)
-    if product and product.image:
-        return product.image.url
-    return static(DEFAULT_PRODUCT_IMAGE)
+    return _url(_hover_source(product))
 
 
 @register.simple_tag
@@ -76,17 +171,52 @@ def product_gallery_urls(product):
     Devuelve lista de hasta 3 URLs de imágenes para la galería del detalle.
     Usa SLUG_GALLERY_IMAGES o fallback a imagen principal/hover.
     """
-    urls = []
-    slug = getattr(product, 'slug', None) if product else None
-    if slug and slug in SLUG_GALLERY_IMAGES:
-        for path in SLUG_GALLERY_IMAGES[slug][:3]:
-            urls.append(static(path))
-    else:
-        main = product_image_url(product)
-        hover = product_hover_image_url(product)
-        urls = [main]
-        if hover != main:
-            urls.append(hover)
-        while len(urls) < 3:
-            urls.append(main)
-    return urls[:3]
+    return [_url(source) for source in _gallery_sources(product)]
+
+
+@register.simple_tag
+def product_gallery_sources(product):
+    """Las mismas imágenes que product_gallery_urls como [(ImageSource, url)], para {% picture %}."""
+    return [(source, _url(source)) for source in _gallery_sources(product)]
+
+
+@register.simple_tag
+def picture(source, alt='', sizes=CARD_SIZES, css_class='', img_id='', loading='lazy'):
+    """
+    <picture> con srcset AVIF/WebP/JPEG a varios anchos (products/images.py) y el JPEG
+    intermedio como src. Si la fuente no está en disco, un <img> con la URL original.
+    """
+    attrs = format_html(
+        'alt="{}"{}{} loading="{}" decoding="async"',
+        alt,
+        format_html(' class="{}"', css_class) if css_class else '',
+        format_html(' id="{}"', img_id) if img_id else '',
+        loading,
+    )
+    sets = srcsets(source)
+    if sets is None:
+        return format_html('<img src="{}" {}>', _url(source), attrs)
+    sources = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}">',
+        ((CONTENT_TYPES[fmt], sets[fmt], sizes) for fmt in FORMATS if fmt != 'jpeg'),
+    )
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" {}></picture>',
+        sources, sets['src'], sets['jpeg'], sizes, attrs,
+    )
+
+
+@register.simple_tag
+def product_picture(product, hover=False, **kwargs):
+    """{% product_picture product css_class="product-main-img" %}; hover=True para la imagen alternativa."""
+    kwargs.setdefault('alt', getattr(product, 'name', ''))
+    return picture(_hover_source(product) if hover else _main_source(product), **kwargs)
+
+
+@register.simple_tag
+def category_picture(category, **kwargs):
+    """<picture> de Category.image (vacío si la categoría no tiene imagen)."""
+    if not category or not category.image:
+        return ''
+    kwargs.setdefault('alt', category.name)
+    return picture(ImageSource.media(category.image.name), **kwargs)
@@ -0,0 +1,106 @@
+import base64
+import json
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from muxdry.pagination import InvalidCursor, KeysetPaginator
+from .catalog_cache import CATALOG_SORTS
+from .models import Category, Product
+
+
+def _cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+@override_settings(PAGE_CACHE_TIMEOUT=600)
+class PageCacheKeyTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Barras', slug='barras')
+        Product.objects.create(
+            name='Barra', slug='barra', description='-', category=category, price=Decimal('3.00'), sku='B1',
+        )
+
+    def test_unknown_params_do_not_create_entries(self):
+        self.assertEqual(self.client.get('/products/categoria/barras/?sort=newest')['X-Page-Cache'], 'miss')
+        # Otros parámetros: se sirve la entrada canónica y el render no se guarda
+        response = self.client.get('/products/categoria/barras/?utm_source=x&sort=newest')
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        for query in ('?x=1', '?x=2'):
+            self.assertNotIn('X-Page-Cache', self.client.get(f'/products/categoria/barras/{query}'))
+        self.assertEqual(self.client.get('/products/categoria/barras/')['X-Page-Cache'], 'miss')
+
+    def test_param_order_does_not_matter(self):
+        self.client.get('/products/buscar/?q=barra&sort=newest')
+        self.assertEqual(self.client.get('/products/buscar/?sort=newest&q=barra')['X-Page-Cache'], 'hit')
+        self.assertEqual(self.client.get('/products/buscar/?sort=newest&q=otra')['X-Page-Cache'], 'miss')
+
+    def test_pages_without_params_ignore_the_query_string(self):
+        self.client.get('/information/')
+        self.assertEqual(self.client.get('/information/?fbclid=abc')['X-Page-Cache'], 'hit')
+
+
+class KeysetListingTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Barras', slug='barras')
+        for i in range(5):
+            Product.objects.create(
+                name=f'Barra {i}', slug=f'barra-{i}', description='-', category=category,
+                price=Decimal('3.00'), sku=f'B{i}',
+            )
+        # Mismo created_at y mismo precio en todas: solo el id desempata
+        Product.objects.update(created_at=timezone.now())
+
+    def _walk(self, ordering, per_page=2):
+        paginator = KeysetPaginator(Product.objects.all(), ordering, per_page)
+        ids, cursor = [], None
+        while True:
+            page = paginator.page(cursor)
+            ids.extend(p.id for p in page)
+            if not page.has_next:
+                return ids
+            cursor = page.next_cursor
+
+    def test_ties_on_the_sort_keys_are_broken_by_id_across_pages(self):
+        expected_desc = list(Product.objects.order_by('-id').values_list('id', flat=True))
+        for sort in ('featured', 'newest', 'price_desc'):
+            self.assertEqual(self._walk(CATALOG_SORTS[sort][1]), expected_desc, sort)
+        self.assertEqual(self._walk(CATALOG_SORTS['price_asc'][1]), expected_desc[::-1])
+
+    def test_malformed_cursors_are_rejected(self):
+        paginator = KeysetPaginator(Product.objects.all(), CATALOG_SORTS['newest'][1], 2)
+        now = timezone.now().isoformat()
+        for cursor in ('garbage', '!!!', _cursor({}), _cursor([now]), _cursor([now, 1, 2]),
+                       _cursor([None, None]), _cursor(['ayer', 1]), _cursor([now, 10 ** 30])):
+            with self.assertRaises(InvalidCursor, msg=cursor):
+                paginator.page(cursor)
+
+    def test_listing_with_invalid_cursor_restarts_from_first_page(self):
+        for after in ('garbage', _cursor([None, None])):
+            response = self.client.get('/products/categoria/barras/', {'sort': 'newest', 'after': after})
+            self.assertRedirects(response, '/products/categoria/barras/?sort=newest')
+        response = self.client.get('/products/categoria/barras/', {'after': 'garbage', 'format': 'json'})
+        self.assertRedirects(response, '/products/categoria/barras/?format=json')
+        self.assertEqual(self.client.get(response['Location']).json()['count'], 5)
+
+    def test_api_rejects_invalid_cursor(self):
+        response = self.client.get('/products/products/', {'after': 'garbage'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/products/products/', {'sort': 'price_asc', 'after': _cursor(['3.00', None])})
+        self.assertEqual(response.status_code, 400)
+
+    def test_api_pages_through_ties(self):
+        with mock.patch('products.catalog_cache.LISTING_PAGE_SIZE', 2):
+            ids, url = [], '/products/products/?sort=price_asc&fields=id'
+            while url:
+                data = self.client.get(url).json()
+                ids.extend(row['id'] for row in data['results'])
+                url = data['next']
+        self.assertEqual(ids, list(Product.objects.order_by('id').values_list('id', flat=True)))
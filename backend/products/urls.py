@@ -1,12 +1,19 @@
-from django.urls import path
+from django.urls import path, include
+from rest_framework.routers import SimpleRouter
 from . import views
 
 app_name = 'products'
 
+router = SimpleRouter()
+router.register(r'products', views.ProductViewSet, basename='product')
+
 urlpatterns = [
     path('producto/<slug:slug>/', views.product_detail_view, name='product_detail'),
     path('categoria/<slug:slug>/', views.category_view, name='category'),
     path('buscar/', views.search_view, name='search'),
+    path('api/sugerencias/', views.autocomplete_view, name='autocomplete'),
+    path('api/cache-stats/', views.catalog_cache_stats_view, name='catalog_cache_stats'),
+    path('imagenes/<path:name>', views.image_derivative_view, name='image_derivative'),
     # Rutas nombradas para templates estáticos
     path('barra-am/', views.product_barra_view, name='product_barra'),
     path('xerac-ac/', views.product_xerac_view, name='product_xerac'),
@@ -14,4 +21,6 @@ urlpatterns = [
     path('wash/', views.product_wash_view, name='product_wash'),
     path('desodorante-corporal/', views.product_desodorante_view, name='product_desodorante'),
     path('api/favorito/', views.toggle_favorite_view, name='toggle_favorite'),
+    # API de solo lectura del catálogo (static/js/products.js)
+    path('', include(router.urls)),
 ]
\ No newline at end of file
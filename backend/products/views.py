@@ -1,12 +1,33 @@
-from django.shortcuts import render, get_object_or_404, redirect
+import os
+
+from django.shortcuts import render, redirect
 from django.conf import settings
-from django.core.mail import send_mail
 from django.contrib import messages
-from django.contrib.auth.decorators import login_required
+from django.contrib.auth.decorators import login_required, user_passes_test
 from django.core.paginator import Paginator
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
+from django.template.loader import render_to_string
 from django.db.utils import ProgrammingError
-from .models import Product, Category, ProductFavorite
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from .models import Product, ProductFavorite
+from .catalog_cache import (
+    catalog_cache, cached_categories, cached_home, cached_category, cached_listing, cached_product,
+    cached_api_page, cached_api_product, cached_api_featured, cached_api_best_sellers,
+    CATALOG_SORTS, SEARCH_SORTS,
+)
+from .search import search_products
+from .autocomplete import suggest, DEFAULT_LIMIT, MAX_LIMIT
+from .page_cache import page_cache
+from .images import (
+    CONTENT_TYPES, derivative_name, derivative_url, derivatives_root, generate, is_ready,
+    parse_derivative_name, signature,
+)
+from orders.outbox import enqueue
+from muxdry.sendfile import sendfile
+from muxdry.pagination import InvalidCursor
 
 
 def _user_favorite_ids(request):
@@ -20,6 +41,44 @@ def _user_favorite_ids(request):
         # Tabla products_productfavorite aún no existe (migración sin aplicar)
         return set()
 
+
+def _render_listing(request, context, family, parts, queryset, sorts=CATALOG_SORTS, default_sort='featured'):
+    """Renderiza index.html con una página del listado por cursor (?sort=&after=).
+    Con ?format=json devuelve solo las tarjetas y la URL siguiente (scroll infinito).
+    Un cursor inválido redirige a la primera página."""
+    sort = request.GET.get('sort', default_sort)
+    if sort not in sorts:
+        sort = default_sort
+    params = request.GET.copy()
+    params.pop('after', None)
+    try:
+        page = cached_listing(family, parts, queryset, sort, request.GET.get('after') or None, sorts)
+    except InvalidCursor:
+        # Cursor ilegible o de otro orden: de vuelta a la primera página
+        return redirect(f'{request.path}?{params.urlencode()}')
+    params.pop('format', None)
+    first_url = f'{request.path}?{params.urlencode()}' if page.cursor else None
+    next_url = None
+    if page.has_next:
+        params['after'] = page.next_cursor
+        next_url = f'{request.path}?{params.urlencode()}'
+    if request.GET.get('format') == 'json':
+        html = render_to_string('includes/product_cards.html', {
+            'products': page.items,
+            'user_favorite_ids': context.get('user_favorite_ids'),
+        }, request=request)
+        return JsonResponse({'html': html, 'next': next_url, 'count': len(page)})
+    context.update({
+        'products': page.items,
+        'page': page,
+        'sort': sort,
+        'sort_options': [(key, label) for key, (label, _) in sorts.items()],
+        'next_url': next_url,
+        'first_url': first_url,
+    })
+    return render(request, 'index.html', context)
+
+
 # Mapeo slug -> template para productos estáticos
 PRODUCT_TEMPLATES = {
     'barra-am': 'products/Barra-AM.html',
@@ -33,6 +92,7 @@ PRODUCT_TEMPLATES = {
 }
 
 
+@page_cache
 def information_view(request):
     """Página de información, términos, privacidad."""
     return render(request, 'information.html')
@@ -55,39 +115,21 @@ def contact_view(request):
         return redirect('/#contacto-footer')
     subject_line = f"[MUXDRY Contacto] {subject or 'Sin asunto'}"
     message_body = f"Nombre: {name}\nEmail: {email}\n\nMensaje:\n{body}"
-    try:
-        send_mail(
-            subject_line,
-            message_body,
-            settings.DEFAULT_FROM_EMAIL,
-            [admin_email],
-            fail_silently=False,
-        )
-        messages.success(request, 'Mensaje enviado correctamente. Te responderemos pronto.')
-    except Exception:
-        messages.error(request, 'No se pudo enviar el mensaje. Intenta de nuevo más tarde.')
+    enqueue('contact', subject_line, message_body, [admin_email], reply_to=email)
+    messages.success(request, 'Mensaje enviado correctamente. Te responderemos pronto.')
     return redirect('/#contacto-footer')
 
 
+# Parámetros que leen las vistas de listado (_render_listing): claves de la caché de página
+LISTING_PARAMS = ('sort', 'after', 'format')
+
+
+@page_cache(params=LISTING_PARAMS)
 def home_view(request):
-    from django.db.models import Avg, Count, Q
-    products = Product.objects.annotate(
-        avg_rating=Avg('reviews__rating', filter=Q(reviews__approved=True)),
-        review_count=Count('reviews', filter=Q(reviews__approved=True))
-    ).order_by('-is_featured', '-created_at')
-    # Productos para carrusel "Más demandado": destacados o los de más ventas (hasta 4 slides)
-    viral_products = list(Product.objects.filter(is_featured=True)[:4])
-    if not viral_products:
-        viral_products = list(Product.objects.order_by('-sales_count')[:4])
-    if not viral_products and products:
-        viral_products = list(products[:4])
+    # Listas del catálogo cacheadas por versión (products/catalog_cache.py); el catálogo, por cursor
     context = {
-        'products': products,
-        'featured_products': Product.objects.filter(is_featured=True)[:8],
-        'best_sellers': Product.objects.filter(is_best_seller=True).order_by('-sales_count')[:4],
-        'featured_product': Product.objects.filter(is_featured=True).first(),
-        'viral_products': viral_products,
-        'categories': Category.objects.all(),
+        **cached_home(),
+        'categories': cached_categories(),
         'user_favorite_ids': _user_favorite_ids(request),
         'banners': [
             {'image': 'assets/Banner/mux-1.png', 'alt': 'Oferta 1'},
@@ -95,90 +137,205 @@ def home_view(request):
             {'image': 'assets/Banner/mux-3.png', 'alt': 'Oferta 3'},
         ]
     }
-    return render(request, 'index.html', context)
+    return _render_listing(request, context, 'home', (), Product.objects.all)
+
 
+def _reviews_version(request, slug):
+    from reviews.summary import review_version
+    product = cached_product(slug)
+    return review_version(product.pk) if product is not None else 0
 
+
+@page_cache(anonymous_only=True, version=_reviews_version, params=('page',))
 def product_detail_view(request, slug):
     """Detalle de producto por slug (template genérico) con reseñas paginadas."""
-    from django.db.models import Avg, Count
     from reviews.models import Review
-    product = get_object_or_404(Product, slug=slug)
-    reviews_qs = Review.objects.filter(product=product, approved=True).select_related('user').order_by('-created_at')
-    paginator = Paginator(reviews_qs, 5)
-    page_number = request.GET.get('page', 1)
-    page_obj = paginator.get_page(page_number)
+    from reviews.summary import REVIEW_PAGE_SIZE, approved_reviews, review_row, review_summary
+    product = cached_product(slug)
+    if product is None:
+        raise Http404('Producto no encontrado')
+    # Media, histograma y primera página desde el resumen cacheado (reviews/summary.py)
+    summary = review_summary(product.pk)
+    if summary is None:
+        raise Http404('Producto no encontrado')
+    paginator = Paginator(approved_reviews(product.pk).order_by('-created_at', '-id'), REVIEW_PAGE_SIZE)
+    paginator.count = summary.count  # denormalizado: evita el COUNT(*)
+    page_obj = paginator.get_page(request.GET.get('page', 1))
+    if page_obj.number == 1:
+        page_obj.object_list = summary.first()
+    else:
+        page_obj.object_list = [review_row(review) for review in page_obj.object_list]
     user_has_reviewed = False
     if request.user.is_authenticated:
         user_has_reviewed = Review.objects.filter(product=product, user=request.user).exists()
-    agg = reviews_qs.aggregate(avg=Avg('rating'), cnt=Count('id'))
-    average_rating = round(float(agg['avg'] or 0), 1)
-    review_count = agg['cnt'] or 0
     context = {
         'product': product,
         'reviews_page': page_obj,
         'user_can_review': request.user.is_authenticated and not user_has_reviewed,
         'user_has_reviewed': user_has_reviewed,
-        'average_rating': average_rating,
-        'review_count': review_count,
+        'average_rating': summary.average,
+        'review_count': summary.count,
+        'rating_histogram': summary.histogram,
     }
     return render(request, 'products/detail.html', context)
 
 
+@page_cache(params=LISTING_PARAMS)
 def category_view(request, slug):
     """Lista productos por categoría."""
-    from django.db.models import Avg, Count, Q
-    category = get_object_or_404(Category, slug=slug)
-    products = Product.objects.filter(category=category).annotate(
-        avg_rating=Avg('reviews__rating', filter=Q(reviews__approved=True)),
-        review_count=Count('reviews', filter=Q(reviews__approved=True))
-    )
-    return render(request, 'index.html', {
+    category = cached_category(slug)
+    if category is None:
+        raise Http404('Categoría no encontrada')
+    return _render_listing(request, {
         'category': category,
-        'products': products,
-        'categories': Category.objects.all(),
+        'categories': cached_categories(),
         'user_favorite_ids': _user_favorite_ids(request),
-    })
+    }, 'category', (slug,), lambda: Product.objects.filter(category=category))
 
 
+@page_cache(params=('q', *LISTING_PARAMS))
 def search_view(request):
     """Búsqueda de productos."""
-    from django.db.models import Avg, Count, Q
     q = request.GET.get('q', '').strip()
-    if q:
-        products = Product.objects.filter(name__icontains=q).annotate(
-            avg_rating=Avg('reviews__rating', filter=Q(reviews__approved=True)),
-            review_count=Count('reviews', filter=Q(reviews__approved=True))
-        ).order_by('-is_featured', '-created_at')
-    else:
-        products = Product.objects.none()
-    return render(request, 'index.html', {
+    context = {
         'search_query': q,
-        'products': products,
-        'categories': Category.objects.all(),
+        'categories': cached_categories(),
         'user_favorite_ids': _user_favorite_ids(request),
-    })
+    }
+    if not q:
+        return render(request, 'index.html', {**context, 'products': []})
+    # Texto completo con ranking (nombre, descripción, SKU y categoría): products/search.py.
+    # Misma clave de caché para "Barra  AM" y "barra am".
+    return _render_listing(
+        request, context, 'search', tuple(q.lower().split()),
+        lambda: search_products(Product.objects.all(), q), SEARCH_SORTS, 'relevance',
+    )
+
+
+def autocomplete_view(request):
+    """Sugerencias JSON para la caja de búsqueda (índice en memoria, sin consultas). ?q=&limit="""
+    q = request.GET.get('q', '').strip()
+    try:
+        limit = min(max(int(request.GET.get('limit', DEFAULT_LIMIT)), 1), MAX_LIMIT)
+    except ValueError:
+        limit = DEFAULT_LIMIT
+    results = [
+        {'type': s.kind, 'label': s.label, 'url': s.url}
+        for s in suggest(q, limit)
+    ]
+    return JsonResponse({'q': q, 'results': results})
+
+
+@user_passes_test(lambda u: u.is_authenticated and u.is_staff, login_url='/accounts/login/')
+def catalog_cache_stats_view(request):
+    """Aciertos de la caché del catálogo por familia de claves (de este worker). ?reset=1 los pone a cero."""
+    data = {'pid': os.getpid(), 'version': catalog_cache.version(), 'families': catalog_cache.stats()}
+    if request.GET.get('reset'):
+        catalog_cache.reset_stats()
+    return JsonResponse(data)
+
+
+def image_derivative_view(request, name):
+    """Derivado responsive de una imagen del catálogo (products/images.py); lo genera si aún no existe.
+    Solo se llega aquí mientras falta en disco: después los templatetags apuntan a IMAGE_DERIVATIVES_URL."""
+    parsed = parse_derivative_name(name)
+    if parsed is None:
+        raise Http404
+    source, sig, width, fmt = parsed
+    current = signature(source)
+    if current is None:
+        raise Http404
+    if sig != current:
+        # La fuente cambió desde que se renderizó la página
+        return redirect(derivative_url(source, current, width, fmt, is_ready(source, current)))
+    if generate(source) is None:
+        raise Http404
+    path = os.path.join(derivatives_root(), derivative_name(source, sig, width, fmt))
+    return sendfile(request, path, content_type=CONTENT_TYPES[fmt], cache_control='public, max-age=31536000, immutable')
+
+
+class ProductViewSet(viewsets.ViewSet):
+    """
+    API de solo lectura del catálogo (static/js/products.js):
+    - /products/products/?category=<slug>&sort=<CATALOG_SORTS>&after=<cursor>: páginas de
+      LISTING_PAGE_SIZE por cursor, {next, results}. Cursor inválido: 400.
+    - /products/products/<id>/, /featured/ y /best_sellers/ (listas).
+    ?fields=id,name,price devuelve solo esos campos (los de CatalogProductSerializer).
+    Los datos ya serializados se cachean por versión del catálogo (catalog_cache.py).
+    """
+    authentication_classes = ()  # datos públicos: no se valida el JWT en cada petición
+    permission_classes = [AllowAny]
+
+    def _fields(self, rows):
+        fields = [name.strip() for name in self.request.query_params.get('fields', '').split(',') if name.strip()]
+        if not fields:
+            return rows
+        return [{name: row[name] for name in fields if name in row} for row in rows]
+
+    def list(self, request):
+        category = None
+        slug = request.query_params.get('category')
+        if slug:
+            category = cached_category(slug)
+            if category is None:
+                raise Http404('Categoría no encontrada')
+        sort = request.query_params.get('sort')
+        if sort not in CATALOG_SORTS:
+            sort = 'featured'
+        try:
+            page = cached_api_page(category, sort, request.query_params.get('after') or None)
+        except InvalidCursor:
+            return Response({'error': 'Cursor no válido'}, status=status.HTTP_400_BAD_REQUEST)
+        next_url = None
+        if page['next_cursor']:
+            params = request.query_params.copy()
+            params['after'] = page['next_cursor']
+            next_url = request.build_absolute_uri(f'{request.path}?{params.urlencode()}')
+        return Response({'next': next_url, 'results': self._fields(page['results'])})
+
+    def retrieve(self, request, pk=None):
+        try:
+            product = cached_api_product(int(pk))
+        except ValueError:
+            product = None
+        if product is None:
+            raise Http404('Producto no encontrado')
+        return Response(self._fields([product])[0])
+
+    @action(detail=False, methods=['get'])
+    def featured(self, request):
+        return Response(self._fields(cached_api_featured()))
+
+    @action(detail=False, methods=['get'])
+    def best_sellers(self, request):
+        return Response(self._fields(cached_api_best_sellers()))
 
 
+@page_cache
 def product_barra_view(request):
     """Página del producto Barra AM."""
     return render(request, 'products/Barra-AM.html')
 
 
+@page_cache
 def product_xerac_view(request):
     """Página del producto Xerac AC."""
     return render(request, 'products/Xerac-AC.html')
 
 
+@page_cache
 def product_drysol_view(request):
     """Página del producto Drysol."""
     return render(request, 'products/Drysol.html')
 
 
+@page_cache
 def product_wash_view(request):
     """Página del producto Wash."""
     return render(request, 'products/Wash.html')
 
 
+@page_cache
 def product_desodorante_view(request):
     """Página del producto Desodorante Corporal."""
     return render(request, 'products/Desodorante-Corporal.html')
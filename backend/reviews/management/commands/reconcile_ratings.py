@@ -0,0 +1,16 @@
+# reviews/management/commands/reconcile_ratings.py
+from django.core.management.base import BaseCommand
+from products.catalog_cache import bump_catalog_version_on_commit
+from reviews.ratings import reconcile_ratings
+
+
+class Command(BaseCommand):
+    help = 'Recalcula avg_rating, review_count y el histograma de estrellas de los productos desde las reseñas aprobadas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('product_ids', nargs='*', type=int, help='Solo estos productos (por defecto, todos)')
+
+    def handle(self, *args, **options):
+        total = reconcile_ratings(options['product_ids'] or None)
+        bump_catalog_version_on_commit()  # productos y resúmenes cacheados con los valores viejos
+        self.stdout.write(self.style.SUCCESS(f'Valoraciones recalculadas: {total} producto(s)'))
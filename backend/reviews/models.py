@@ -2,8 +2,9 @@
 from django.db import models
 from django.conf import settings
 from django.core.validators import MinValueValidator, MaxValueValidator
+from muxdry.tracking import TrackedFieldsMixin
 
-class Review(models.Model):
+class Review(TrackedFieldsMixin, models.Model):
     product = models.ForeignKey('products.Product', on_delete=models.CASCADE, related_name='reviews')
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     
@@ -26,6 +27,9 @@ class Review(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Lo que cuenta en los agregados de Product (reviews/ratings.py)
+    tracked_fields = ('product_id', 'rating', 'approved')
+    
     class Meta:
         unique_together = ['product', 'user']
     
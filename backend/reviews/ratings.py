@@ -0,0 +1,69 @@
+# reviews/ratings.py
+"""
+Agregados de reseñas denormalizados en Product: avg_rating, review_count y el
+histograma rating_1..rating_5 (solo reseñas aprobadas).
+
+Cada escritura de Review (crear, aprobar, ocultar con delete_review, cambiar la nota,
+borrar) aplica su delta con un único UPDATE con F(); la media se recalcula en la
+misma sentencia a partir del histograma, así que no hay lectura previa ni carrera
+entre reseñas simultáneas. Los signals están en reviews/signals.py y
+`python manage.py reconcile_ratings` recalcula todo desde la tabla de reseñas.
+"""
+from django.db.models import Count, F, FloatField, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Cast, Coalesce, Greatest, NullIf
+
+from products.models import Product
+from .models import Review
+
+STARS = (1, 2, 3, 4, 5)
+
+
+def _average(buckets):
+    """Media ponderada de las expresiones {estrellas: conteo}; 0 si no hay reseñas."""
+    total = sum(buckets.values(), Value(0))
+    weighted = sum((stars * count for stars, count in buckets.items()), Value(0))
+    return Coalesce(
+        Cast(weighted, FloatField()) / Cast(NullIf(total, 0), FloatField()),
+        Value(0.0),
+        output_field=FloatField(),
+    )
+
+
+def apply_rating_delta(product_id, rating, sign):
+    """Suma (sign=1) o resta (sign=-1) una reseña aprobada de `rating` estrellas al producto."""
+    if rating not in STARS:
+        return 0
+    # Sin bajar de 0: una instancia desactualizada no debe romper el guardado de la reseña
+    # (el desajuste lo corrige reconcile_ratings); el total sale del propio histograma.
+    buckets = {stars: F(f'rating_{stars}') for stars in STARS}
+    buckets[rating] = Greatest(buckets[rating] + sign, Value(0))
+    return Product.objects.filter(pk=product_id).update(
+        review_count=sum(buckets.values(), Value(0)),
+        avg_rating=_average(buckets),
+        **{f'rating_{rating}': buckets[rating]},
+    )
+
+
+def _approved_count(**filters):
+    return Coalesce(Subquery(
+        Review.objects.filter(product_id=OuterRef('pk'), approved=True, **filters)
+        .order_by()
+        .values('product_id')
+        .annotate(n=Count('pk'))
+        .values('n'),
+        output_field=IntegerField(),
+    ), Value(0))
+
+
+def reconcile_ratings(product_ids=None):
+    """Recalcula los agregados desde Review (todos los productos o solo product_ids).
+    Un UPDATE con subconsultas correlacionadas; devuelve las filas actualizadas."""
+    products = Product.objects.all()
+    if product_ids is not None:
+        products = products.filter(pk__in=product_ids)
+    buckets = {stars: _approved_count(rating=stars) for stars in STARS}
+    return products.update(
+        review_count=sum(buckets.values(), Value(0)),
+        avg_rating=_average(buckets),
+        **{f'rating_{stars}': buckets[stars] for stars in STARS},
+    )
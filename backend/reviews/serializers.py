@@ -65,4 +65,20 @@ class ReviewUpdateSerializer(serializers.ModelSerializer):
     def validate_rating(self, value):
         if value < 1 or value > 5:
             raise serializers.ValidationError("La calificación debe estar entre 1 y 5.")
-        return value
\ No newline at end of file
+        return value
+
+
+class ReviewSummaryItemSerializer(serializers.Serializer):
+    """Reseña del resumen cacheado (dict de reviews/summary.py) con la forma de ReviewSerializer"""
+    id = serializers.IntegerField()
+    user = serializers.IntegerField()
+    user_email = serializers.EmailField()
+    user_name = serializers.CharField()
+    product = serializers.IntegerField()
+    rating = serializers.IntegerField()
+    title = serializers.CharField()
+    comment = serializers.CharField()
+    verified_purchase = serializers.BooleanField()
+    approved = serializers.BooleanField()
+    created_at = serializers.DateTimeField()
+    updated_at = serializers.DateTimeField()
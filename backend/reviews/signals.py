@@ -0,0 +1,55 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from products.catalog_cache import bump_catalog_version_on_commit
+from .models import Review
+from .ratings import apply_rating_delta, reconcile_ratings
+from .summary import bump_review_version_on_commit
+
+
+def _contribution(product_id, rating, approved):
+    """(producto, estrellas) que la reseña aporta a los agregados, o None si no está aprobada."""
+    return (product_id, rating) if approved else None
+
+
+@receiver(post_save, sender=Review)
+def update_product_rating_on_save(sender, instance, created, **kwargs):
+    """Crear, aprobar/ocultar o cambiar la nota: resta lo que aportaba y suma lo que aporta ahora."""
+    new = _contribution(instance.product_id, instance.rating, instance.approved)
+    if created:
+        old = None
+    elif not instance.changed_fields():
+        return
+    elif set(instance.original_values) != set(Review.tracked_fields):
+        # Instancia sin valores originales (no cargada de BD): recalcula desde cero
+        reconcile_ratings({instance.product_id, instance.original_value('product_id')} - {None})
+        bump_catalog_version_on_commit()
+        return
+    else:
+        original = instance.original_values
+        old = _contribution(original['product_id'], original['rating'], original['approved'])
+    if old == new:
+        return
+    if old:
+        apply_rating_delta(*old, -1)
+    if new:
+        apply_rating_delta(*new, 1)
+    # Los productos cacheados del catálogo llevan avg_rating/review_count
+    bump_catalog_version_on_commit()
+
+
+@receiver(post_delete, sender=Review)
+def update_product_rating_on_delete(sender, instance, **kwargs):
+    # Lo que estaba en BD, no lo que se haya tocado en memoria antes de borrar
+    values = {name: getattr(instance, name) for name in Review.tracked_fields}
+    values.update(instance.original_values)
+    old = _contribution(values['product_id'], values['rating'], values['approved'])
+    if old:
+        apply_rating_delta(*old, -1)
+        bump_catalog_version_on_commit()
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def bump_review_summary_version(sender, instance, **kwargs):
+    # Resumen de reseñas y detalle del producto (y el de antes, si la reseña cambió de producto)
+    bump_review_version_on_commit(instance.product_id, instance.original_value('product_id'))
@@ -0,0 +1,107 @@
+# reviews/summary.py
+"""
+Resumen de reseñas por producto, cacheado con la versión del catálogo y la del producto.
+
+Lo leen el detalle del producto (primera página de reseñas) y la API
+/reviews/product/<id>/: media, total, histograma y las primeras SUMMARY_SIZE reseñas
+aprobadas en los dos órdenes de la API (recientes y mejor valoradas), ya con el
+nombre del autor. En un acierto no hay ninguna consulta.
+
+Cada producto tiene su propia versión de reseñas (review_version); toda escritura de
+Review la incrementa tras commit (reviews/signals.py), así que nunca se sirve un
+resumen anterior a la última reseña y una reseña no invalida el resto del catálogo.
+
+Las reseñas son dicts con los campos de ReviewSerializer (sin el objeto User en la caché).
+"""
+from django.db import transaction
+
+from products.catalog_cache import catalog_cache
+from products.models import Product
+from .models import Review
+
+REVIEW_PAGE_SIZE = 5
+SUMMARY_SIZE = 20  # también el máximo de ?limit= en la API
+SUMMARY_ORDERINGS = {
+    'recent': ('-created_at', '-id'),
+    'rating': ('-rating', '-created_at', '-id'),
+}
+REVIEW_VERSION_KEY = 'catalog:reviews-version:%s'
+_ROW_FIELDS = (
+    'id', 'user_id', 'product_id', 'rating', 'title', 'comment',
+    'verified_purchase', 'approved', 'created_at', 'updated_at',
+    'user__first_name', 'user__last_name', 'user__email',
+)
+
+
+class ReviewSummary:
+    """Agregados y primeras reseñas de un producto (lo que se guarda en caché)."""
+
+    def __init__(self, product_id, average, count, histogram, reviews):
+        self.product_id = product_id
+        self.average = average
+        self.count = count
+        self.histogram = histogram
+        self.reviews = reviews  # {'recent': [...], 'rating': [...]}
+
+    def first(self, sort='recent', limit=REVIEW_PAGE_SIZE):
+        return self.reviews.get(sort, self.reviews['recent'])[:limit]
+
+
+def review_row(review):
+    """Dict de una reseña (con select_related('user')) para templates y API."""
+    user = review.user
+    return {
+        'id': review.pk,
+        'user': review.user_id,
+        'user_email': user.email,
+        'user_name': user.get_full_name(),
+        'product': review.product_id,
+        'rating': review.rating,
+        'title': review.title,
+        'comment': review.comment,
+        'verified_purchase': review.verified_purchase,
+        'approved': review.approved,
+        'created_at': review.created_at,
+        'updated_at': review.updated_at,
+    }
+
+
+def approved_reviews(product_id):
+    return Review.objects.filter(product_id=product_id, approved=True).select_related('user').only(*_ROW_FIELDS)
+
+
+def _build(product_id):
+    product = Product.objects.filter(pk=product_id).only(
+        'id', 'avg_rating', 'review_count', *(f'rating_{stars}' for stars in range(1, 6)),
+    ).first()
+    if product is None:
+        return False
+    reviews = {}
+    if product.review_count:
+        for sort, ordering in SUMMARY_ORDERINGS.items():
+            reviews[sort] = [review_row(r) for r in approved_reviews(product_id).order_by(*ordering)[:SUMMARY_SIZE]]
+    else:
+        reviews = {sort: [] for sort in SUMMARY_ORDERINGS}
+    return ReviewSummary(
+        product_id=product.pk,
+        average=round(product.avg_rating, 1),
+        count=product.review_count,
+        histogram=product.rating_histogram,
+        reviews=reviews,
+    )
+
+
+def review_version(product_id):
+    """Versión de las reseñas del producto (también entra en la caché de página del detalle)."""
+    return catalog_cache.version(REVIEW_VERSION_KEY % product_id)
+
+
+def bump_review_version_on_commit(*product_ids):
+    for product_id in set(product_ids) - {None}:
+        transaction.on_commit(lambda product_id=product_id: catalog_cache.bump(REVIEW_VERSION_KEY % product_id))
+
+
+def review_summary(product_id):
+    """ReviewSummary del producto, o None si no existe."""
+    parts = (product_id, review_version(product_id))
+    return catalog_cache.get_or_build('reviews', parts, lambda: _build(product_id)) or None
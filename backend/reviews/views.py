@@ -5,9 +5,11 @@ from rest_framework.permissions import IsAuthenticated, AllowAny
 from django.shortcuts import get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.http import Http404
 from django.views.decorators.http import require_POST
 from .models import Review
-from .serializers import ReviewSerializer, ReviewUpdateSerializer
+from .serializers import ReviewSerializer, ReviewSummaryItemSerializer, ReviewUpdateSerializer
+from .summary import SUMMARY_ORDERINGS, SUMMARY_SIZE, review_summary
 from products.models import Product
 
 
@@ -81,33 +83,26 @@ class ReviewViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'], url_path='product/(?P<product_id>[^/.]+)', permission_classes=[AllowAny])
     def product_reviews(self, request, product_id=None):
-        """Obtener reseñas de un producto específico"""
-        # CORREGIDO: Cambiar 'activo' por el nombre correcto del campo
-        # Primero verifica si el producto existe
-        product = get_object_or_404(Product, id=product_id)
-        
-        # Obtener las más recientes y mejor calificadas
+        """Obtener reseñas de un producto específico (?sort=recent|rating, ?limit=1..SUMMARY_SIZE)"""
+        # Todo sale del resumen cacheado (reviews/summary.py): sin consultas en un acierto
+        try:
+            summary = review_summary(int(product_id))
+        except ValueError:
+            summary = None
+        if summary is None:
+            raise Http404('Producto no encontrado')
         sort_by = request.query_params.get('sort', 'recent')  # 'recent' o 'rating'
-        limit = int(request.query_params.get('limit', 3))
-        
-        # CORREGIDO: Usar 'approved=True' en lugar de 'is_active=True'
-        queryset = Review.objects.filter(product=product, approved=True).select_related('user')
-        
-        if sort_by == 'rating':
-            queryset = queryset.order_by('-rating', '-created_at')
-        else:
-            queryset = queryset.order_by('-created_at')
-        
-        # Limitar resultados
-        reviews = queryset[:limit]
-        total_reviews = queryset.count()
-        
-        serializer = ReviewSerializer(reviews, many=True)
+        try:
+            limit = min(max(int(request.query_params.get('limit', 3)), 1), SUMMARY_SIZE)
+        except ValueError:
+            limit = 3
+        reviews = summary.first(sort_by if sort_by in SUMMARY_ORDERINGS else 'recent', limit)
+        serializer = ReviewSummaryItemSerializer(reviews, many=True)
         return Response({
             'reviews': serializer.data,
-            'total': total_reviews,
+            'total': summary.count,
             'showing': len(reviews),
-            'has_more': total_reviews > limit
+            'has_more': summary.count > limit
         })
     
     @action(detail=True, methods=['put', 'patch'])